@@ -22,11 +22,18 @@ Verzeichnisstruktur nach Verarbeitung:
     └── receipt_analyzer.py
 """
 
+import os
 import re
 import shutil
 import sqlite3
+import sys
 from pathlib import Path
-from receipt_analyzer import ReceiptParser, Receipt
+from typing import Callable, List, Optional, Tuple
+from receipt_analyzer import ReceiptParser, Receipt, calculate_file_hash, swapped_day_month
+from pdf_ingest import db_path_for
+from folder_watcher import list_pdfs
+from parse_pool import parse_in_order
+import receipt_store
 
 
 # ─── Pfade (relativ zum Skript-Ordner) ──────────────────────────────────────
@@ -36,6 +43,12 @@ ABLAGE      = BASE_DIR / "Ablage"
 FEHLER      = BASE_DIR / "Fehler"
 DB_PATH     = BASE_DIR / "receipts.db"
 
+# Anzahl paralleler Parse-Prozesse (1 = sequentiell wie bisher)
+PARSE_WORKERS = int(os.environ.get("KASSENBON_IMPORT_WORKERS", "1"))
+
+# PDFs pro Transaktion beim Batch-Import
+COMMIT_BATCH = 50
+
 
 # ─── Hilfsfunktionen ─────────────────────────────────────────────────────────
 
@@ -55,48 +68,23 @@ def get_db() -> sqlite3.Connection:
 def is_duplicate(conn: sqlite3.Connection, receipt: Receipt) -> bool:
     """
     Prüft ob ein Kassenbon mit gleichem Geschäft + Datum + Betrag
-    bereits in der Datenbank existiert.
+    bereits in der Datenbank existiert. Alte Zeilen mit vertauschtem
+    Tag/Monat (früherer Datumsparser) zählen ebenfalls.
     """
     if not receipt.date:
         return False
+    dates = [receipt.date, swapped_day_month(receipt.date) or receipt.date]
     cur = conn.cursor()
     cur.execute(
-        "SELECT 1 FROM receipts WHERE store_name=? AND date=? AND total_amount=?",
-        (receipt.store_name, receipt.date, receipt.total_amount)
+        "SELECT 1 FROM receipts WHERE store_name=? AND date IN (?, ?) AND total_amount=?",
+        (receipt.store_name, *dates, receipt.total_amount)
     )
     return cur.fetchone() is not None
 
 
 def save_to_db(conn: sqlite3.Connection, receipt: Receipt) -> int:
-    """Speichert Kassenbon + Artikel + Preishistorie in die Datenbank."""
-    cur = conn.cursor()
-
-    cur.execute(
-        "INSERT INTO receipts (store_name, store_address, date, total_amount, payment_method) "
-        "VALUES (?, ?, ?, ?, ?)",
-        (receipt.store_name, receipt.store_address,
-         receipt.date, receipt.total_amount, receipt.payment_method)
-    )
-    receipt_id = cur.lastrowid
-
-    for item in receipt.items:
-        cur.execute(
-            "INSERT INTO items (receipt_id, name, unit_price, quantity, total_price, "
-            "tax_category, category) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (receipt_id, item.name, item.unit_price, item.quantity,
-             item.total_price, item.tax_category, item.category)
-        )
-        try:
-            cur.execute(
-                "INSERT INTO price_history (item_name, price, date, store_name) "
-                "VALUES (?, ?, ?, ?)",
-                (item.name, item.unit_price, receipt.date, receipt.store_name)
-            )
-        except sqlite3.IntegrityError:
-            pass
-
-    conn.commit()
-    return receipt_id
+    """Speichert Kassenbon + Artikel in die Datenbank."""
+    return receipt_store.save_receipt(conn, receipt)
 
 
 def safe_name(text: str) -> str:
@@ -149,72 +137,214 @@ def move_pdf(src: Path, dst: Path) -> Path:
 
 # ─── Hauptlogik ──────────────────────────────────────────────────────────────
 
-def process_pdf(pdf_path: Path, conn: sqlite3.Connection) -> dict:
+def parse_for_import(pdf_path: Path) -> Tuple[Optional[Receipt], str]:
     """
-    Verarbeitet eine einzelne PDF.
-    Gibt ein Status-Dict zurück: datei, status, nachricht, ziel
+    Parse-Schritt einer PDF – ohne Datenbank und ohne Dateibewegung,
+    damit er auch in einem Worker-Prozess laufen kann.
+    Gibt (receipt, "") oder (None, fehlertext) zurück.
     """
-    out = {"datei": pdf_path.name, "status": "", "nachricht": "", "ziel": ""}
+    try:
+        return ReceiptParser().parse_pdf(pdf_path), ""
+    except Exception as exc:
+        return None, str(exc)
+
 
+def move_to_fehler(pdf_path: Path, out: dict, nachricht: str) -> dict:
+    """Markiert das Ergebnis als Fehler und verschiebt die PDF nach FEHLER."""
+    out["status"] = "fehler"
+    out["nachricht"] = nachricht
     try:
-        receipt = ReceiptParser().parse_pdf(pdf_path)
+        shutil.move(str(pdf_path), str(FEHLER / pdf_path.name))
+        out["ziel"] = str(FEHLER / pdf_path.name)
+    except Exception:
+        pass
+    return out
+
+
+class ImportWriter:
+    """
+    Der einzige Schreiber eines Imports – besitzt die SQLite-Verbindung.
+
+    Sammelt bis zu batch_size PDFs in einer Transaktion und verschiebt die
+    zugehörigen PDFs erst nach dem Commit (in Eingangs-Reihenfolge). So liegt
+    nie eine PDF in der Ablage, deren Kassenbon noch nicht gespeichert ist.
+    Die Ergebnis-Dicts sind nach flush() vollständig, die abgelegten PDFs
+    stehen dann mit pdf_path/pdf_hash am Kassenbon.
+
+    journal(pdf_path, out) wird für jedes Ergebnis innerhalb der Transaktion
+    seines Kassenbons aufgerufen und nach dem Ablegen noch einmal mit dem
+    endgültigen Ergebnis – so kann der Aufrufer den Fortschritt auf derselben
+    Verbindung atomar mitschreiben (siehe import_jobs).
+    """
 
-        # Duplikat?
-        if is_duplicate(conn, receipt):
-            out["status"] = "duplikat"
+    def __init__(self, conn: sqlite3.Connection, batch_size: int = COMMIT_BATCH,
+                 journal: Optional[Callable[[Path, dict], None]] = None):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.journal = journal
+        self._pending = []   # (pdf_path, receipt, receipt_id, out) – wird nach dem Commit abgelegt
+        self._stored = 0
+
+    def store(self, pdf_path: Path, receipt: Optional[Receipt], parse_error: str) -> dict:
+        """
+        Schreib-Schritt: Duplikat-Check und DB-Eintrag, Ablage beim nächsten flush().
+        Gibt ein Status-Dict zurück: datei, status, nachricht, ziel
+        """
+        out = {"datei": pdf_path.name, "status": "", "nachricht": "", "ziel": ""}
+        receipt_id = None
+
+        if receipt is None:
+            move_to_fehler(pdf_path, out, parse_error)
+        else:
             date_txt = receipt.date.strftime("%d.%m.%Y") if receipt.date else "?"
-            out["nachricht"] = (
-                f"Bereits importiert – {receipt.store_name}, "
-                f"{date_txt}, {receipt.total_amount:.2f} €"
+            try:
+                # Duplikat? (sieht auch die noch nicht committeten Kassenbons)
+                if is_duplicate(self.conn, receipt):
+                    out["status"] = "duplikat"
+                    out["nachricht"] = (
+                        f"Bereits importiert – {receipt.store_name}, "
+                        f"{date_txt}, {receipt.total_amount:.2f} €"
+                    )
+                else:
+                    # Neu → in DB speichern (Commit folgt gesammelt)
+                    receipt_id = receipt_store.save_receipt(self.conn, receipt, commit=False)
+                    out["status"] = "ok"
+                    out["nachricht"] = (
+                        f"{receipt.store_name}, {date_txt}, "
+                        f"{receipt.total_amount:.2f} € – {len(receipt.items)} Artikel"
+                    )
+                self._pending.append((pdf_path, receipt, receipt_id, out))
+            except Exception as exc:
+                move_to_fehler(pdf_path, out, str(exc))
+
+        if self.journal:
+            self.journal(pdf_path, out)
+        self._stored += 1
+        if self._stored >= self.batch_size:
+            self.flush()
+        return out
+
+    def flush(self):
+        """Committet die gesammelten Kassenbons und verschiebt ihre PDFs in die Ablage."""
+        pending, self._pending = self._pending, []
+        self._stored = 0
+
+        commit_error = None
+        try:
+            self.conn.commit()
+        except sqlite3.Error as exc:
+            self.conn.rollback()
+            commit_error = str(exc)
+
+        located = []   # (pdf_path, pdf_hash, receipt_id) der abgelegten neuen Kassenbons
+        for pdf_path, receipt, receipt_id, out in pending:
+            if commit_error and out["status"] == "ok":
+                move_to_fehler(pdf_path, out, commit_error)
+            else:
+                try:
+                    target = move_pdf(pdf_path, target_path_for(receipt))
+                    out["ziel"] = str(target)
+                    if receipt_id is not None:
+                        located.append((db_path_for(target), calculate_file_hash(target), receipt_id))
+                except Exception as exc:
+                    move_to_fehler(pdf_path, out, str(exc))
+            if self.journal:
+                self.journal(pdf_path, out)
+
+        if located:
+            # Die Ablage-Namen stehen erst nach dem Verschieben fest
+            self.conn.executemany(
+                'UPDATE receipts SET pdf_path = ?, pdf_hash = ? WHERE receipt_id = ?', located
             )
-            ziel = move_pdf(pdf_path, target_path_for(receipt))
-            out["ziel"] = str(ziel)
-            return out
-
-        # Neu → in DB speichern
-        save_to_db(conn, receipt)
-
-        # In Ablage verschieben
-        ziel = move_pdf(pdf_path, target_path_for(receipt))
-        out["status"] = "ok"
-        date_txt = receipt.date.strftime("%d.%m.%Y") if receipt.date else "?"
-        out["nachricht"] = (
-            f"{receipt.store_name}, {date_txt}, "
-            f"{receipt.total_amount:.2f} € – {len(receipt.items)} Artikel"
-        )
-        out["ziel"] = str(ziel)
+        if located or (self.journal and pending):
+            self.conn.commit()
 
-    except Exception as exc:
-        out["status"] = "fehler"
-        out["nachricht"] = str(exc)
-        try:
-            shutil.move(str(pdf_path), str(FEHLER / pdf_path.name))
-            out["ziel"] = str(FEHLER / pdf_path.name)
-        except Exception:
-            pass
 
+def store_parsed(pdf_path: Path, receipt: Optional[Receipt], parse_error: str,
+                 conn: sqlite3.Connection) -> dict:
+    """
+    Schreib-Schritt für eine einzelne PDF: Duplikat-Check, DB-Eintrag und Ablage.
+    Gibt ein Status-Dict zurück: datei, status, nachricht, ziel
+    """
+    writer = ImportWriter(conn, batch_size=1)
+    out = writer.store(pdf_path, receipt, parse_error)
+    writer.flush()
     return out
 
 
-def run_import() -> list:
+def process_pdf(pdf_path: Path, conn: sqlite3.Connection) -> dict:
+    """
+    Verarbeitet eine einzelne PDF.
+    Gibt ein Status-Dict zurück: datei, status, nachricht, ziel
+    """
+    receipt, parse_error = parse_for_import(pdf_path)
+    return store_parsed(pdf_path, receipt, parse_error, conn)
+
+
+def import_files(conn: sqlite3.Connection, pdfs: List[Path], workers: int = 1,
+                 batch_size: int = COMMIT_BATCH,
+                 journal: Optional[Callable[[Path, dict], None]] = None,
+                 progress: Optional[Callable[[dict], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None) -> list:
+    """
+    Importiert die angegebenen PDFs über einen ImportWriter auf conn.
+    Gibt eine Liste von Ergebnis-Dicts zurück (nur die bearbeiteten PDFs).
+
+    workers > 1: PDFs werden im gemeinsamen Prozess-Pool (parse_pool) geparst.
+    Geschrieben wird weiterhin nur hier (ein Writer, eine Verbindung) und in
+    Dateireihenfolge, sodass Duplikat-Erkennung und Ablage genau wie
+    sequentiell ablaufen. Stürzt ein Worker ab, wird nur die auslösende PDF
+    als Fehler verbucht, der Rest läuft weiter.
+
+    progress(out) wird nach jeder PDF aufgerufen, should_stop() davor –
+    liefert es True, bleiben die restlichen PDFs unangetastet im Eingang.
+    """
+    writer  = ImportWriter(conn, batch_size, journal)
+    results = []
+
+    def handle(pdf, receipt, parse_error):
+        out = writer.store(pdf, receipt, parse_error)
+        results.append(out)
+        if progress:
+            progress(out)
+
+    parsed = parse_in_order(parse_for_import, pdfs, workers)
+    try:
+        # Ergebnisse in Dateireihenfolge, während die Worker weiterparsen
+        for pdf in pdfs:
+            if should_stop and should_stop():
+                break
+            handle(pdf, *next(parsed))
+    finally:
+        parsed.close()   # storniert, was im Pool noch wartet
+        writer.flush()
+
+    return results
+
+
+def run_import(workers: int = None) -> list:
     """
     Hauptfunktion: Verarbeitet alle PDFs im Eingangsordner.
     Gibt eine Liste von Ergebnis-Dicts zurück.
-    Wird sowohl von der Flask-App als auch von der Kommandozeile aufgerufen.
+    Wird von der Kommandozeile aufgerufen, die Web-App startet dafür
+    einen Hintergrund-Job (import_jobs).
+
+    Je COMMIT_BATCH PDFs teilen sich eine Transaktion,
+    workers > 1 parst parallel (siehe import_files).
     """
     ensure_dirs()
 
-    pdfs = sorted(EINGANG.glob("*.pdf"))
+    pdfs = list_pdfs(EINGANG)
     if not pdfs:
         return []
 
-    conn    = get_db()
-    results = []
-    for pdf in pdfs:
-        results.append(process_pdf(pdf, conn))
-    conn.close()
+    workers = PARSE_WORKERS if workers is None else workers
 
-    return results
+    conn = get_db()
+    try:
+        return import_files(conn, pdfs, workers)
+    finally:
+        conn.close()
 
 
 # ─── Kommandozeilen-Einstieg ─────────────────────────────────────────────────
@@ -229,8 +359,13 @@ if __name__ == "__main__":
     print(f"  Datenbank      : {DB_PATH}")
     print("-" * 68)
 
-    anzahl = len(list(EINGANG.glob("*.pdf")))
+    workers = PARSE_WORKERS
+    if "--workers" in sys.argv[1:-1]:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+
+    anzahl = len(list_pdfs(EINGANG))
     print(f"  Gefundene PDFs : {anzahl}")
+    print(f"  Parse-Worker   : {workers}")
 
     if anzahl == 0:
         print()
@@ -238,7 +373,7 @@ if __name__ == "__main__":
         print(f"      Lege PDFs in: {EINGANG}")
     else:
         print()
-        results = run_import()
+        results = run_import(workers)
 
         for r in results:
             icon = {"ok": "✅", "duplikat": "⏭️ ", "fehler": "❌"}.get(r["status"], "❓")
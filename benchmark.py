@@ -0,0 +1,1070 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+────────────
+Mess- und Prüfskripte für die performance-kritischen Pfade.
+
+Aufruf:
+    python benchmark.py                 ← alle Benchmarks
+    python benchmark.py classify        ← nur einen Benchmark
+
+Jeder Benchmark prüft zuerst, dass der schnelle Pfad dieselben Ergebnisse
+liefert wie die Referenz (bzw. ein Budget einhält), und misst dann den
+Durchsatz. Schlägt eine Prüfung fehl, endet das Skript mit Exit-Code 1.
+"""
+
+import json
+import random
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.resolve()
+DB_PATH = BASE_DIR / 'receipts.db'
+CATEGORIES_PATH = BASE_DIR / 'categories.json'
+
+# Import-Zeit-Budget (kumuliert, in ms) für die Einstiegspunkte
+IMPORT_BUDGET_MS = {
+    'web_app': 600,
+    'reclassify': 200,
+    'batch_import': 200,
+}
+# Diese Module dürfen beim Start NICHT geladen werden (erst bei Bedarf)
+LAZY_MODULES = ('dateparser', 'PyPDF2')
+
+# Typische Artikelnamen wie sie auf Kassenbons stehen (Fallback ohne Datenbank)
+SAMPLE_NAMES = [
+    'MILCH 3,5%', 'H-MILCH 1,5%', 'BIO VOLLMILCH', 'RIESLING TROCKEN 0,75L',
+    'ASTH.SCHEU SPAETLESE', 'FRANZISKANER BLUT', 'WEINTRAUBEN HELL', 'BANANEN',
+    'AEPFEL ELSTAR', 'TOMATEN RISPEN', 'CHERRY ROMA TOMATEN', 'KARTOFFELN FESTK.',
+    'ESSIG BALSAMICO', 'WEINBRAND MATCH', 'RUM BRAUN', 'LEERGUT', 'PFAND 0,25',
+    'DALLMAYR PRODOMO', 'LAVAZZA CREMA', 'EARL GREY TEE', 'SPAGHETTI BARILLA',
+    'PENNE RIGATE', 'GOUDA JUNG SCHEIBEN', 'MOZZARELLA', 'SKYR NATUR',
+    'BUTTER MILDGESAEUERT', 'SCHLAGSAHNE', 'HAEHNCHENBRUSTFILET', 'SALAMI',
+    'TOASTBROT', 'BROETCHEN', 'TK PIZZA SALAMI', 'MCCAIN POMMES', 'PERSIL GEL',
+    'KUECHENROLLE', 'NIVEA CREME', 'OLIVENOEL', 'MAIS DOSE', 'ROSEN BUND',
+    'BENEDIKTINER HELL', 'GERO. MEDIUM', 'COCA COLA 1L', 'APFELSAFTSCHORLE',
+    'SCHWEPPES TONIC', 'UNBEKANNTER ARTIKEL 123', 'GESCHENKTUETE',
+]
+
+
+def load_item_names(limit: int) -> list:
+    """Artikelnamen aus receipts.db – sonst synthetischer Korpus"""
+    names = []
+    if DB_PATH.exists():
+        conn = sqlite3.connect(str(DB_PATH))
+        try:
+            names = [row[0] for row in conn.execute(
+                'SELECT name FROM items WHERE name IS NOT NULL LIMIT ?', (limit,))]
+        except sqlite3.Error:
+            names = []
+        conn.close()
+    if not names:
+        names = SAMPLE_NAMES
+    # Auf gewünschte Größe auffüllen
+    return (names * (limit // len(names) + 1))[:limit]
+
+
+def load_keyword_ruleset() -> dict:
+    """categories.json – sonst aus den literalen Patterns des CategoryClassifier abgeleitet"""
+    if CATEGORIES_PATH.exists():
+        with open(CATEGORIES_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    from receipt_analyzer import CategoryClassifier
+    ruleset = {}
+    for category, patterns in CategoryClassifier.CATEGORIES.items():
+        ruleset[category] = [
+            alternative
+            for pattern in patterns
+            for alternative in pattern.split('|')
+            if re.fullmatch(r'[\wäöüß\- ]+', alternative)
+        ]
+    return ruleset
+
+
+def sample_receipt_lines(number: int) -> list:
+    """Text eines synthetischen Kassenbons (deterministisch je Nummer)"""
+    rnd = random.Random(number)
+    store = ['EDEKA', 'Lidl', 'REWE', 'Kaufland'][number % 4]
+    lines = [f'{store} Markt', 'Hauptstraße 5', '12345 Musterstadt']
+    total = 0.0
+    for name in rnd.sample(SAMPLE_NAMES, rnd.randint(3, 25)):
+        price = rnd.randint(49, 999) / 100
+        total += price
+        lines.append(re.sub(r'[^A-ZÄÖÜ&.\- \d,X]', '', name) + f' {price:.2f}'.replace('.', ',') + ' B')
+    lines.append(f'SUMME {total:.2f}'.replace('.', ','))
+    lines.append(f'{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.25 {rnd.randint(8, 20):02d}:{number % 60:02d}')
+    lines.append('Mastercard')
+    return lines
+
+
+def make_sample_pdf(lines: list) -> bytes:
+    """Minimale einseitige Text-PDF (Helvetica, eine Zeile pro Eintrag)"""
+    def escape(text):
+        return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    content = ('BT /F1 10 Tf 12 TL 20 800 Td '
+               + ' '.join(f'({escape(line)}) Tj T*' for line in lines) + ' ET').encode('cp1252')
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n' % number + obj + b'\nendobj\n'
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return pdf
+
+
+def write_sample_pdfs(directory: Path, count: int) -> list:
+    """Schreibt count synthetische Kassenbon-PDFs nach directory"""
+    paths = []
+    for number in range(count):
+        path = directory / f'beleg_{number:05d}.pdf'
+        path.write_bytes(make_sample_pdf(sample_receipt_lines(number)))
+        paths.append(path)
+    return paths
+
+
+def timed(func, *args):
+    """Führt func aus und gibt (Ergebnis, Sekunden) zurück"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def report(label: str, count: int, seconds: float, unit: str = 'Artikel'):
+    rate = count / seconds if seconds else float('inf')
+    print(f"  {label:28s} {seconds * 1000:9.1f} ms  {rate:12,.0f} {unit}/s")
+
+
+# ─── Benchmarks ──────────────────────────────────────────────────────────────
+
+def bench_classify(size: int = 50000) -> bool:
+    """CategoryClassifier: kompilierter Matcher vs. Pattern-Schleife"""
+    from receipt_analyzer import CategoryClassifier
+
+    names = load_item_names(size)
+
+    # Äquivalenz: jeder (distinct) Name muss identisch klassifiziert werden
+    mismatches = [
+        (name, CategoryClassifier.classify_reference(name), CategoryClassifier.classify(name))
+        for name in set(names)
+        if CategoryClassifier.classify_reference(name) != CategoryClassifier.classify(name)
+    ]
+    for name, expected, actual in mismatches[:10]:
+        print(f"  ✗ {name!r}: {expected} ≠ {actual}")
+
+    CategoryClassifier.classify('warmup')  # Matcher bauen, nicht mitmessen
+    _, t_ref = timed(lambda: [CategoryClassifier.classify_reference(n) for n in names])
+    _, t_new = timed(lambda: [CategoryClassifier.classify(n) for n in names])
+    report('Referenz (re.search)', len(names), t_ref)
+    report('Kompilierter Matcher', len(names), t_new)
+    print(f"  Faktor: {t_ref / t_new:.1f}x")
+    return not mismatches
+
+
+def bench_keywords(size: int = 50000) -> bool:
+    """classify_item: Aho-Corasick-Automat vs. Kategorie×Keyword-Schleife"""
+    from receipt_analyzer import ReceiptParser
+
+    names = load_item_names(size)
+    categories = load_keyword_ruleset()
+    parser = ReceiptParser()
+    keyword_count = sum(len(k or ()) for k in categories.values())
+    print(f"  Regelwerk: {len(categories)} Kategorien, {keyword_count} Keywords")
+
+    mismatches = [
+        name for name in set(names)
+        if parser.classify_item_reference(name, categories) != parser.classify_item(name, categories)
+    ]
+    for name in mismatches[:10]:
+        print(f"  ✗ {name!r}: {parser.classify_item_reference(name, categories)} "
+              f"≠ {parser.classify_item(name, categories)}")
+
+    _, t_ref = timed(lambda: [parser.classify_item_reference(n, categories) for n in names])
+    _, t_new = timed(lambda: [parser.classify_item(n, categories) for n in names])
+    report('Referenz (Schleife)', len(names), t_ref)
+    report('Aho-Corasick', len(names), t_new)
+    print(f"  Faktor: {t_ref / t_new:.1f}x")
+    return not mismatches
+
+
+def bench_textcache(size: int = 300) -> bool:
+    """Text-Extraktion: PyPDF2 vs. Text-Cache (SHA-256)"""
+    from receipt_analyzer import PDFTextCache, ReceiptParser
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_sample_pdfs(Path(tmp), size)
+        uncached = ReceiptParser(use_text_cache=False)
+        cached = ReceiptParser()
+        cached.text_cache = PDFTextCache(Path(tmp) / 'cache.db')
+
+        expected, t_plain = timed(lambda: [uncached.extract_text(p) for p in paths])
+        cold, t_cold = timed(lambda: [cached.extract_text(p) for p in paths])
+        warm, t_warm = timed(lambda: [cached.extract_text(p) for p in paths])
+        # Geparstes Ergebnis muss mit und ohne Cache identisch sein
+        same_receipts = all(uncached.parse_pdf(p) == cached.parse_pdf(p) for p in paths[:20])
+        cached.text_cache.close()
+
+    report('Ohne Cache (PyPDF2)', size, t_plain, 'PDFs')
+    report('Cache kalt (Extraktion+Put)', size, t_cold, 'PDFs')
+    report('Cache warm (Hash+Get)', size, t_warm, 'PDFs')
+    print(f"  Faktor (warm): {t_plain / t_warm:.1f}x")
+    return expected == cold == warm and same_receipts
+
+
+def legacy_extract_date(text: str):
+    """Bisheriger PASS 1 von _extract_date: jeder Kandidat direkt durch dateparser"""
+    import dateparser
+    from datetime import datetime
+    for candidate in re.findall(r'\d{1,2}[./\-]\d{1,2}[./\-]\d{2,4}[^\n]{0,20}', text):
+        parsed = dateparser.parse(candidate, languages=['de', 'en'], settings={
+            'PREFER_DAY_OF_MONTH': 'first',
+            'PREFER_DATES_FROM': 'past',
+            'RELATIVE_BASE': datetime.now(),
+        })
+        if parsed:
+            return parsed
+    return None
+
+
+def bench_dates(size: int = 500) -> bool:
+    """_extract_date: Schnellpfad für deutsche Formate vs. dateparser"""
+    from datetime import datetime
+    from receipt_analyzer import ReceiptParser, parse_date_candidate
+
+    texts, expected = [], []
+    for number in range(size):
+        lines = sample_receipt_lines(number)
+        texts.append('\n'.join(lines))
+        expected.append(datetime.strptime(lines[-2], '%d.%m.%y %H:%M'))
+
+    parser = ReceiptParser()
+    parse_date_candidate.cache_clear()
+    legacy, t_legacy = timed(lambda: [legacy_extract_date(t) for t in texts])
+    fast, t_fast = timed(lambda: [parser._extract_date(t) for t in texts])
+    _, t_memo = timed(lambda: [parser._extract_date(t) for t in texts])
+
+    report('dateparser (bisher)', size, t_legacy, 'Bons')
+    report('Schnellpfad', size, t_fast, 'Bons')
+    report('Schnellpfad (memoisiert)', size, t_memo, 'Bons')
+    print(f"  Faktor: {t_legacy / t_fast:.1f}x")
+    swapped = sum(1 for old, exp in zip(legacy, expected) if old != exp)
+    print(f"  dateparser lag bei {swapped}/{size} Bons daneben (Tag/Monat vertauscht)")
+    return fast == expected
+
+
+def bench_search(size: int = 300000) -> bool:
+    """Artikelsuche: LIKE '%…%' über items vs. FTS5-Trigrammindex"""
+    from receipt_store import has_search_index, init_schema, search_items
+
+    rng = random.Random(10)
+    names = [f'{name} {number}' for name in SAMPLE_NAMES for number in range(100)]
+    terms = ['MILCH', 'tomaten', 'PIZZA SAL', 'ELSTAR 4', 'GOUDA', 'COLA 1L', 'XYZ']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(Path(tmp) / 'bench.db')
+        init_schema(conn)
+        if not has_search_index(conn):
+            print("  SQLite ohne FTS5/Trigramm – nichts zu messen")
+            conn.close()
+            return True
+        conn.executemany(
+            'INSERT INTO items (receipt_id, name, unit_price, quantity, total_price, '
+            'tax_category, category) VALUES (?, ?, ?, 1, ?, ?, ?)',
+            ((n // 20, name, price, price, 'B', 'Sonstiges')
+             for n, (name, price) in enumerate(
+                 (rng.choice(names), rng.randint(19, 999) / 100) for _ in range(size))))
+        conn.commit()
+
+        def legacy(term):
+            return [
+                {'name': row[0], 'category': row[1], 'avg_price': round(row[2], 2),
+                 'purchase_count': row[3]}
+                for row in conn.execute('''
+                    SELECT DISTINCT i.name, i.category,
+                           AVG(i.unit_price) as avg_price,
+                           COUNT(*) as purchase_count
+                    FROM items i
+                    WHERE i.name LIKE ? AND i.category != 'System'
+                    GROUP BY i.name, i.category
+                    ORDER BY purchase_count DESC
+                ''', (f'%{term}%',))
+            ]
+
+        old, t_old = timed(lambda: [legacy(term) for term in terms])
+        new, t_new = timed(lambda: [search_items(conn, term) for term in terms])
+        conn.close()
+
+    key = lambda row: (-row['purchase_count'], row['name'])
+    report('LIKE-Scan', len(terms), t_old, 'Suchen')
+    report('FTS5-Trigramm', len(terms), t_new, 'Suchen')
+    print(f"  Faktor: {t_old / t_new:.1f}x bei {size:,} Artikeln")
+    return all(sorted(a, key=key) == b for a, b in zip(old, new))
+
+
+def bench_suggest(size: int = 300000) -> bool:
+    """Autovervollständigung: Katalog per /api/search?q=%20 vs. Präfixindex im Speicher"""
+    from name_index import NamePrefixIndex, word_keys
+    from receipt_store import init_schema, search_items
+
+    rng = random.Random(11)
+    names = [f'{name} {number}' for name in SAMPLE_NAMES for number in range(100)]
+    prefixes = ['mil', 'tom', 'pizza s', 'b', 'gouda', 'cola', 'xyz']
+
+    def insert(conn, count, category='Sonstiges'):
+        conn.executemany(
+            'INSERT INTO items (receipt_id, name, unit_price, quantity, total_price, '
+            'tax_category, category) VALUES (?, ?, ?, 1, ?, ?, ?)',
+            ((n // 20, name, price, price, 'B', category)
+             for n, (name, price) in enumerate(
+                 (rng.choice(names), rng.randint(19, 999) / 100) for _ in range(count))))
+        conn.commit()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(Path(tmp) / 'bench.db')
+        init_schema(conn)
+        insert(conn, size)
+
+        # Bisher: kompletten Katalog laden, der Browser filtert
+        catalogue, t_catalogue = timed(lambda: json.dumps(search_items(conn, ' ')).encode('utf-8'))
+
+        index = NamePrefixIndex()
+        _, t_build = timed(index.refresh, conn)
+        _, t_suggest = timed(lambda: [index.suggest(prefix, 8) for prefix in prefixes * 100])
+
+        # Inkrementell übernommen == neu aufgebaut (inkl. ausgeblendeter Kategorie)
+        insert(conn, size // 100)
+        conn.execute("INSERT INTO items (receipt_id, name, category) VALUES (0, 'PFAND 0,25', 'System')")
+        conn.execute("INSERT INTO items (receipt_id, name, category) VALUES (0, 'NEUER ARTIKEL', 'Sonstiges')")
+        # Einzelne System-Zeilen blenden einen sonst normalen Namen nicht aus
+        conn.executemany("INSERT INTO items (receipt_id, name, category) VALUES (0, ?, 'System')",
+                         [(name,) for name in names[::50]])
+        conn.commit()
+        _, t_refresh = timed(index.refresh, conn)
+        fresh = NamePrefixIndex()
+        fresh.refresh(conn)
+        same = all(index.suggest(prefix, 8) == fresh.suggest(prefix, 8)
+                   for prefix in prefixes + ['pfand', 'neuer', 'art'])
+
+        counts = dict(conn.execute("SELECT name, COUNT(*) FROM items WHERE category != 'System' GROUP BY name"))
+        conn.close()
+
+    # Referenz: Wortanfang-Treffer, nach Käufen sortiert
+    for prefix in prefixes + [name.lower() for name in names[::50]]:
+        expected = sorted((name for name in counts if any(key.startswith(prefix) for key in word_keys(name))),
+                          key=lambda name: (-counts[name], name))[:8]
+        same = same and [row['name'] for row in fresh.suggest(prefix, 8)] == expected
+
+    report('Katalog laden (q=%20)', 1, t_catalogue, 'Abrufe')
+    print(f"  Katalog: {len(catalogue) / 1024:.0f} KB JSON pro Seitenaufruf")
+    report('Präfixindex', len(prefixes) * 100, t_suggest, 'Vorschläge')
+    print(f"  Aufbau {t_build * 1000:.0f} ms, inkrementell +{size // 100:,} Artikel {t_refresh * 1000:.1f} ms")
+    return same
+
+
+def make_sample_receipts(size: int, seed: int) -> list:
+    """size zufällige Kassenbons (3–25 Artikel, drei Märkte, alle 7 Stunden einer)"""
+    from datetime import datetime, timedelta
+    from receipt_analyzer import Receipt, ReceiptItem
+
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 8, 0)
+    categories = ['Milchprodukte', 'Obst', 'Getränke - Wein', 'Sonstiges', 'System']
+    receipts = []
+    for number in range(size):
+        items = [ReceiptItem(name=name, unit_price=price, quantity=1, total_price=price,
+                             tax_category='A', category=rng.choice(categories))
+                 for name, price in ((rng.choice(SAMPLE_NAMES), rng.randint(19, 999) / 100)
+                                     for _ in range(rng.randint(3, 25)))]
+        receipts.append(Receipt(store_name=rng.choice(['EDEKA', 'REWE', 'LIDL']),
+                                store_address='', date=start + timedelta(hours=7 * number),
+                                items=items, total_amount=sum(i.total_price for i in items),
+                                payment_method='EC'))
+    return receipts
+
+
+def use_legacy_price_history(conn: sqlite3.Connection):
+    """Alte Struktur: price_history als eigene Tabelle statt Sicht, dazu idx_items_name"""
+    conn.executescript('''
+        DROP VIEW price_history;
+        CREATE TABLE price_history (
+            history_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_name TEXT,
+            price REAL,
+            date TIMESTAMP,
+            store_name TEXT,
+            UNIQUE(item_name, date, store_name)
+        );
+        CREATE INDEX idx_price_history_name ON price_history(item_name);
+        DROP INDEX idx_items_name_price;
+        CREATE INDEX idx_items_name ON items(name);
+    ''')
+
+
+def legacy_save_receipt(conn: sqlite3.Connection, receipt):
+    """Bisheriger Schreibpfad: Zeile für Zeile, try/except pro Preis, Commit pro Bon"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO receipts (store_name, store_address, date, total_amount, payment_method)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (receipt.store_name, receipt.store_address, receipt.date,
+          receipt.total_amount, receipt.payment_method))
+    receipt_id = cursor.lastrowid
+    for item in receipt.items:
+        cursor.execute('''
+            INSERT INTO items (receipt_id, name, unit_price, quantity, total_price,
+                               tax_category, category)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (receipt_id, item.name, item.unit_price, item.quantity,
+              item.total_price, item.tax_category, item.category))
+        try:
+            cursor.execute('''
+                INSERT INTO price_history (item_name, price, date, store_name)
+                VALUES (?, ?, ?, ?)
+            ''', (item.name, item.unit_price, receipt.date, receipt.store_name))
+        except sqlite3.IntegrityError:
+            pass
+    conn.commit()
+
+
+def bench_insert(size: int = 2000) -> bool:
+    """Speichern: Zeile für Zeile + Commit pro Bon vs. executemany in einer Transaktion"""
+    from receipt_store import init_schema, save_receipts
+
+    receipts = make_sample_receipts(size, seed=9)
+    rows = sum(len(r.items) for r in receipts)
+
+    def run(save):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = sqlite3.connect(Path(tmp) / 'bench.db')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            init_schema(conn)
+            if save is legacy_save:
+                use_legacy_price_history(conn)
+            _, seconds = timed(save, conn)
+            content = [  # history_id kann sich unterscheiden, der Inhalt nicht
+                conn.execute('SELECT * FROM items ORDER BY item_id').fetchall(),
+                conn.execute('SELECT item_name, price, date, store_name FROM price_history '
+                             'ORDER BY item_name, date, store_name').fetchall(),
+            ]
+            conn.close()
+        return content, seconds
+
+    def legacy_save(conn):
+        for receipt in receipts:
+            legacy_save_receipt(conn, receipt)
+
+    legacy, t_legacy = run(legacy_save)
+    bulk, t_bulk = run(lambda conn: save_receipts(conn, [(r, None, None) for r in receipts]))
+
+    report('pro Zeile, Commit pro Bon', rows, t_legacy, 'Zeilen')
+    report('executemany, eine Transaktion', rows, t_bulk, 'Zeilen')
+    print(f"  Faktor: {t_legacy / t_bulk:.1f}x")
+    return legacy == bulk
+
+
+def legacy_save_receipts(conn: sqlite3.Connection, receipts):
+    """Bisheriges save_receipts: jeder Artikel zusätzlich als Zeile in price_history"""
+    from receipt_store import insert_receipt
+
+    with conn:
+        cursor = conn.cursor()
+        for receipt in receipts:
+            insert_receipt(cursor, receipt)
+            cursor.executemany('''
+                INSERT OR IGNORE INTO price_history (item_name, price, date, store_name)
+                VALUES (?, ?, ?, ?)
+            ''', [(item.name, item.unit_price, receipt.date, receipt.store_name)
+                  for item in receipt.items])
+
+
+def bench_history(size: int = 20000) -> bool:
+    """Preisverlauf: eigene Tabelle price_history vs. Sicht über items (abgedeckter Index)"""
+    from receipt_store import init_schema, matching_names_sql, price_history_sql, save_receipts
+
+    receipts = make_sample_receipts(size, seed=19)
+    terms = ['MILCH', 'TOMATEN', 'RIESLING', 'PFAND 0,25', 'SALAMI', 'BROT']
+    runs = 20
+
+    def run(legacy: bool):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = sqlite3.connect(Path(tmp) / 'bench.db')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            init_schema(conn)
+            if legacy:
+                use_legacy_price_history(conn)
+                _, t_insert = timed(legacy_save_receipts, conn, receipts)
+            else:
+                _, t_insert = timed(save_receipts, conn, [(r, None, None) for r in receipts])
+
+            def history(term):
+                names_sql, params = matching_names_sql(conn, term)
+                if legacy:
+                    sql = f'''SELECT history_id, item_name, price, date, store_name
+                              FROM price_history WHERE item_name IN ({names_sql}) ORDER BY date'''
+                else:
+                    sql = price_history_sql(names_sql)
+                # history_id und die Reihenfolge am selben Tag unterscheiden sich, der Verlauf nicht
+                return sorted(row[1:] for row in conn.execute(sql, params))
+
+            result, t_query = timed(lambda: [history(term) for _ in range(runs) for term in terms])
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            size_kb = sum(f.stat().st_size for f in Path(tmp).iterdir()) / 1024
+            conn.close()
+        return result, t_insert, t_query, size_kb
+
+    old, t_old_insert, t_old_query, old_kb = run(legacy=True)
+    new, t_new_insert, t_new_query, new_kb = run(legacy=False)
+
+    rows = sum(len(r.items) for r in receipts)
+    report('Speichern mit price_history', rows, t_old_insert, 'Zeilen')
+    report('Speichern ohne', rows, t_new_insert, 'Zeilen')
+    report('Verlauf aus price_history', runs * len(terms), t_old_query, 'Abfragen')
+    report('Verlauf aus items-Index', runs * len(terms), t_new_query, 'Abfragen')
+    print(f"  Datenbank: {old_kb / 1024:.1f} MB → {new_kb / 1024:.1f} MB")
+    return old == new
+
+
+def legacy_category_statistics(conn: sqlite3.Connection, store='', date_from='', date_to=''):
+    """Bisherige Auswertung: Aggregat über alle Artikel (JOIN receipts)"""
+    query = '''
+        SELECT i.category, COUNT(*), SUM(i.total_price), AVG(i.unit_price)
+        FROM items i
+        JOIN receipts r ON i.receipt_id = r.receipt_id
+        WHERE i.category != 'System'
+    '''
+    params = []
+    if store:
+        query += ' AND r.store_name LIKE ?'
+        params.append(f'%{store}%')
+    if date_from:
+        query += ' AND r.date >= ?'
+        params.append(date_from)
+    if date_to:
+        query += ' AND r.date <= ?'
+        params.append(date_to + 'T23:59:59')
+    query += ' GROUP BY i.category'
+    return {row[0]: {'count': row[1], 'total_spent': round(row[2], 2),
+                     'avg_price': round(row[3], 2)}
+            for row in conn.execute(query, params)}
+
+
+def bench_rollup(size: int = 20000) -> bool:
+    """Dashboard/Statistik: Aggregat über items vs. Tag × Markt × Kategorie-Rollups"""
+    from receipt_store import category_statistics, init_schema, receipt_count, save_receipts
+
+    filters = [{}, {'store': 'EDE'}, {'date_from': '2024-03-01', 'date_to': '2024-06-30'},
+               {'date_to': '2024-02-15'}, {'store': 'LIDL', 'date_from': '2024-05-05T12:00'}]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(Path(tmp) / 'bench.db')
+        init_schema(conn)
+        receipts = make_sample_receipts(size, seed=11)
+        _, t_insert = timed(save_receipts, conn, [(r, None, None) for r in receipts])
+
+        # Triggerpfade: Reklassifizierung, geänderter Bon, gelöschter Bon
+        with conn:
+            conn.execute("UPDATE items SET category = 'Obst' WHERE name LIKE 'BANANEN%'")
+            conn.execute("UPDATE receipts SET date = '2024-02-15 09:00:00', store_name = 'NETTO' "
+                         "WHERE receipt_id = 7")
+            conn.execute('DELETE FROM items WHERE receipt_id = 8')
+            conn.execute('DELETE FROM receipts WHERE receipt_id IN (8, 9)')
+            conn.execute('DELETE FROM items WHERE receipt_id = 9')
+
+        ok = all(legacy_category_statistics(conn, **f) == category_statistics(conn, **f)
+                 for f in filters)
+        ok &= receipt_count(conn) == conn.execute('SELECT COUNT(*) FROM receipts').fetchone()[0]
+
+        def legacy_dashboard():
+            stats = legacy_category_statistics(conn)
+            receipts_total = conn.execute('SELECT COUNT(*) FROM receipts').fetchone()[0]
+            items_total = conn.execute(
+                "SELECT COUNT(*) FROM items WHERE category != 'System'").fetchone()[0]
+            return stats, receipts_total, items_total
+
+        def dashboard():
+            stats = category_statistics(conn)
+            return stats, receipt_count(conn), sum(cat['count'] for cat in stats.values())
+
+        runs = 20
+        old, t_old = timed(lambda: [legacy_dashboard() for _ in range(runs)])
+        new, t_new = timed(lambda: [dashboard() for _ in range(runs)])
+        rows = conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+        conn.close()
+
+    report('Speichern inkl. Trigger', rows, t_insert, 'Zeilen')
+    report('Dashboard über items', runs, t_old, 'Aufrufe')
+    report('Dashboard aus Rollups', runs, t_new, 'Aufrufe')
+    print(f"  Faktor: {t_old / t_new:.1f}x bei {rows:,} Artikeln")
+    return ok and old == new
+
+
+def scan_price_comparison(conn: sqlite3.Connection, name: str) -> list:
+    """Referenz: aktueller Preis je Markt direkt aus der ganzen Historie (items × receipts)"""
+    rows = conn.execute('''
+        SELECT COALESCE(r.store_name, ''), i.unit_price, r.date, i.item_id
+        FROM items i
+        JOIN receipts r ON i.receipt_id = r.receipt_id
+        WHERE i.name = ? AND i.unit_price IS NOT NULL
+    ''', (name,)).fetchall()
+    newest = lambda row: (row[2] is not None, row[2] or '', row[3])
+    stores = {}
+    for row in rows:
+        stores.setdefault(row[0], []).append(row)
+    result = []
+    for store, purchases in stores.items():
+        latest = max(purchases, key=newest)
+        low = min(row[1] for row in purchases)
+        cheapest = max((row for row in purchases if row[1] == low), key=newest)
+        result.append({'store_name': store, 'latest_price': latest[1], 'latest_date': latest[2],
+                       'min_price': cheapest[1], 'min_date': cheapest[2],
+                       'purchase_count': len(purchases)})
+    return result
+
+
+def bench_prices(size: int = 20000) -> bool:
+    """Preisvergleich: ganze Historie durchsuchen vs. gepflegte Tabelle store_prices"""
+    from receipt_store import init_schema, price_comparison, rebuild_store_prices, save_receipts
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(Path(tmp) / 'bench.db')
+        init_schema(conn)
+        receipts = make_sample_receipts(size, seed=17)
+        _, t_insert = timed(save_receipts, conn, [(r, None, None) for r in receipts])
+
+        # Triggerpfade: geänderter Preis, geänderter Bon, gelöschter Bon
+        with conn:
+            conn.execute("UPDATE items SET unit_price = 0.01 WHERE item_id % 97 = 0")
+            conn.execute("UPDATE receipts SET date = '2030-01-01 09:00:00', store_name = 'NETTO' "
+                         "WHERE receipt_id IN (7, 70)")
+            conn.execute('DELETE FROM items WHERE receipt_id = 8')
+            conn.execute('DELETE FROM receipts WHERE receipt_id IN (8, 9)')
+
+        incremental = conn.execute('SELECT * FROM store_prices ORDER BY 1, 2').fetchall()
+        rebuild_store_prices(conn)
+        ok = incremental == conn.execute('SELECT * FROM store_prices ORDER BY 1, 2').fetchall()
+
+        by_store = lambda stores: sorted(stores, key=lambda s: s['store_name'])
+        ok &= all(by_store(scan_price_comparison(conn, name)) == by_store(price_comparison(conn, name))
+                  for name in SAMPLE_NAMES)
+
+        runs = 5
+        _, t_scan = timed(lambda: [scan_price_comparison(conn, name)
+                                   for _ in range(runs) for name in SAMPLE_NAMES])
+        _, t_table = timed(lambda: [price_comparison(conn, name)
+                                    for _ in range(runs) for name in SAMPLE_NAMES])
+        rows = conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+        conn.close()
+
+    calls = runs * len(SAMPLE_NAMES)
+    report('Speichern inkl. Trigger', rows, t_insert, 'Zeilen')
+    report('Historie durchsuchen', calls, t_scan, 'Abfragen')
+    report('aus store_prices', calls, t_table, 'Abfragen')
+    print(f"  Faktor: {t_scan / t_table:.1f}x bei {rows:,} Artikeln")
+    return ok
+
+
+def legacy_export_csv(conn: sqlite3.Connection) -> str:
+    """Bisheriger Export: fetchall() + kompletter CSV-Text in einem StringIO"""
+    import csv
+    import io
+    from export import CSV_HEADER
+
+    cursor = conn.execute('''
+        SELECT r.date, r.store_name, r.total_amount, r.payment_method,
+               i.name, i.category, i.unit_price, i.quantity, i.total_price
+        FROM receipts r
+        JOIN items i ON r.receipt_id = i.receipt_id
+        WHERE i.category != 'System'
+        ORDER BY r.date DESC
+    ''')
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=';')
+    writer.writerow(CSV_HEADER)
+    for row in cursor.fetchall():
+        writer.writerow([
+            row[0][:10] if row[0] else '', row[1], row[4], row[5],
+            f"{row[6]:.2f}".replace('.', ','), row[7],
+            f"{row[8]:.2f}".replace('.', ','), f"{row[2]:.2f}".replace('.', ','), row[3]
+        ])
+    return output.getvalue()
+
+
+def make_export_db(path: Path, size: int) -> sqlite3.Connection:
+    """Datenbank mit size Artikeln (je ~20 pro Bon) für die Export-Benchmarks"""
+    from receipt_store import init_schema
+
+    rng = random.Random(13)
+    receipts = size // 20
+    conn = sqlite3.connect(path)
+    init_schema(conn)
+    # Trigger (Suche, Rollups) sind für den Export egal – schneller befüllen
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        conn.execute(f'DROP TRIGGER {name}')
+    conn.executemany(
+        'INSERT INTO receipts (store_name, date, total_amount, payment_method) VALUES (?, ?, ?, ?)',
+        ((rng.choice(['EDEKA', 'REWE', 'LIDL']),
+          f'20{rng.randint(20, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} '
+          f'{rng.randint(7, 20):02d}:{rng.randint(0, 59):02d}:00', rng.randint(500, 9000) / 100, 'EC')
+         for _ in range(receipts)))
+    conn.executemany(
+        'INSERT INTO items (receipt_id, name, unit_price, quantity, total_price, '
+        'tax_category, category) VALUES (?, ?, ?, 1, ?, ?, ?)',
+        ((rng.randint(1, receipts), name, price, price, 'B', 'Sonstiges')
+         for name, price in ((rng.choice(SAMPLE_NAMES), rng.randint(19, 999) / 100)
+                             for _ in range(size))))
+    conn.commit()
+    return conn
+
+
+def bench_export(size: int = 1000000) -> bool:
+    """CSV-Export: fetchall + StringIO vs. fetchmany-Generator (Spitzenspeicher)"""
+    import tracemalloc
+    from export import export_query, iter_csv, iter_gzip
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = make_export_db(Path(tmp) / 'bench.db', size)
+
+        def peak_memory(func):
+            tracemalloc.start()
+            result = func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return result, peak
+
+        def stream():
+            lines, size_bytes, last_date = 0, 0, '9999'
+            ordered = True
+            for chunk in iter_csv(conn.execute(*export_query())):
+                size_bytes += len(chunk.encode('utf-8'))
+                for line in chunk.splitlines()[1 if not lines else 0:]:
+                    ordered &= line[:10] <= last_date
+                    last_date = line[:10]
+                lines += chunk.count('\n')
+            return lines, size_bytes, ordered
+
+        # Zeiten ohne tracemalloc messen, Spitzenspeicher in einem eigenen Lauf
+        legacy, t_legacy = timed(lambda: legacy_export_csv(conn))
+        (lines, size_bytes, ordered), t_stream = timed(stream)
+        _, peak_legacy = peak_memory(lambda: legacy_export_csv(conn))
+        _, peak_stream = peak_memory(stream)
+        gzip_bytes, t_gzip = timed(lambda: sum(len(part) for part in
+                                               iter_gzip(iter_csv(conn.execute(*export_query())))))
+        first_chunk, t_first = timed(lambda: next(iter_csv(conn.execute(*export_query()))))
+        same = sorted(legacy.splitlines()) == sorted(
+            ''.join(iter_csv(conn.execute(*export_query()))).splitlines())
+        conn.close()
+
+    mb = 1024 * 1024
+    report('fetchall + StringIO', size, t_legacy, 'Zeilen')
+    report('fetchmany-Generator', size, t_stream, 'Zeilen')
+    print(f"  Spitzenspeicher: {peak_legacy / mb:.1f} MB → {peak_stream / mb:.1f} MB "
+          f"(Export {len(legacy.encode('utf-8')) / mb:.1f} MB)")
+    print(f"  Erstes Byte nach {t_first * 1000:.1f} ms statt {t_legacy * 1000:.0f} ms")
+    print(f"  gzip: {size_bytes / mb:.1f} MB → {gzip_bytes / mb:.1f} MB in {t_gzip:.1f} s")
+    return same and ordered and lines == legacy.count('\n') and peak_stream < 16 * mb
+
+
+def bench_xlsx(size: int = 300000) -> bool:
+    """Excel-Export: .xlsx per Streaming-Writer (Zeit, Spitzenspeicher, Lesbarkeit)"""
+    import io
+    import tracemalloc
+    import zipfile
+    from xml.etree import ElementTree
+    from export import export_query, iter_csv, iter_xlsx_export
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = make_export_db(Path(tmp) / 'bench.db', size)
+        workbook, t_xlsx = timed(lambda: b''.join(iter_xlsx_export(conn.execute(*export_query()))))
+
+        tracemalloc.start()
+        for _ in iter_xlsx_export(conn.execute(*export_query())):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        csv_lines = ''.join(iter_csv(conn.execute(*export_query()))).splitlines()
+        conn.close()
+
+    # Inhalt zurücklesen und mit dem CSV-Export vergleichen (Stichproben)
+    ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+    rows = []
+    with zipfile.ZipFile(io.BytesIO(workbook)) as archive:
+        with archive.open('xl/worksheets/sheet1.xml') as sheet:
+            for _, element in ElementTree.iterparse(sheet):
+                if element.tag == ns + 'row':
+                    if len(rows) < 3 or int(element.get('r')) == len(csv_lines):
+                        rows.append([''.join(cell.itertext()) for cell in element])
+                    else:
+                        rows.append(None)
+                    element.clear()
+    first, last = csv_lines[1].split(';'), csv_lines[-1].split(';')
+    ok = (len(rows) == len(csv_lines)
+          and rows[1][2] == first[2] and rows[1][4] == first[4].replace(',', '.')
+          and rows[-1][2] == last[2] and rows[-1][8] == last[8])
+
+    try:
+        import openpyxl  # optional – nur zur Kontrolle, ob Excel-Leser die Datei öffnen
+        sheet = openpyxl.load_workbook(io.BytesIO(workbook), read_only=True).active
+        check = next(sheet.iter_rows(min_row=2, max_row=2, values_only=True))
+        ok &= (check[0].strftime('%Y-%m-%d') == first[0] and check[2] == first[2]
+               and check[4] == float(first[4].replace(',', '.')))
+        print("  openpyxl: Datei lesbar, Datum/Text/Beträge korrekt typisiert")
+    except ImportError:
+        pass
+
+    mb = 1024 * 1024
+    report('xlsx streamen', size, t_xlsx, 'Zeilen')
+    print(f"  Datei {len(workbook) / mb:.1f} MB, Spitzenspeicher {peak / mb:.1f} MB")
+    return ok and peak < 16 * mb
+
+
+def io_counters():
+    """(gelesene, geschriebene) Bytes dieses Prozesses laut /proc/self/io – None ohne Linux"""
+    try:
+        fields = dict(line.split(': ') for line in Path('/proc/self/io').read_text().splitlines())
+    except OSError:
+        return None
+    return int(fields['rchar']), int(fields['wchar'])
+
+
+def legacy_upload(data: bytes, upload_dir: Path, archive_dir: Path):
+    """Bisheriger Upload-Pfad: speichern, hashen, parsen, kopieren, Kopie hashen, löschen"""
+    import shutil
+    from receipt_analyzer import ReceiptParser, calculate_file_hash
+
+    temp_path = upload_dir / 'upload.pdf'
+    temp_path.write_bytes(data)
+    pdf_hash = calculate_file_hash(temp_path)
+    receipt = ReceiptParser(use_text_cache=False).parse_pdf(temp_path, pdf_hash=pdf_hash)
+    pdf_path = archive_dir / f'{pdf_hash}.pdf'
+    shutil.copy2(temp_path, pdf_path)
+    calculate_file_hash(pdf_path)
+    temp_path.unlink()
+    return receipt, pdf_hash, pdf_path
+
+
+def single_pass_upload(data: bytes, archive_dir: Path):
+    """Neuer Upload-Pfad: Hash beim Empfang, Parsen aus dem Speicher, ein Schreibvorgang"""
+    from pdf_ingest import HashingBuffer, archive_pdf
+    from receipt_analyzer import ReceiptParser
+
+    buffer = HashingBuffer()
+    for start in range(0, len(data), 64 * 1024):  # wie der Multipart-Parser in Blöcken
+        buffer.write(data[start:start + 64 * 1024])
+    receipt = ReceiptParser(use_text_cache=False).parse_pdf(buffer, pdf_hash=buffer.hexdigest())
+    pdf_path = archive_pdf(buffer, archive_dir, receipt.date, receipt.store_name)
+    return receipt, buffer.hexdigest(), pdf_path
+
+
+def bench_upload(size: int = 300) -> bool:
+    """Upload: Temp-Datei + copy2 vs. Hash beim Empfang + atomares Ablegen (Platten-I/O)"""
+    import hashlib
+
+    pdfs = [make_sample_pdf(sample_receipt_lines(number)) for number in range(size)]
+    total = sum(len(pdf) for pdf in pdfs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for name in ('uploads', 'alt', 'neu'):
+            (tmp / name).mkdir()
+
+        def run(upload):
+            before = io_counters()
+            results, seconds = timed(lambda: [upload(pdf) for pdf in pdfs])
+            after = io_counters()
+            io = (after[0] - before[0], after[1] - before[1]) if before else None
+            return results, seconds, io
+
+        legacy, t_legacy, io_legacy = run(lambda pdf: legacy_upload(pdf, tmp / 'uploads', tmp / 'alt'))
+        single, t_single, io_single = run(lambda pdf: single_pass_upload(pdf, tmp / 'neu'))
+
+        same = all(
+            old[0] == new[0] and old[1] == new[1] == hashlib.sha256(pdf).hexdigest()
+            and new[2].read_bytes() == pdf
+            for pdf, old, new in zip(pdfs, legacy, single)
+        )
+        leftovers = [p for p in (tmp / 'neu').rglob('*') if p.is_file() and p.suffix != '.pdf']
+        same = same and not leftovers and not any((tmp / 'uploads').iterdir())
+
+    report('Temp-Datei + copy2', size, t_legacy, 'PDFs')
+    report('Single-Pass', size, t_single, 'PDFs')
+    if io_legacy and io_single:
+        kb = 1024
+        print(f"  Pro Upload ({total / size / kb:.1f} KB PDF): "
+              f"gelesen {io_legacy[0] / size / kb:.1f} → {io_single[0] / size / kb:.1f} KB, "
+              f"geschrieben {io_legacy[1] / size / kb:.1f} → {io_single[1] / size / kb:.1f} KB")
+        return same and io_single[0] < io_legacy[0] and io_single[1] < io_legacy[1]
+    return same
+
+
+# Modellnetz für die Ladezeit-Schätzung (langsames Mobilnetz)
+NET_RTT = 0.150              # Sekunden pro Round-Trip
+NET_BYTES_PER_SEC = 200_000  # ≈ 1,6 Mbit/s
+
+
+def load_shell(client, assets: list, cached: dict) -> tuple:
+    """
+    Lädt / wie ein Browser: Seite, dann (parallel) ihre Assets und den
+    Service Worker. cached: URL → ETag aus dem letzten Besuch; immutable
+    Assets werden daraus gar nicht erst angefragt.
+    Gibt (Bytes, Requests, geschätzte Ladezeit in s) zurück.
+    """
+    def get(url):
+        headers = {'Accept-Encoding': 'gzip'}
+        if cached.get(url):
+            headers['If-None-Match'] = cached[url]
+        response = client.get(url, headers=headers)
+        cached[url] = response.headers.get('ETag')
+        if 'immutable' in response.headers.get('Cache-Control', ''):
+            cached[url] = 'immutable'
+        return len(response.data)
+
+    page = get('/')
+    wave = [get(url) for url in assets + ['/service-worker.js'] if cached.get(url) != 'immutable']
+    seconds = NET_RTT + page / NET_BYTES_PER_SEC
+    if wave:
+        seconds += NET_RTT + sum(wave) / NET_BYTES_PER_SEC
+    return page + sum(wave), 1 + len(wave), seconds
+
+
+def bench_shell(size: int = 20) -> bool:
+    """App-Shell: Inline-Template ohne Caching vs. vorab gebaut (Hash-Namen, gzip, immutable)"""
+    import gzip
+    from static_assets import EXTERNAL_SCRIPT, INLINE_BLOCK
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:  # web_app legt Log + Ordner im cwd an
+        os.chdir(tmp)
+        try:
+            import web_app
+            client = web_app.app.test_client()
+
+            web_app._app_shell = None
+            dev_html = client.get('/').get_data(as_text=True)
+            dev_cached = {}
+            dev_cold = load_shell(client, [], dev_cached)
+            dev_warm, t_dev = timed(lambda: [load_shell(client, [], dev_cached) for _ in range(size)])
+
+            web_app.build_app_shell()
+            shell = web_app._app_shell
+            assets = [f'/static/build/{name}' for name in shell['assets']]
+            prod_cached = {}
+            prod_cold = load_shell(client, assets, prod_cached)
+            prod_warm, t_prod = timed(lambda: [load_shell(client, assets, prod_cached) for _ in range(size)])
+        finally:
+            web_app._app_shell = None
+            os.chdir(cwd)
+
+    # Ausgelagerte Blöcke = Inline-Blöcke des Templates, gzip verlustfrei
+    template = EXTERNAL_SCRIPT.sub(r'\1\2', dev_html)
+    blocks = [match.group(2).strip() for match in INLINE_BLOCK.finditer(template)]
+    same = (blocks == [asset.data.decode('utf-8').strip() for asset in shell['assets'].values()]
+            and all(gzip.decompress(asset.gzip) == asset.data
+                    for asset in list(shell['assets'].values()) + [shell['page']]))
+
+    kb = 1024
+    for label, cold, warm in (('Inline (Entwicklung)', dev_cold, dev_warm[-1]),
+                              ('App-Shell (Produktion)', prod_cold, prod_warm[-1])):
+        print(f"  {label:24s} erster Besuch {cold[0] / kb:6.1f} KB in {cold[1]} Requests (~{cold[2] * 1000:.0f} ms), "
+              f"wiederholt {warm[0] / kb:6.1f} KB in {warm[1]} Requests (~{warm[2] * 1000:.0f} ms)")
+    print(f"  Server-Zeit wiederholter Besuch: {t_dev / size * 1000:.2f} → {t_prod / size * 1000:.2f} ms "
+          f"(Netz: {NET_RTT * 1000:.0f} ms RTT, {NET_BYTES_PER_SEC * 8 / 1e6:.1f} Mbit/s; ohne chart.js-CDN)")
+    return same and prod_cold[0] < dev_cold[0] and prod_warm[-1][0] < dev_warm[-1][0]
+
+
+def measure_import(module: str) -> tuple:
+    """
+    Importiert module in einem frischen Interpreter mit "python -X importtime".
+    Gibt (kumulierte Zeit in ms, Menge der geladenen Modulnamen) zurück.
+    """
+    with tempfile.TemporaryDirectory() as tmp:  # web_app legt Log + Ordner im cwd an
+        env = dict(os.environ, PYTHONPATH=str(BASE_DIR))
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                              cwd=tmp, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    loaded, total_us = set(), 0
+    for line in proc.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2].strip()
+            loaded.add(name)
+            if name == module:
+                total_us = int(parts[1])
+    return total_us / 1000, loaded
+
+
+def bench_startup() -> bool:
+    """Import-Zeit der Einstiegspunkte (python -X importtime) gegen Budget"""
+    ok = True
+    for module, budget in IMPORT_BUDGET_MS.items():
+        total_ms, loaded = min((measure_import(module) for _ in range(3)), key=lambda r: r[0])
+        eager = [name for name in LAZY_MODULES if name in loaded]
+        status = '✓' if total_ms <= budget and not eager else '✗'
+        print(f"  {status} {module:14s} {total_ms:7.1f} ms  (Budget {budget} ms)"
+              + (f"  lädt sofort: {', '.join(eager)}" if eager else ''))
+        ok = ok and status == '✓'
+    return ok
+
+
+BENCHMARKS = {
+    'classify': bench_classify,
+    'keywords': bench_keywords,
+    'textcache': bench_textcache,
+    'dates': bench_dates,
+    'insert': bench_insert,
+    'search': bench_search,
+    'suggest': bench_suggest,
+    'rollup': bench_rollup,
+    'prices': bench_prices,
+    'history': bench_history,
+    'export': bench_export,
+    'xlsx': bench_xlsx,
+    'upload': bench_upload,
+    'shell': bench_shell,
+    'startup': bench_startup,
+}
+
+
+def main():
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unbekannter Benchmark: {', '.join(unknown)}")
+        print(f"Verfügbar: {', '.join(BENCHMARKS)}")
+        sys.exit(2)
+
+    ok = True
+    for name in selected:
+        print()
+        print(f"═══ {name}: {BENCHMARKS[name].__doc__}")
+        if not BENCHMARKS[name]():
+            print("  ✗ PRÜFUNG FEHLGESCHLAGEN (Abweichung oder Budget)!")
+            ok = False
+    print()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+export.py
+─────────
+Export aller Artikel (mit Kassenbon-Daten) für die Buchhaltung.
+
+    export_query(store, date_from, date_to)  ← SQL + Parameter (gleiche Filter wie die Web-App)
+    iter_csv(cursor)                         ← CSV-Text in Stücken (Semikolon, Dezimalkomma)
+    iter_gzip(chunks)                        ← dieselben Stücke gzip-komprimiert
+    iter_xlsx_export(cursor)                 ← echte Excel-Datei (.xlsx) in Stücken
+
+Die Zeilen werden per fetchmany in Blöcken vom Cursor gelesen und sofort
+formatiert – der Speicherbedarf bleibt konstant, egal wie groß der Export
+ist, und das erste Byte geht raus, bevor die letzte Zeile gelesen wurde.
+"""
+
+import csv
+import io
+import sqlite3
+import zlib
+from datetime import date
+from typing import Iterable, Iterator, List, Tuple
+
+from xlsx_writer import DATE, MONEY, NUMBER, TEXT, iter_xlsx
+
+
+# Zeilen pro fetchmany()-Block
+EXPORT_BATCH_SIZE = 1000
+
+CSV_HEADER = ['Datum', 'Geschäft', 'Artikel', 'Kategorie', 'Einzelpreis',
+              'Menge', 'Gesamtpreis', 'Kassenbon-Summe', 'Zahlungsmethode']
+
+# Excel: gleiche Spalten, aber echte Datums- und Eurowerte
+XLSX_COLUMN_TYPES = [DATE, TEXT, TEXT, TEXT, MONEY, NUMBER, MONEY, MONEY, TEXT]
+XLSX_COLUMN_WIDTHS = [11, 22, 34, 26, 12, 7, 12, 16, 16]
+
+
+def export_query(store: str = '', date_from: str = '', date_to: str = '') -> Tuple[str, List]:
+    """
+    SQL + Parameter für den Export, neueste Kassenbons zuerst.
+    CROSS JOIN: Kassenbons in Datumsreihenfolge über idx_receipts_date, die
+    Artikel je Bon über idx_items_receipt_category – SQLite muss dafür
+    nicht den ganzen Export zwischenspeichern und sortieren.
+    """
+    query = '''
+        SELECT r.date, r.store_name, r.total_amount, r.payment_method,
+               i.name, i.category, i.unit_price, i.quantity, i.total_price
+        FROM receipts r
+        CROSS JOIN items i ON r.receipt_id = i.receipt_id
+        WHERE i.category != 'System'
+    '''
+    params = []
+
+    if store:
+        query += ' AND r.store_name LIKE ?'
+        params.append(f'%{store}%')
+    if date_from:
+        query += ' AND r.date >= ?'
+        params.append(date_from)
+    if date_to:
+        query += ' AND r.date <= ?'
+        params.append(date_to + 'T23:59:59')
+
+    query += ' ORDER BY r.date DESC'
+    return query, params
+
+
+def iter_rows(cursor: sqlite3.Cursor, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[list]:
+    """Liefert die Ergebnisse des Cursors blockweise (fetchmany)"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def format_price(value: float) -> str:
+    """1234.5 → '1234,50'"""
+    return f"{value:.2f}".replace('.', ',')
+
+
+def export_row(row) -> list:
+    """Eine Exportzeile (Spaltenreihenfolge wie CSV_HEADER)"""
+    date, store_name, total_amount, payment_method, name, category, unit_price, quantity, total_price = row
+    return [
+        date[:10] if date else '', store_name, name, category,
+        format_price(unit_price),
+        quantity,
+        format_price(total_price),
+        format_price(total_amount),
+        payment_method
+    ]
+
+
+def iter_csv(cursor: sqlite3.Cursor, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """CSV-Text (Kopfzeile + ein Stück pro Block) zu einem export_query()-Cursor"""
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=';')
+
+    writer.writerow(CSV_HEADER)
+    for rows in iter_rows(cursor, batch_size):
+        writer.writerows(export_row(row) for row in rows)
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate()
+
+    if output.tell():  # leerer Export: nur die Kopfzeile
+        yield output.getvalue()
+
+
+def xlsx_row(row) -> list:
+    """Eine Exportzeile mit Datum/Zahlen als Python-Werte (für die Excel-Zellen)"""
+    row_date, store_name, total_amount, payment_method, name, category, unit_price, quantity, total_price = row
+    try:
+        day = date.fromisoformat(row_date[:10]) if row_date else None
+    except ValueError:
+        day = row_date  # unbekanntes Format → bleibt Text
+    return [day, store_name, name, category, unit_price, quantity, total_price,
+            total_amount, payment_method]
+
+
+def iter_xlsx_export(cursor: sqlite3.Cursor, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Excel-Arbeitsmappe (.xlsx) zu einem export_query()-Cursor, stückweise"""
+    rows = (xlsx_row(row) for rows in iter_rows(cursor, batch_size) for row in rows)
+    return iter_xlsx(CSV_HEADER, rows, XLSX_COLUMN_TYPES, sheet_name='Kassenbons',
+                     column_widths=XLSX_COLUMN_WIDTHS)
+
+
+def iter_gzip(chunks: Iterable[str], encoding: str = 'utf-8', level: int = 6) -> Iterator[bytes]:
+    """Komprimiert Textstücke fortlaufend im gzip-Format (für Content-Encoding: gzip)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip-Header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode(encoding))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+folder_watcher.py
+─────────────────
+Überwacht den Eingangsordner und übergibt neue PDFs automatisch an den
+Import, sobald sie fertig geschrieben sind.
+
+    watcher = FolderWatcher(EINGANG, on_ready, idle)
+    watcher.start()               ← Hintergrund-Thread
+    watcher.pending_files()       ← PDFs im Ordner (aus dem Speicher, ohne Scan)
+
+Unter Linux meldet inotify (per ctypes, ohne Zusatzpaket) jede Änderung,
+sonst (Windows, macOS, Netzlaufwerke) wird der Ordner alle poll_interval
+Sekunden gelesen. Eine PDF gilt erst als fertig, wenn sich Größe und
+Änderungszeit settle Sekunden lang nicht mehr geändert haben – halb
+kopierte Dateien (Scanner, Netzwerkfreigabe) werden so nicht angefasst.
+
+Kommandozeile: python folder_watcher.py  ← Ordner überwachen und importieren
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Sekunden ohne Größen-/Zeitänderung, bevor eine PDF importiert wird
+SETTLE_SECONDS = 2.0
+
+# Sekunden zwischen zwei Ordner-Scans ohne inotify
+POLL_INTERVAL = 2.0
+
+# inotify-Konstanten (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def is_pdf(name: str) -> bool:
+    """PDF im Eingangsordner? Endung ohne Groß-/Kleinschreibung, keine versteckten Dateien"""
+    return name.lower().endswith('.pdf') and not name.startswith('.')
+
+
+def list_pdfs(folder: Path) -> List[Path]:
+    """Alle PDFs im Ordner (sortiert) – dieselbe Auswahl wie die Überwachung"""
+    try:
+        return sorted(Path(entry.path) for entry in os.scandir(folder)
+                      if is_pdf(entry.name) and entry.is_file())
+    except OSError:
+        return []
+
+
+class _Inotify:
+    """Dünne ctypes-Hülle um inotify für genau einen Ordner"""
+
+    def __init__(self, folder: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 fehlgeschlagen')
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(folder)), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f'inotify_add_watch fehlgeschlagen: {folder}')
+        self.lost = False  # Ordner gelöscht/verschoben → neu anlegen und beobachten
+
+    def read(self, timeout: float) -> Optional[List[tuple]]:
+        """
+        Wartet bis zu timeout Sekunden auf Ereignisse → [(mask, name)].
+        None: Ereignisse gingen verloren (Überlauf) oder der Ordner ist weg.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events, offset = [], 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                self.lost = True
+                return None
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if not mask & IN_ISDIR:
+                events.append((mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Entry:
+    __slots__ = ('size', 'mtime', 'changed_at', 'submitted')
+
+    def __init__(self):
+        self.size = -1
+        self.mtime = -1
+        self.changed_at = 0.0
+        self.submitted = False
+
+
+class FolderWatcher(threading.Thread):
+    """
+    Hält einen Index aller PDFs im Ordner und ruft on_ready(paths) mit den
+    fertig geschriebenen, noch nicht übergebenen PDFs auf. Gibt on_ready
+    False zurück (z.B. weil gerade ein Import läuft), wird es beim nächsten
+    Durchlauf erneut versucht. Verschwindet eine Datei aus dem Ordner
+    (importiert, verschoben, gelöscht), fällt sie aus dem Index.
+
+    idle() meldet, dass kein Import mehr wartet oder läuft. Liegen dann
+    noch übergebene PDFs im Ordner (Job abgebrochen, fehlgeschlagen oder
+    nicht bis zu ihnen gekommen), werden sie erneut übergeben.
+    """
+
+    def __init__(self, folder: Path, on_ready: Callable[[List[Path]], bool],
+                 idle: Optional[Callable[[], bool]] = None, settle: float = SETTLE_SECONDS, poll_interval: float = POLL_INTERVAL,
+                 use_inotify: bool = True):
+        super().__init__(name='folder-watcher', daemon=True)
+        self.folder = Path(folder)
+        self.on_ready = on_ready
+        self.idle = idle
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and sys.platform.startswith('linux')
+        self.backend = None
+        self.indexed = threading.Event()  # gesetzt, sobald der Ordner einmal gelesen wurde
+        self._files: Dict[str, _Entry] = {}
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    # ─── Index ───────────────────────────────────────────────────────────────
+
+    def pending_files(self) -> List[str]:
+        """Alle PDFs, die gerade im Ordner liegen (sortiert)"""
+        with self._lock:
+            return sorted(self._files)
+
+    def _update(self, name: str, now: float):
+        """Gleicht einen Index-Eintrag mit der Datei ab"""
+        try:
+            stat = os.stat(self.folder / name)
+        except OSError:
+            with self._lock:
+                self._files.pop(name, None)
+            return
+        with self._lock:
+            entry = self._files.get(name)
+            if entry is None:
+                entry = self._files[name] = _Entry()
+            if (stat.st_size, stat.st_mtime_ns) != (entry.size, entry.mtime):
+                entry.size, entry.mtime, entry.changed_at = stat.st_size, stat.st_mtime_ns, now
+                entry.submitted = False  # ersetzt/neu geschrieben → neu prüfen
+
+    def _rescan(self, now: float):
+        """Liest den Ordner komplett ein (Start, Polling, inotify-Überlauf)"""
+        try:
+            names = {entry.name for entry in os.scandir(self.folder)
+                     if is_pdf(entry.name) and entry.is_file()}
+        except OSError:
+            names = set()
+        with self._lock:
+            for gone in set(self._files) - names:
+                del self._files[gone]
+        for name in names:
+            self._update(name, now)
+
+    def _release(self):
+        """Job vorbei → noch vorhandene übergebene PDFs wieder freigeben"""
+        with self._lock:
+            submitted = [entry for entry in self._files.values() if entry.submitted]
+        if not submitted or self.idle is None or not self.idle():
+            return
+        with self._lock:
+            for entry in submitted:
+                entry.submitted = False
+        logger.info(f"[WATCH] {len(submitted)} PDF(s) nach Ende des Imports noch im Ordner")
+
+    def _settle(self, now: float):
+        """Prüft unfertige PDFs erneut und übergibt die fertigen"""
+        self._release()
+        with self._lock:
+            waiting = [name for name, entry in self._files.items() if not entry.submitted]
+        for name in waiting:
+            self._update(name, now)
+
+        with self._lock:
+            ready = sorted(name for name, entry in self._files.items()
+                           if not entry.submitted and now - entry.changed_at >= self.settle)
+        if not ready or now < self._retry_at:
+            return
+
+        try:
+            accepted = self.on_ready([self.folder / name for name in ready])
+        except Exception:
+            logger.exception("[WATCH] Übergabe an den Import fehlgeschlagen")
+            accepted = False
+        if not accepted:
+            self._retry_at = now + self.poll_interval
+            return
+        with self._lock:
+            for name in ready:
+                if name in self._files:
+                    self._files[name].submitted = True
+
+    # ─── Thread ──────────────────────────────────────────────────────────────
+
+    def stop(self):
+        self._stop.set()
+
+    def _open_inotify(self) -> Optional[_Inotify]:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        if not self.use_inotify:
+            return None
+        try:
+            return _Inotify(self.folder)
+        except (OSError, AttributeError) as exc:
+            logger.warning(f"[WATCH] inotify nicht verfügbar ({exc}) – Polling")
+            self.use_inotify = False
+            return None
+
+    def run(self):
+        inotify = self._open_inotify()
+        self.backend = 'inotify' if inotify else 'polling'
+        logger.info(f"[WATCH] Überwache {self.folder} ({self.backend})")
+
+        try:
+            self._rescan(time.monotonic())
+            self.indexed.set()
+            while not self._stop.is_set():
+                if inotify is None:
+                    self._stop.wait(self.poll_interval)
+                    self._rescan(time.monotonic())
+                else:
+                    # Kurz warten, solange Dateien auf das Ende des Schreibens warten
+                    with self._lock:
+                        busy = any(not entry.submitted for entry in self._files.values())
+                    events = inotify.read(min(self.settle / 2, 0.5) if busy else self.poll_interval)
+                    now = time.monotonic()
+                    if events is None:
+                        if inotify.lost:
+                            inotify.close()
+                            inotify = self._open_inotify()
+                            if inotify is None:
+                                self.backend = 'polling'
+                        self._rescan(now)
+                    else:
+                        for _, name in events:
+                            if is_pdf(name):
+                                self._update(name, now)
+                self._settle(time.monotonic())
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+
+# ─── Kommandozeilen-Einstieg ─────────────────────────────────────────────────
+if __name__ == "__main__":
+    from batch_import import EINGANG, PARSE_WORKERS
+    from import_jobs import ImportJobRunner, job_status
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    runner = ImportJobRunner(workers=PARSE_WORKERS)
+    runner.start()
+
+    def submit(pdfs):
+        job_id, created = runner.submit(pdfs)
+        if created:
+            logger.info(f"[WATCH] {len(pdfs)} PDF(s) → Import-Job #{job_id}")
+        return created
+
+    watcher = FolderWatcher(EINGANG, submit, runner.idle)
+    watcher.start()
+    print(f"  👀  Überwache {EINGANG} – Strg+C beendet")
+
+    version = 0
+    try:
+        while True:
+            version = runner.wait_for_change(version, 60)
+            job_id = runner.active_job
+            if job_id is not None:
+                conn = runner.connect()
+                try:
+                    s = job_status(conn, job_id, since=None)['zusammenfassung']
+                finally:
+                    conn.close()
+                print(f"  Job #{job_id}: {s['erledigt']}/{s['gesamt']} · {s['neu']} neu · "
+                      f"{s['duplikat']} Duplikate · {s['fehler']} Fehler")
+    except KeyboardInterrupt:
+        watcher.stop()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+import_jobs.py
+──────────────
+Batch-Import als Hintergrund-Job – die Web-App wartet nicht mehr, bis der
+ganze Eingangsordner verarbeitet ist.
+
+    runner = ImportJobRunner(workers)
+    runner.start()              ← Worker-Thread starten, unterbrochene Jobs fortsetzen
+    runner.submit()             ← Job für alle (oder die angegebenen) PDFs im Eingang anlegen
+    runner.cancel(job_id)       ← Abbruch anfordern
+    job_status(conn, job_id)    ← Status + Ergebnis je Datei
+
+Jeder Job legt beim Start seine Dateiliste in import_job_files an. Das
+Ergebnis einer Datei wird in derselben Transaktion wie ihr Kassenbon
+geschrieben (ImportWriter-Journal). Nach einem Neustart setzt der Runner
+einen unterbrochenen Job deshalb genau bei der ersten offenen Datei fort.
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from batch_import import EINGANG, ensure_dirs, get_db, import_files
+from folder_watcher import list_pdfs
+from receipt_store import init_schema
+
+
+logger = logging.getLogger(__name__)
+
+# Job-Status
+WARTEND = 'wartend'
+LAEUFT = 'laeuft'
+FERTIG = 'fertig'
+ABGEBROCHEN = 'abgebrochen'
+FEHLGESCHLAGEN = 'fehler'
+
+AKTIV = (WARTEND, LAEUFT)
+
+# Status einer noch nicht bearbeiteten Datei
+OFFEN = 'offen'
+
+# PDFs pro Transaktion im Job – 1 = Fortschritt nach jeder Datei sichtbar
+# und ein Neustart wiederholt keine Datei. Das Parsen dauert ein Vielfaches
+# eines Commits (WAL, synchronous=NORMAL), größere Blöcke bringen hier nichts.
+JOB_COMMIT_BATCH = 1
+
+JOB_SCHEMA_SQL = f'''
+    CREATE TABLE IF NOT EXISTS import_jobs (
+        job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT NOT NULL DEFAULT '{WARTEND}',
+        created_at TEXT NOT NULL,
+        started_at TEXT,
+        finished_at TEXT,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        error TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS import_job_files (
+        job_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        datei TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT '{OFFEN}',
+        nachricht TEXT NOT NULL DEFAULT '',
+        ziel TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (job_id, position)
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs(status);
+'''
+
+
+def init_job_schema(conn: sqlite3.Connection):
+    """Legt die Job-Tabellen an, falls sie fehlen"""
+    conn.executescript(JOB_SCHEMA_SQL)
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def create_job(conn: sqlite3.Connection, pdfs: List[Path]) -> int:
+    """Legt einen wartenden Job mit seiner Dateiliste an"""
+    cur = conn.execute('INSERT INTO import_jobs (status, created_at) VALUES (?, ?)',
+                       (WARTEND, _now()))
+    job_id = cur.lastrowid
+    conn.executemany(
+        'INSERT INTO import_job_files (job_id, position, datei) VALUES (?, ?, ?)',
+        [(job_id, position, pdf.name) for position, pdf in enumerate(pdfs, start=1)]
+    )
+    conn.commit()
+    return job_id
+
+
+def active_job_id(conn: sqlite3.Connection) -> Optional[int]:
+    """Der älteste wartende oder laufende Job (None, wenn keiner aktiv ist)"""
+    row = conn.execute(
+        'SELECT job_id FROM import_jobs WHERE status IN (?, ?) ORDER BY job_id LIMIT 1', AKTIV
+    ).fetchone()
+    return row[0] if row else None
+
+
+def unfinished_jobs(conn: sqlite3.Connection) -> List[int]:
+    """Jobs, die vor einem Neustart nicht fertig geworden sind"""
+    rows = conn.execute('SELECT job_id FROM import_jobs WHERE status IN (?, ?) ORDER BY job_id',
+                        AKTIV).fetchall()
+    return [row[0] for row in rows]
+
+
+def record_result(conn: sqlite3.Connection, job_id: int, position: int, out: dict):
+    """Ergebnis einer Datei (ohne Commit – läuft in der Transaktion des Kassenbons)"""
+    conn.execute(
+        'UPDATE import_job_files SET status = ?, nachricht = ?, ziel = ? '
+        'WHERE job_id = ? AND position = ?',
+        (out['status'], out['nachricht'], out['ziel'], job_id, position)
+    )
+
+
+def finish_job(conn: sqlite3.Connection, job_id: int, status: str, error: Optional[str] = None):
+    conn.execute('UPDATE import_jobs SET status = ?, finished_at = ?, error = ? WHERE job_id = ?',
+                 (status, _now(), error, job_id))
+    conn.commit()
+
+
+def request_cancel(conn: sqlite3.Connection, job_id: int) -> Optional[str]:
+    """
+    Markiert einen aktiven Job zum Abbruch; ein noch wartender Job ist sofort
+    abgebrochen. Gibt den Job-Status zurück (None = Job unbekannt).
+    """
+    conn.execute('UPDATE import_jobs SET cancel_requested = 1 WHERE job_id = ? AND status IN (?, ?)',
+                 (job_id, *AKTIV))
+    conn.execute('UPDATE import_jobs SET status = ?, finished_at = ? WHERE job_id = ? AND status = ?',
+                 (ABGEBROCHEN, _now(), job_id, WARTEND))
+    conn.commit()
+    row = conn.execute('SELECT status FROM import_jobs WHERE job_id = ?', (job_id,)).fetchone()
+    return row[0] if row else None
+
+
+def job_status(conn: sqlite3.Connection, job_id: int, since: Optional[int] = 0) -> Optional[dict]:
+    """
+    Status eines Jobs mit Zusammenfassung und den bearbeiteten Dateien
+    ab Position since + 1 (für Fortschritts-Updates nur die neuen).
+    since=None: ohne Dateiliste.
+    """
+    job = conn.execute('SELECT * FROM import_jobs WHERE job_id = ?', (job_id,)).fetchone()
+    if job is None:
+        return None
+
+    counts = dict(conn.execute(
+        'SELECT status, COUNT(*) FROM import_job_files WHERE job_id = ? GROUP BY status', (job_id,)
+    ).fetchall())
+
+    gesamt = sum(counts.values())
+    status = {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'abbruch_angefordert': bool(job['cancel_requested']),
+        'fehlermeldung': job['error'],
+        'erstellt': job['created_at'],
+        'gestartet': job['started_at'],
+        'beendet': job['finished_at'],
+        'zusammenfassung': {
+            'gesamt': gesamt,
+            'erledigt': gesamt - counts.get(OFFEN, 0),
+            'neu': counts.get('ok', 0),
+            'duplikat': counts.get('duplikat', 0),
+            'fehler': counts.get('fehler', 0)
+        }
+    }
+    if since is not None:
+        status['dateien'] = [dict(row) for row in conn.execute(
+            'SELECT position, datei, status, nachricht, ziel FROM import_job_files '
+            'WHERE job_id = ? AND position > ? AND status != ? ORDER BY position',
+            (job_id, since, OFFEN)
+        )]
+    return status
+
+
+def list_jobs(conn: sqlite3.Connection, limit: int = 20) -> List[dict]:
+    """Die letzten Jobs (neueste zuerst) ohne Dateiliste"""
+    rows = conn.execute('SELECT job_id FROM import_jobs ORDER BY job_id DESC LIMIT ?', (limit,))
+    return [job_status(conn, job_id, since=None) for (job_id,) in rows.fetchall()]
+
+
+class ImportJobRunner:
+    """
+    Arbeitet Import-Jobs nacheinander in einem Hintergrund-Thread ab.
+    Es läuft immer höchstens ein Job – alle schreiben in denselben Eingang.
+
+    version zählt jede Änderung (neue Datei fertig, Status gewechselt);
+    wait_for_change() blockiert, bis sie sich ändert – damit folgen die
+    Server-Sent-Events dem Fortschritt ohne eigenes Polling der Datenbank.
+    """
+
+    def __init__(self, workers: int = 1, connect=get_db):
+        self.workers = workers
+        self._connect = connect
+        self.active_job = None
+        self.version = 0
+        self._queue = queue.Queue()
+        self._cancelled = set()
+        self._changed = threading.Condition()
+        self._submit_lock = threading.Lock()
+        self._thread = None
+
+    def connect(self) -> sqlite3.Connection:
+        """Verbindung zur Import-Datenbank (Job-Tabellen werden bei Bedarf angelegt)"""
+        conn = self._connect()
+        init_job_schema(conn)
+        return conn
+
+    def start(self) -> List[int]:
+        """Startet den Worker-Thread (einmalig) und reiht unterbrochene Jobs wieder ein"""
+        with self._submit_lock:
+            if self._thread is not None:
+                return []
+            conn = self.connect()
+            try:
+                init_schema(conn)  # Import ohne vorherigen Web-Request auf frischer DB
+                resumed = unfinished_jobs(conn)
+            finally:
+                conn.close()
+            for job_id in resumed:
+                self._queue.put(job_id)
+            self._thread = threading.Thread(target=self._work, name='import-jobs', daemon=True)
+            self._thread.start()
+        return resumed
+
+    def submit(self, pdfs: Optional[List[Path]] = None) -> Tuple[int, bool]:
+        """
+        Legt einen Job für die angegebenen PDFs an (Standard: alle im Eingangsordner).
+        Gibt (job_id, neu) zurück – ist schon ein Job aktiv, dessen ID und False.
+        """
+        ensure_dirs()
+        with self._submit_lock:
+            conn = self.connect()
+            try:
+                job_id = active_job_id(conn)
+                if job_id is not None:
+                    return job_id, False
+                if pdfs is None:
+                    pdfs = list_pdfs(EINGANG)
+                job_id = create_job(conn, sorted(pdfs))
+            finally:
+                conn.close()
+        self._queue.put(job_id)
+        self._notify()
+        return job_id, True
+
+    def cancel(self, job_id: int) -> Optional[str]:
+        """Fordert den Abbruch an; die aktuelle Datei wird noch fertig bearbeitet"""
+        conn = self.connect()
+        try:
+            status = request_cancel(conn, job_id)
+        finally:
+            conn.close()
+        if status is not None:
+            self._cancelled.add(job_id)
+            self._notify()
+        return status
+
+    def current_job(self) -> Optional[int]:
+        """Laufender oder nächster wartender Job (aus dem Speicher, ohne DB-Zugriff)"""
+        if self.active_job is not None:
+            return self.active_job
+        with self._queue.mutex:
+            return self._queue.queue[0] if self._queue.queue else None
+
+    def idle(self) -> bool:
+        """Kein Job wartend oder in Arbeit – auch nicht gerade aus der Queue geholt"""
+        with self._queue.mutex:
+            return self._queue.unfinished_tasks == 0
+
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """Wartet, bis sich version ändert (oder timeout abläuft) und gibt sie zurück"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def _notify(self):
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            except Exception:
+                logger.exception(f"[ERROR] Import-Job #{job_id} fehlgeschlagen")
+            finally:
+                self.active_job = None
+                self._cancelled.discard(job_id)
+                self._queue.task_done()
+                self._notify()
+
+    def _run(self, job_id: int):
+        conn = self.connect()
+        try:
+            job = conn.execute('SELECT status, cancel_requested FROM import_jobs WHERE job_id = ?',
+                               (job_id,)).fetchone()
+            if job is None or job['status'] not in AKTIV:
+                return  # abgebrochen, bevor er an der Reihe war (oder DB zurückgesetzt)
+            if job['cancel_requested']:
+                finish_job(conn, job_id, ABGEBROCHEN)
+                return
+
+            conn.execute('UPDATE import_jobs SET status = ?, started_at = COALESCE(started_at, ?) '
+                         'WHERE job_id = ?', (LAEUFT, _now(), job_id))
+            conn.commit()
+            self.active_job = job_id
+            self._notify()
+
+            # Offene Dateien – nach einem Neustart nur noch der Rest
+            positions = {}
+            for row in conn.execute('SELECT position, datei FROM import_job_files '
+                                    'WHERE job_id = ? AND status = ? ORDER BY position',
+                                    (job_id, OFFEN)).fetchall():
+                pdf = EINGANG / row['datei']
+                if pdf.exists():
+                    positions[pdf] = row['position']
+                else:
+                    record_result(conn, job_id, row['position'], {
+                        'status': 'fehler', 'nachricht': 'Datei nicht mehr im Eingangsordner',
+                        'ziel': ''
+                    })
+            conn.commit()
+
+            try:
+                import_files(
+                    conn, list(positions), self.workers, batch_size=JOB_COMMIT_BATCH,
+                    journal=lambda pdf, out: record_result(conn, job_id, positions[pdf], out),
+                    progress=lambda out: self._notify(),
+                    should_stop=lambda: job_id in self._cancelled
+                )
+            except Exception as exc:
+                finish_job(conn, job_id, FEHLGESCHLAGEN, str(exc))
+                raise
+
+            cancelled = conn.execute('SELECT cancel_requested FROM import_jobs WHERE job_id = ?',
+                                     (job_id,)).fetchone()[0]
+            finish_job(conn, job_id, ABGEBROCHEN if cancelled else FERTIG)
+            logger.info(f"[OK] Import-Job #{job_id} {'abgebrochen' if cancelled else 'fertig'}")
+        finally:
+            conn.close()
@@ -1,11 +1,26 @@
 #!/usr/bin/env python3
 """
 Migration: Fügt pdf_path und pdf_hash Spalten zur Datenbank hinzu
+und baut Volltextindex und Auswertungs-Rollups auf.
+
+    python migrate_db.py                  ← komplette Migration
+    python migrate_db.py --search-index   ← nur Volltextindex neu aufbauen
+    python migrate_db.py --rollups        ← nur Rollups neu berechnen
+    python migrate_db.py --store-prices   ← nur Preisvergleich (store_prices) neu berechnen
+    python migrate_db.py --price-history  ← Tabelle price_history durch die Sicht ersetzen
+    python migrate_db.py --pdf-paths      ← alten Kassenbons ihre PDF in der Ablage zuordnen
 """
 
 import sqlite3
+import sys
 from pathlib import Path
 
+from receipt_store import (init_search_index, rebuild_search_index,
+                           init_rollups, rebuild_rollups, init_store_prices,
+                           rebuild_store_prices, init_price_history, table_exists)
+from batch_import import ABLAGE
+from pdf_backfill import backfill_pdf_paths
+
 DB_PATH = 'receipts.db'
 
 def migrate():
@@ -44,12 +59,87 @@ def migrate():
     conn.commit()
     conn.close()
     
+    migrate_search_index()
+    migrate_rollups()
+    migrate_store_prices()
+    migrate_price_history()
+    migrate_pdf_paths()
+    
     print("✅ Migration abgeschlossen!\n")
-    print("📝 WICHTIG:")
-    print("   - Alte Kassenbons haben kein pdf_path/pdf_hash (= NULL)")
-    print("   - Neue Uploads werden korrekt gespeichert")
-    print("   - PDF-Anzeige funktioniert NUR für neue Uploads")
-    print("\n💡 Empfehlung: Batch-Re-Import der PDFs aus C:\\Kassenbons\\Ablage\\")
+
+def migrate_search_index():
+    """Legt den FTS5-Volltextindex an und trägt alle vorhandenen Artikelnamen nach"""
+    conn = sqlite3.connect(DB_PATH)
+    
+    print("🔍 Baue Volltextindex für die Artikelsuche auf...")
+    if not init_search_index(conn):
+        print("  ⚠️  SQLite ohne FTS5/Trigramm – Suche läuft über LIKE")
+    rebuild_search_index(conn)
+    conn.commit()
+    count = conn.execute('SELECT COUNT(*) FROM item_names').fetchone()[0]
+    conn.close()
+    print(f"  ✅ {count} Artikelnamen indexiert\n")
+
+
+def migrate_rollups():
+    """Legt die Rollup-Tabellen für Dashboard/Statistik an und berechnet sie neu"""
+    conn = sqlite3.connect(DB_PATH)
+    
+    print("📊 Berechne Rollups für Dashboard und Statistik...")
+    if table_exists(conn, 'spending_rollup'):
+        rebuild_rollups(conn)
+    else:
+        init_rollups(conn)  # legt an + befüllt
+    conn.commit()
+    count = conn.execute('SELECT COUNT(*) FROM spending_rollup').fetchone()[0]
+    conn.close()
+    print(f"  ✅ {count} Rollup-Zeilen (Tag × Markt × Kategorie)\n")
+
+
+def migrate_store_prices():
+    """Legt store_prices (Preis je Artikel und Markt) an und berechnet sie neu"""
+    conn = sqlite3.connect(DB_PATH)
+    
+    print("🏷️  Berechne aktuelle Preise je Artikel und Markt...")
+    if table_exists(conn, 'store_prices'):
+        rebuild_store_prices(conn)
+    else:
+        init_store_prices(conn)  # legt an + befüllt
+    conn.commit()
+    count = conn.execute('SELECT COUNT(*) FROM store_prices').fetchone()[0]
+    conn.close()
+    print(f"  ✅ {count} Preis-Zeilen (Artikel × Markt)\n")
+
+
+def migrate_price_history():
+    """Ersetzt die doppelt geschriebene Tabelle price_history durch eine Sicht auf items"""
+    conn = sqlite3.connect(DB_PATH)
+    
+    print("📈 Stelle Preisverlauf auf items + Index um...")
+    migrated = init_price_history(conn)
+    conn.commit()
+    if migrated:
+        conn.execute('VACUUM')  # Platz der alten Tabelle freigeben
+        print("  ✅ Tabelle price_history entfernt, Preisverlauf kommt aus items\n")
+    else:
+        print("  ⏭️  Preisverlauf ist bereits eine Sicht\n")
+    conn.close()
+
+
+def migrate_pdf_paths():
+    """Ordnet Kassenbons ohne pdf_path ihre PDF im Ablage-Ordner zu (auch bisher erfolglose)"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    
+    print(f"📎 Ordne alten Kassenbons ihre PDF in {ABLAGE} zu...")
+    stats = backfill_pdf_paths(conn, ABLAGE, retry=True)  # auch früher erfolglose
+    conn.close()
+    print(f"  ✅ {stats['zugeordnet']} von {stats['offen']} zugeordnet")
+    if stats['ohne_treffer']:
+        print(f"  ⚠️  {stats['ohne_treffer']} ohne passende PDF – beim Abruf wird noch per Dateiname gesucht\n")
+    else:
+        print()
+
 
 if __name__ == '__main__':
     if not Path(DB_PATH).exists():
@@ -57,4 +147,15 @@ if __name__ == '__main__':
         print("   Bitte zuerst web_app.py starten!")
         exit(1)
     
-    migrate()
+    if '--search-index' in sys.argv[1:]:
+        migrate_search_index()
+    elif '--rollups' in sys.argv[1:]:
+        migrate_rollups()
+    elif '--store-prices' in sys.argv[1:]:
+        migrate_store_prices()
+    elif '--price-history' in sys.argv[1:]:
+        migrate_price_history()
+    elif '--pdf-paths' in sys.argv[1:]:
+        migrate_pdf_paths()
+    else:
+        migrate()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+name_index.py
+─────────────
+Präfix-Index über alle Artikelnamen für die Autovervollständigung.
+
+    index = NamePrefixIndex()
+    index.refresh(conn, gen)       ← neue Artikel seit dem letzten Aufruf übernehmen
+    index.suggest('trock', 8)      ← [{'name': 'RIESLING TROCKEN', 'purchase_count': 12}, …]
+
+Jeder Name steht einmal pro Wortanfang in einer sortierten Liste
+("riesling trocken", "trocken") – ein Präfix ist damit eine Binärsuche
+plus ein zusammenhängender Bereich, gerankt nach Anzahl der Käufe
+(item_names.purchase_count). Der Index liegt im Speicher; refresh() liest
+nur die Artikel mit item_id über der zuletzt gesehenen.
+
+Gezählt werden wie bei der Artikelsuche nur Käufe außerhalb der Kategorie
+System; ein Name fehlt nur, wenn ALLE seine Artikel System sind.
+"""
+
+import heapq
+import sqlite3
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, List
+
+
+# Kategorie ohne echte Artikel (Pfand, Leergut, …) – wie bei der Artikelsuche ausgeblendet
+EXCLUDED_CATEGORY = 'System'
+
+
+def word_keys(name: str) -> List[str]:
+    """Suchschlüssel eines Namens: ab jedem Wortanfang, kleingeschrieben"""
+    words = name.lower().split()
+    return [' '.join(words[start:]) for start in range(len(words))]
+
+
+class NamePrefixIndex:
+    """Thread-sicherer In-Memory-Präfixindex der Artikelnamen"""
+
+    def __init__(self):
+        self._keys = []              # sortiert: (schlüssel, name)
+        self._counts: Dict[str, int] = {}
+        self._last_item_id = None    # None → beim nächsten refresh() komplett neu aufbauen
+        self._generation = None      # Daten-Generation des letzten refresh()
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Nächstes refresh() baut komplett neu auf (Reklassifizierung, Reset)"""
+        with self._lock:
+            self._last_item_id = None
+
+    def refresh(self, conn: sqlite3.Connection, generation=None):
+        """
+        Übernimmt neue Artikel; baut neu auf, wenn Artikel verschwunden sind.
+        Mit generation (Daten-Generation des Aufrufers) passiert nichts, solange
+        sie sich seit dem letzten refresh() nicht geändert hat – Prüfung und
+        Aktualisierung laufen unter dem Lock, gleichzeitige Aufrufer lesen
+        also nicht doppelt.
+        """
+        with self._lock:
+            if (generation is not None and generation == self._generation
+                    and self._last_item_id is not None):
+                return
+            max_item_id = conn.execute('SELECT COALESCE(MAX(item_id), 0) FROM items').fetchone()[0]
+            self._generation = generation
+            if self._last_item_id is None or max_item_id < self._last_item_id:
+                self._rebuild(conn, max_item_id)
+            elif max_item_id > self._last_item_id:
+                self._add_items(conn, self._last_item_id, max_item_id)
+
+    def _rebuild(self, conn: sqlite3.Connection, max_item_id: int):
+        # Käufe aus item_names abzüglich der System-Artikel (über idx_items_category)
+        system = dict(conn.execute(
+            'SELECT name, COUNT(*) FROM items WHERE category = ? GROUP BY name', (EXCLUDED_CATEGORY,)))
+        self._counts = {}
+        for name, count in conn.execute('SELECT name, purchase_count FROM item_names'):
+            count -= system.get(name, 0)
+            if count > 0:
+                self._counts[name] = count
+        self._keys = sorted((key, name) for name in self._counts for key in word_keys(name))
+        self._last_item_id = max_item_id
+
+    def _add_items(self, conn: sqlite3.Connection, after_id: int, max_item_id: int):
+        rows = conn.execute('''
+            SELECT name, COUNT(*) FROM items
+            WHERE item_id > ? AND item_id <= ? AND name IS NOT NULL AND category IS NOT ?
+            GROUP BY name
+        ''', (after_id, max_item_id, EXCLUDED_CATEGORY))
+        for name, count in rows:
+            if name not in self._counts:
+                self._counts[name] = 0
+                for key in word_keys(name):
+                    insort(self._keys, (key, name))
+            self._counts[name] += count
+        self._last_item_id = max_item_id
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[Dict]:
+        """
+        Die limit meistgekauften Namen, bei denen ein Wort mit prefix beginnt
+        (ohne Groß-/Kleinschreibung). Ein Name kommt nur einmal vor.
+        """
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        with self._lock:
+            start = bisect_left(self._keys, (prefix,))
+            end = bisect_left(self._keys, (prefix + '\U0010ffff',), start)
+            names = {name for _, name in self._keys[start:end]}
+            top = heapq.nsmallest(limit, names, key=lambda name: (-self._counts[name], name))
+            return [{'name': name, 'purchase_count': self._counts[name]} for name in top]
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+parse_pool.py
+─────────────
+Gemeinsamer Prozess-Pool zum Parsen von PDFs – für Batch-Import,
+Import-Jobs und Mehrfach-Upload.
+
+    parse_in_order(func, jobs, workers)  ← func(job) für alle jobs, Ergebnisse in Eingabe-Reihenfolge
+
+Der Pool wird einmal pro Prozess angelegt und danach wiederverwendet (statt
+einen pro Request/Import zu starten). Die Worker entstehen per forkserver
+bzw. spawn, nie per fork: die Web-App hat beim Start eines Imports schon
+Threads (Import-Runner, Ordner-Überwachung, Request-Threads), und ein
+fork() aus einem Prozess mit Threads kann gesperrte Locks mitkopieren.
+
+Stirbt ein Worker (Absturz in einer PDF-Bibliothek, OOM-Kill), bricht nicht
+der ganze Import ab: die zu dem Zeitpunkt offenen PDFs werden einzeln in
+einem frischen Pool wiederholt, nur die PDF, bei der es erneut passiert,
+bekommt ein Fehler-Ergebnis.
+"""
+
+import logging
+import threading
+from typing import Callable, Iterable, Iterator
+
+
+logger = logging.getLogger(__name__)
+
+# Aufträge pro Worker, die gleichzeitig im Pool sein dürfen
+JOBS_PER_WORKER = 2
+
+CRASH_MESSAGE = 'Parser-Prozess abgestürzt'
+
+# concurrent.futures/multiprocessing erst laden, wenn parallel geparst wird
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _context():
+    """forkserver, wo verfügbar (Linux), sonst spawn – nie fork"""
+    import multiprocessing
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def shared_pool(workers: int):
+    """Der ProcessPoolExecutor dieses Prozesses – beim ersten Aufruf mit workers Prozessen angelegt"""
+    from concurrent.futures import ProcessPoolExecutor
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_context())
+        return _pool
+
+
+def discard_pool(pool):
+    """Verwirft einen kaputten Pool; der nächste shared_pool() legt einen neuen an"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _submit(func: Callable, job, workers: int):
+    """
+    Reicht einen Auftrag ein → (pool, future). Hat ein anderer Aufrufer den
+    Pool gerade verworfen, landet er im neuen.
+    """
+    from concurrent.futures.process import BrokenProcessPool
+    pool = shared_pool(workers)
+    try:
+        return pool, pool.submit(func, job)
+    except (BrokenProcessPool, RuntimeError):   # RuntimeError: Pool schon heruntergefahren
+        discard_pool(pool)
+        pool = shared_pool(workers)
+        return pool, pool.submit(func, job)
+
+
+def _run_alone(func: Callable, job, workers: int):
+    """Ein Auftrag allein im Pool – stirbt der Worker dabei, liegt es an diesem Auftrag"""
+    from concurrent.futures.process import BrokenProcessPool
+    pool, future = _submit(func, job, workers)
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        discard_pool(pool)
+        logger.error(f"[IMPORT] {CRASH_MESSAGE}: {job!r}")
+        return None, CRASH_MESSAGE
+    except Exception as exc:
+        return None, str(exc)
+
+
+def parse_in_order(func: Callable, jobs: Iterable, workers: int = 1) -> Iterator:
+    """
+    Liefert func(job) für alle jobs in Eingabe-Reihenfolge. func gibt
+    (ergebnis, fehlertext) zurück; wirft der Worker-Aufruf selbst (Absturz,
+    nicht picklebares Ergebnis), kommt (None, fehlertext) für diesen Auftrag.
+
+    workers <= 1 parst im eigenen Prozess. Sonst sind höchstens
+    workers × JOBS_PER_WORKER Aufträge gleichzeitig unterwegs; wird der
+    Generator vorzeitig geschlossen (Abbruch), werden die übrigen storniert.
+    """
+    jobs = list(jobs)
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield func(job)
+        return
+
+    from concurrent.futures.process import BrokenProcessPool
+
+    window = workers * JOBS_PER_WORKER
+    pending, done = {}, {}     # index → (pool, future) bzw. fertiges Ergebnis
+    next_submit = 0
+    try:
+        for index in range(len(jobs)):
+            while index not in done:
+                while next_submit < len(jobs) and len(pending) < window:
+                    pending[next_submit] = _submit(func, jobs[next_submit], workers)
+                    next_submit += 1
+                pool, future = pending.pop(index)
+                try:
+                    done[index] = future.result()
+                except BrokenProcessPool:
+                    # Alle offenen Aufträge sind mit dem Pool verloren – einzeln wiederholen
+                    discard_pool(pool)
+                    for retry in sorted([index, *pending]):
+                        done[retry] = _run_alone(func, jobs[retry], workers)
+                    pending.clear()
+                except Exception as exc:
+                    done[index] = (None, str(exc))
+            yield done.pop(index)
+    finally:
+        for _, future in pending.values():
+            future.cancel()
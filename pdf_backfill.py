@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+pdf_backfill.py
+───────────────
+Ordnet alten Kassenbons ohne pdf_path (Import vor der PDF-Zuordnung) ihre
+PDF im Ablage-Ordner zu – einmalig statt bei jedem Aufruf per Glob.
+
+    backfill_pdf_paths(conn, ablage)  ← Zuordnung suchen und pdf_path/pdf_hash speichern
+    find_archived_pdf(conn, ablage, receipt_id)  ← dasselbe für einen Kassenbon, beim Abruf
+
+Kandidaten sind die Dateien Kassenbon_<Datum>_<Markt>[_N].pdf im Monatsordner
+des Kassenbons, mit dem Marktnamen in beiden bisher verwendeten Schreibweisen
+(batch_import.safe_name bzw. Leerzeichen → _). Zugeordnet wird erst, wenn die
+geparste PDF in Markt, Tag und Summe mit dem Kassenbon übereinstimmt – zwei
+Märkte am selben Tag bekommen so nicht mehr dieselbe PDF. Der frühere
+Datumsparser hat bei vielen Bons Tag und Monat vertauscht; so steht das
+Datum in alten Zeilen und in den Dateinamen, der heutige Parser liest es
+richtig. Ein vertauschter Tag gilt deshalb ebenfalls als Treffer.
+
+Kassenbons ohne Treffer landen in pdf_backfill_misses und werden bei den
+nächsten Starts nicht erneut geprüft (geparst wird also nur einmal);
+migrate_db.py --pdf-paths versucht es mit retry=True für alle noch einmal.
+"""
+
+import os
+import re
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from batch_import import safe_name
+from pdf_ingest import db_path_for
+from receipt_analyzer import ReceiptParser, calculate_file_hash, swapped_day_month
+
+
+# Zuordnungen pro Transaktion
+BACKFILL_BATCH = 500
+
+
+def init_misses(conn: sqlite3.Connection):
+    """Merkliste der Kassenbons, für die die Zuordnung schon erfolglos war"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pdf_backfill_misses (
+            receipt_id INTEGER PRIMARY KEY
+        )
+    ''')
+
+
+def legacy_receipts(conn: sqlite3.Connection) -> list:
+    """Kassenbons ohne PDF-Zuordnung, die noch nicht erfolglos geprüft wurden"""
+    return conn.execute('''
+        SELECT receipt_id, store_name, date, total_amount
+        FROM receipts
+        WHERE (pdf_path IS NULL OR pdf_path = '')
+          AND receipt_id NOT IN (SELECT receipt_id FROM pdf_backfill_misses)
+        ORDER BY receipt_id
+    ''').fetchall()
+
+
+def archive_folder(ablage: Path, day: Optional[str]) -> Tuple[Path, str]:
+    """Monatsordner und Datumsteil des Dateinamens (wie beim Ablegen)"""
+    if day:
+        return ablage / day[:4] / day[5:7], day[:10]
+    return ablage / 'Unbekannt' / 'Unbekannt', 'kein-Datum'
+
+
+def archive_candidates(ablage: Path, day: Optional[str], store_name: str,
+                       listings: Dict[Path, List[str]]) -> List[Path]:
+    """
+    PDFs im Monatsordner, deren Name zu Tag und Markt passt.
+    listings: Cache der Ordnerinhalte (jeder Ordner wird nur einmal gelesen)
+    """
+    folder, date_str = archive_folder(ablage, day)
+    if folder not in listings:
+        try:
+            listings[folder] = sorted(entry.name for entry in os.scandir(folder)
+                                      if entry.name.endswith('.pdf'))
+        except OSError:
+            listings[folder] = []
+
+    bases = {f"Kassenbon_{date_str}_{safe_name(store_name or '')}",
+             f"Kassenbon_{date_str}_{(store_name or '').replace(' ', '_')}"}
+    pattern = re.compile('|'.join(re.escape(base) for base in bases) + r'(_\d+)?\.pdf')
+    return [folder / name for name in listings[folder] if pattern.fullmatch(name)]
+
+
+def receipt_days(date) -> set:
+    """Tag der PDF als YYYY-MM-DD – dazu mit vertauschtem Tag/Monat, falls gültig"""
+    if not isinstance(date, datetime):
+        return {None}
+    return {day.strftime('%Y-%m-%d') for day in (date, swapped_day_month(date)) if day}
+
+
+def same_receipt(parsed, row) -> bool:
+    """Parse-Check: Markt, Tag (auch vertauscht, s.o.) und Summe der PDF stimmen überein"""
+    row_day = row['date'][:10] if row['date'] else None
+    return (parsed.store_name == row['store_name'] and row_day in receipt_days(parsed.date)
+            and abs((parsed.total_amount or 0) - (row['total_amount'] or 0)) < 0.005)
+
+
+def matching_pdf(row, candidates: List[Path], used: set,
+                 parser: ReceiptParser) -> Optional[Tuple[Path, str]]:
+    """Erster freier Kandidat, der den Parse-Check besteht → (pfad, pdf_hash)"""
+    for candidate in candidates:
+        if candidate.resolve() in used:
+            continue
+        pdf_hash = calculate_file_hash(candidate)
+        try:
+            parsed = parser.parse_pdf(candidate, pdf_hash=pdf_hash)
+        except Exception:
+            continue
+        if same_receipt(parsed, row):
+            return candidate, pdf_hash
+    return None
+
+
+def backfill_pdf_paths(conn: sqlite3.Connection, ablage: Path,
+                       parser: Optional[ReceiptParser] = None,
+                       batch_size: int = BACKFILL_BATCH, retry: bool = False) -> dict:
+    """
+    Sucht für alle Kassenbons ohne pdf_path die passende PDF und speichert
+    pdf_path + pdf_hash blockweise (executemany, ein Commit pro Block).
+    PDFs, die schon einem Kassenbon gehören, werden nicht erneut vergeben.
+    Kassenbons ohne Treffer werden vermerkt und übersprungen, außer mit
+    retry=True. Gibt {'offen', 'zugeordnet', 'ohne_treffer'} zurück.
+    """
+    init_misses(conn)
+    if retry:
+        conn.execute('DELETE FROM pdf_backfill_misses')
+    conn.commit()
+
+    rows = legacy_receipts(conn)
+    if not rows:
+        return {'offen': 0, 'zugeordnet': 0, 'ohne_treffer': 0}
+
+    parser = parser or ReceiptParser()
+    ablage = Path(ablage)
+    used = {Path(path).resolve() for (path,) in conn.execute(
+        "SELECT pdf_path FROM receipts WHERE pdf_path IS NOT NULL AND pdf_path != ''")}
+    listings = {}
+
+    updates, misses, assigned = [], [], 0
+    for row in rows:
+        candidates = archive_candidates(ablage, row['date'], row['store_name'], listings)
+        match = matching_pdf(row, candidates, used, parser)
+        if match:
+            used.add(match[0].resolve())
+            updates.append((db_path_for(match[0]), match[1], row['receipt_id']))
+        else:
+            misses.append((row['receipt_id'],))
+
+        if len(updates) + len(misses) >= batch_size:
+            assigned += _write(conn, updates, misses)
+            updates, misses = [], []
+
+    assigned += _write(conn, updates, misses)
+    return {'offen': len(rows), 'zugeordnet': assigned, 'ohne_treffer': len(rows) - assigned}
+
+
+def find_archived_pdf(conn: sqlite3.Connection, ablage: Path, receipt_id: int,
+                      parser: Optional[ReceiptParser] = None) -> Optional[Path]:
+    """
+    Zuordnung eines einzelnen Kassenbons beim Abruf, falls der Backfill ihn
+    noch nicht erreicht hat – mit denselben Regeln (Dateiname, Parse-Check,
+    keine PDF eines anderen Kassenbons). Das Ergebnis wird gespeichert:
+    der Pfad beim Kassenbon oder ein Eintrag in pdf_backfill_misses, der
+    Kassenbon wird also höchstens einmal geprüft.
+    """
+    init_misses(conn)
+    row = conn.execute('''
+        SELECT receipt_id, store_name, date, total_amount
+        FROM receipts
+        WHERE receipt_id = ? AND (pdf_path IS NULL OR pdf_path = '')
+          AND receipt_id NOT IN (SELECT receipt_id FROM pdf_backfill_misses)
+    ''', (receipt_id,)).fetchone()
+    if row is None:
+        return None
+
+    candidates = archive_candidates(Path(ablage), row['date'], row['store_name'], {})
+    used = {candidate.resolve() for candidate in candidates if conn.execute(
+        'SELECT 1 FROM receipts WHERE pdf_path = ?', (db_path_for(candidate),)).fetchone()}
+    match = matching_pdf(row, candidates, used, parser or ReceiptParser())
+    if match is None:
+        _write(conn, [], [(receipt_id,)])
+        return None
+    _write(conn, [(db_path_for(match[0]), match[1], receipt_id)])
+    return match[0]
+
+
+def _write(conn: sqlite3.Connection, updates: list, misses: tuple = ()) -> int:
+    if updates:
+        # pdf_path IS NULL …: nicht überschreiben, was inzwischen anders zugeordnet wurde
+        conn.executemany('''
+            UPDATE receipts SET pdf_path = ?, pdf_hash = ?
+            WHERE receipt_id = ? AND (pdf_path IS NULL OR pdf_path = '')
+        ''', updates)
+    if misses:
+        conn.executemany('INSERT OR IGNORE INTO pdf_backfill_misses (receipt_id) VALUES (?)', misses)
+    if updates or misses:
+        conn.commit()
+    return len(updates)
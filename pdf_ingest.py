@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+pdf_ingest.py
+─────────────
+Aufnahme hochgeladener PDFs in einem Durchgang.
+
+    HashingBuffer                         ← Upload-Puffer, rechnet SHA-256 beim Empfang mit
+    archive_pdf(source, root, date, store) ← einmal schreiben, atomar in die Ablage umbenennen
+    collect_uploads(files, spool)         ← Mehrfach-Upload: PDFs und ZIP-Archive → einzelne PDFs
+    ingest_batch(conn, uploads, root)     ← Duplikate, paralleles Parsen, EINE Transaktion
+
+Bisher: Upload nach uploads/ schreiben, zum Hashen lesen, zum Parsen lesen,
+per copy2 in die Ablage kopieren (lesen + schreiben), die Kopie nochmal
+hashen und die Temp-Datei löschen. Jetzt liegt der Upload (max.
+MAX_CONTENT_LENGTH) im Speicher, Hash, Duplikat-Check und Parsen brauchen
+keinen Plattenzugriff, und die PDF wird genau einmal geschrieben – und zwar
+nur, wenn sie kein Duplikat ist und sich parsen ließ.
+
+ZIP-Inhalte werden dagegen beim Entpacken in ein Spool-Verzeichnis
+gestreamt (entpackt bis zu MAX_ZIP_BYTES – zu viel für den Speicher), und
+die Parse-Worker bekommen nur Pfade, nie die PDF-Bytes.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+from receipt_analyzer import ReceiptParser, Receipt
+from receipt_store import save_receipts
+from parse_pool import parse_in_order
+
+
+logger = logging.getLogger(__name__)
+
+# Obergrenze für den entpackten Inhalt eines ZIP-Uploads (Schutz vor ZIP-Bomben)
+MAX_ZIP_BYTES = 256 * 1024 * 1024
+
+# Blockgröße beim Entpacken/Kopieren
+COPY_CHUNK = 1024 * 1024
+
+# Hashes pro IN-Liste beim Duplikat-Check (SQLite-Parameterlimit)
+HASH_CHUNK = 500
+
+
+class HashingBuffer(io.BytesIO):
+    """BytesIO, das beim Schreiben den SHA-256 der Daten mitrechnet"""
+
+    def __init__(self):
+        super().__init__()
+        self._sha256 = hashlib.sha256()
+
+    def write(self, data) -> int:
+        self._sha256.update(data)
+        return super().write(data)
+
+    def hexdigest(self) -> str:
+        """SHA-256 aller bisher geschriebenen Bytes"""
+        return self._sha256.hexdigest()
+
+
+def archive_dir_and_name(root: Path, receipt_date: Optional[datetime], store_name: str):
+    """Ablage/JJJJ/MM und Basis-Dateiname (ohne .pdf) für einen Kassenbon"""
+    if receipt_date:
+        storage_dir = root / receipt_date.strftime("%Y") / receipt_date.strftime("%m")
+        date_str = receipt_date.strftime("%Y-%m-%d")
+    else:
+        storage_dir = root / "Unbekannt" / "Unbekannt"
+        date_str = "kein-Datum"
+    return storage_dir, f"Kassenbon_{date_str}_{store_name.replace(' ', '_')}"
+
+
+def archive_pdf(source: Union[io.BytesIO, Path], root: Path, receipt_date: Optional[datetime],
+                store_name: str) -> Path:
+    """
+    Schreibt die PDF (Puffer oder Spool-Datei) in eine Temp-Datei im
+    Zielordner und gibt ihr dann
+    atomar den ersten freien Namen (…_1.pdf, …_2.pdf bei Namensgleichheit).
+    Ein Leser sieht nie eine halb geschriebene PDF, und es wird nie eine
+    vorhandene überschrieben.
+    """
+    storage_dir, base_name = archive_dir_and_name(root, receipt_date, store_name)
+    storage_dir.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_name = tempfile.mkstemp(dir=storage_dir, prefix='.upload-', suffix='.tmp')
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            if isinstance(source, Path):
+                with open(source, 'rb') as spooled:
+                    shutil.copyfileobj(spooled, file, COPY_CHUNK)
+            else:
+                with source.getbuffer() as data:
+                    file.write(data)
+
+        counter = 0
+        while True:
+            pdf_path = storage_dir / (f"{base_name}_{counter}.pdf" if counter else f"{base_name}.pdf")
+            try:
+                os.link(tmp_path, pdf_path)  # schlägt fehl, wenn der Name vergeben ist
+            except FileExistsError:
+                counter += 1
+                continue
+            except OSError:
+                # Dateisystem ohne Hardlinks → prüfen und umbenennen
+                if pdf_path.exists():
+                    counter += 1
+                    continue
+                os.replace(tmp_path, pdf_path)
+                return pdf_path
+            tmp_path.unlink()
+            return pdf_path
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def db_path_for(pdf_path: Path) -> str:
+    """Pfad für receipts.pdf_path – relativ zum Arbeitsverzeichnis, wenn möglich"""
+    try:
+        return str(pdf_path.resolve().relative_to(Path.cwd()))
+    except ValueError:  # Ablage außerhalb des Arbeitsverzeichnisses
+        return str(pdf_path.resolve())
+
+
+# ─── Mehrfach-Upload ─────────────────────────────────────────────────────────
+
+@dataclass
+class UploadedPDF:
+    """
+    Eine PDF aus einem Mehrfach-Upload (error gesetzt → nicht verwendbar).
+    Der Inhalt liegt in data (direkt hochgeladen) oder in der Spool-Datei path (aus einem ZIP).
+    """
+    name: str
+    data: Optional[io.BytesIO] = None
+    pdf_hash: str = ''
+    error: str = ''
+    path: Optional[Path] = None
+
+    def spooled(self, spool_dir: Path) -> Path:
+        """Pfad der PDF – ein Upload aus dem Speicher wird dafür in spool_dir geschrieben"""
+        if self.path is None:
+            fd, name = tempfile.mkstemp(dir=spool_dir, suffix='.pdf')
+            with os.fdopen(fd, 'wb') as file, self.data.getbuffer() as data:
+                file.write(data)
+            self.path = Path(name)
+        return self.path
+
+
+def _buffered(stream) -> Tuple[io.BytesIO, str]:
+    """(Puffer, SHA-256) – ohne erneutes Lesen, wenn der Upload schon gehasht wurde"""
+    if isinstance(stream, HashingBuffer):
+        return stream, stream.hexdigest()
+    data = stream.read()
+    return io.BytesIO(data), hashlib.sha256(data).hexdigest()
+
+
+def _spool_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, spool_dir: Path,
+                  budget: int) -> Tuple[Optional[Path], str, int]:
+    """
+    Entpackt ein ZIP-Mitglied blockweise in spool_dir und hasht dabei mit
+    → (pfad, sha256, größe); pfad None, wenn es mehr als budget Bytes wären.
+    """
+    fd, name = tempfile.mkstemp(dir=spool_dir, suffix='.pdf')
+    sha256, size = hashlib.sha256(), 0
+    with os.fdopen(fd, 'wb') as out, archive.open(info) as member:
+        while chunk := member.read(COPY_CHUNK):
+            size += len(chunk)
+            if size > budget:
+                break
+            sha256.update(chunk)
+            out.write(chunk)
+    if size > budget:
+        os.unlink(name)
+        return None, '', size
+    return Path(name), sha256.hexdigest(), size
+
+
+def _zip_members(name: str, buffer: io.BytesIO, spool_dir: Path) -> List[UploadedPDF]:
+    """Die PDFs eines ZIP-Archivs (Ordner und macOS-Metadaten werden übersprungen)"""
+    uploads, budget = [], MAX_ZIP_BYTES
+    try:
+        with zipfile.ZipFile(buffer) as archive:
+            for info in archive.infolist():
+                member = f"{name}/{info.filename}"
+                base = info.filename.rsplit('/', 1)[-1]
+                if info.is_dir() or info.filename.startswith('__MACOSX/') or base.startswith('.'):
+                    continue
+                if not base.lower().endswith('.pdf'):
+                    uploads.append(UploadedPDF(member, error='Keine PDF-Datei'))
+                    continue
+                path, pdf_hash, size = _spool_member(archive, info, spool_dir, budget)
+                if path is None:
+                    uploads.append(UploadedPDF(member, error='ZIP-Archiv entpackt zu groß'))
+                    break
+                budget -= size
+                uploads.append(UploadedPDF(member, pdf_hash=pdf_hash, path=path))
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, RuntimeError, OSError) as exc:
+        uploads.append(UploadedPDF(name, error=f'Ungültiges ZIP-Archiv: {exc}'))
+    return uploads
+
+
+def collect_uploads(files: Iterable, spool_dir: Path) -> List[UploadedPDF]:
+    """
+    Zerlegt hochgeladene Dateien (FileStorage) in einzelne PDFs, ZIP-Archive
+    werden nach spool_dir entpackt (der Aufrufer räumt es nach ingest_batch weg).
+    """
+    uploads = []
+    for file in files:
+        name = os.path.basename(file.filename or '') or 'upload'
+        buffer, pdf_hash = _buffered(file.stream)
+        if name.lower().endswith('.zip') or (not name.lower().endswith('.pdf')
+                                              and zipfile.is_zipfile(buffer)):
+            uploads.extend(_zip_members(name, buffer, spool_dir))
+        elif name.lower().endswith('.pdf'):
+            uploads.append(UploadedPDF(name, buffer, pdf_hash))
+        else:
+            uploads.append(UploadedPDF(name, error='Nur PDF- oder ZIP-Dateien erlaubt'))
+    return uploads
+
+
+def existing_hashes(conn: sqlite3.Connection, hashes) -> dict:
+    """pdf_hash → receipt_id der bereits gespeicherten Kassenbons"""
+    hashes, found = list(hashes), {}
+    for start in range(0, len(hashes), HASH_CHUNK):
+        chunk = hashes[start:start + HASH_CHUNK]
+        rows = conn.execute(
+            f"SELECT pdf_hash, MIN(receipt_id) FROM receipts "
+            f"WHERE pdf_hash IN ({', '.join('?' * len(chunk))}) GROUP BY pdf_hash", chunk
+        )
+        found.update(rows.fetchall())
+    return found
+
+
+def parse_for_upload(job: Tuple[Union[io.BytesIO, Path], str]) -> Tuple[Optional[Receipt], str]:
+    """
+    Parse-Schritt für eine hochgeladene PDF – im Worker-Prozess immer per
+    Pfad, im eigenen Prozess auch direkt aus dem Puffer.
+    Gibt (receipt, "") oder (None, fehlertext) zurück.
+    """
+    source, pdf_hash = job
+    try:
+        return ReceiptParser().parse_pdf(source, pdf_hash=pdf_hash), ""
+    except Exception as exc:
+        return None, str(exc)
+
+
+def ingest_batch(conn: sqlite3.Connection, uploads: List[UploadedPDF], root: Path,
+                 spool_dir: Path, workers: int = 1) -> list:
+    """
+    Speichert die PDFs eines Mehrfach-Uploads: Duplikate (gleicher Hash im
+    Upload oder schon in der DB) werden vor dem Parsen aussortiert, der Rest
+    wird – bei workers > 1 parallel im gemeinsamen Parse-Pool, per Pfad aus
+    spool_dir – geparst, abgelegt und in EINER
+    Transaktion gespeichert. Schlägt das Ablegen oder der Commit fehl, wird
+    keiner der Kassenbons gespeichert und die abgelegten PDFs werden wieder
+    gelöscht.
+
+    Gibt je Datei ein Status-Dict wie batch_import.run_import zurück:
+    datei, status (ok / duplikat / fehler), nachricht, ziel
+    """
+    results = [{"datei": upload.name, "status": "", "nachricht": "", "ziel": ""} for upload in uploads]
+
+    known = existing_hashes(conn, {upload.pdf_hash for upload in uploads if not upload.error})
+    first_seen, todo = {}, []
+    for upload, out in zip(uploads, results):
+        if upload.error:
+            out["status"], out["nachricht"] = "fehler", upload.error
+        elif upload.pdf_hash in known:
+            out["status"] = "duplikat"
+            out["nachricht"] = f"Bereits importiert – Kassenbon #{known[upload.pdf_hash]}"
+        elif upload.pdf_hash in first_seen:
+            out["status"] = "duplikat"
+            out["nachricht"] = f"Doppelt im Upload – gleiche Datei wie {first_seen[upload.pdf_hash]}"
+        else:
+            first_seen[upload.pdf_hash] = upload.name
+            todo.append((upload, out))
+
+    parallel = workers > 1 and len(todo) > 1
+    jobs = [(upload.spooled(spool_dir) if parallel else upload.path or upload.data, upload.pdf_hash)
+            for upload, _ in todo]
+    parsed = list(parse_in_order(parse_for_upload, jobs, workers))
+
+    entries, archived = [], []
+    try:
+        for (upload, out), (receipt, parse_error) in zip(todo, parsed):
+            if receipt is None:
+                out["status"], out["nachricht"] = "fehler", parse_error
+                continue
+            pdf_path = archive_pdf(upload.path or upload.data, root, receipt.date, receipt.store_name)
+            archived.append((pdf_path, receipt, out))
+            entries.append((receipt, db_path_for(pdf_path), upload.pdf_hash))
+        save_receipts(conn, entries)
+    except Exception as exc:
+        logger.exception("[ERROR] Mehrfach-Upload konnte nicht gespeichert werden")
+        for pdf_path, _, _ in archived:
+            pdf_path.unlink(missing_ok=True)
+        for _, out in todo:
+            if out["status"] != "fehler":
+                out["status"], out["nachricht"] = "fehler", f"Nicht gespeichert: {exc}"
+        return results
+
+    for pdf_path, receipt, out in archived:
+        date_txt = receipt.date.strftime("%d.%m.%Y") if receipt.date else "?"
+        out["status"] = "ok"
+        out["nachricht"] = (
+            f"{receipt.store_name}, {date_txt}, "
+            f"{receipt.total_amount:.2f} € – {len(receipt.items)} Artikel"
+        )
+        out["ziel"] = db_path_for(pdf_path)
+    return results
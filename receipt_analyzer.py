@@ -4,22 +4,197 @@ Kassenbon-Analyse-App
 Analysiert und klassifiziert Kassenbons aus PDF-Dateien
 """
 
+import hashlib
+import os
 import re
 import sqlite3
+import threading
+import time
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
-import PyPDF2
 from dataclasses import dataclass, asdict
 import json
 
-# Robustes Datum-Parsing (installieren: pip install dateparser)
-try:
-    import dateparser
-    DATEPARSER_AVAILABLE = True
-except ImportError:
-    DATEPARSER_AVAILABLE = False
-    print("⚠️ dateparser nicht installiert - Fallback auf Regex. Installiere mit: pip install dateparser")
+import receipt_store
+
+# PyPDF2 und dateparser werden erst beim ersten Bedarf importiert:
+# dateparser allein lädt beim Import ~300 ms Regex- und Locale-Daten.
+
+
+@lru_cache(maxsize=None)
+def get_dateparser():
+    """Robustes Datum-Parsing (installieren: pip install dateparser) – None falls nicht installiert"""
+    try:
+        import dateparser
+        return dateparser
+    except ImportError:
+        print("⚠️ dateparser nicht installiert - Fallback auf Regex. Installiere mit: pip install dateparser")
+        return None
+
+
+# dateparser-Einstellungen (einmal gebaut statt pro Aufruf)
+DATEPARSER_SETTINGS = {
+    'PREFER_DAY_OF_MONTH': 'first',  # DD.MM.YYYY nicht MM.DD.YYYY
+    'PREFER_DATES_FROM': 'past',      # Kassenbons sind meist vergangene Daten
+}
+
+# Schnellpfad: "DD.MM.YY HH:MM", "DD.MM.YYYY", "D.M.YYYY · HH:MM" (+ optional ":SS", "Uhr")
+FAST_DATE_PATTERN = re.compile(
+    r'(\d{1,2})\.(\d{1,2})\.(\d{2}|\d{4})'
+    r'(?:\s*(?:[·,]|um)?\s*(\d{1,2}):(\d{2})(?::(\d{2}))?(?:\s*uhr)?)?\s*$',
+    re.IGNORECASE
+)
+
+
+def fast_parse_date(candidate: str) -> Optional[datetime]:
+    """
+    Handgeschriebener Parser für die Datumsformate deutscher Kassenbons
+    (immer Tag vor Monat). Gibt None zurück, wenn er nicht sicher entscheiden
+    kann – dann übernimmt dateparser.
+    """
+    match = FAST_DATE_PATTERN.match(candidate)
+    if not match:
+        return None
+    
+    day, month, year, hour, minute, second = match.groups()
+    year = int(year)
+    if year < 100:
+        # 26 -> 2026; nur was sonst in der Zukunft läge, gehört ins 20. Jahrhundert
+        year += 2000 if year + 2000 <= datetime.now().year + 1 else 1900
+    
+    try:
+        return datetime(year, int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0))
+    except ValueError:
+        return None  # z.B. 31.02. oder 25:00 – dateparser entscheiden lassen
+
+
+@lru_cache(maxsize=4096)
+def parse_date_candidate(candidate: str) -> Optional[datetime]:
+    """Schnellpfad, dateparser nur als Fallback – Ergebnisse werden gemerkt"""
+    parsed = fast_parse_date(candidate)
+    if parsed is None:
+        dateparser = get_dateparser()
+        if dateparser is not None:
+            parsed = dateparser.parse(candidate, languages=['de', 'en'], settings=dict(DATEPARSER_SETTINGS))
+    return parsed
+
+
+def swapped_day_month(date: Optional[datetime]) -> Optional[datetime]:
+    """
+    Dasselbe Datum mit vertauschtem Tag und Monat (None, wenn ungültig oder
+    gleich). Der frühere Datumsparser hat Tage ≤ 12 als Monat gelesen – so
+    stehen viele alte Kassenbons in der Datenbank.
+    """
+    if date is None or date.day > 12 or date.day == date.month:
+        return None
+    return date.replace(month=date.day, day=date.month)
+
+
+# Cache für extrahierten PDF-Text (Schlüssel: SHA-256 der PDF-Bytes)
+TEXT_CACHE_PATH = Path(__file__).parent / 'pdf_text_cache.db'
+TEXT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64 MB Text ≈ 30.000 Kassenbons
+
+
+def calculate_file_hash(filepath) -> str:
+    """Berechnet SHA256-Hash einer Datei"""
+    sha256 = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(4096), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class PDFTextCache:
+    """
+    Content-addressed Cache für den extrahierten PDF-Text in einer eigenen
+    SQLite-Datei. Gleiche Bytes → gleicher Text, daher überlebt der Cache auch
+    einen System-Reset. Bei Überschreiten von max_bytes werden die am längsten
+    nicht benutzten Einträge verdrängt (LRU).
+    """
+    
+    def __init__(self, db_path=TEXT_CACHE_PATH, max_bytes: int = TEXT_CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._pid = None
+        self._total_bytes = 0  # Schätzung der Cache-Größe (wird beim Verdrängen neu gezählt)
+        self._lock = threading.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        # Eigene Verbindung pro Prozess (Parse-Worker im Prozess-Pool!)
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS pdf_text (
+                    pdf_hash TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_pdf_text_last_used ON pdf_text(last_used)')
+            conn.commit()
+            self._total_bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM pdf_text').fetchone()[0]
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+    
+    def get(self, pdf_hash: str) -> Optional[str]:
+        """Liefert den gecachten Text oder None"""
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute('SELECT text FROM pdf_text WHERE pdf_hash = ?', (pdf_hash,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE pdf_text SET last_used = ? WHERE pdf_hash = ?', (time.time(), pdf_hash))
+                conn.commit()
+                return row[0]
+        except sqlite3.Error:
+            return None  # Cache ist optional – im Zweifel neu extrahieren
+    
+    def put(self, pdf_hash: str, text: str):
+        """Speichert den Text und verdrängt bei Bedarf alte Einträge"""
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT OR REPLACE INTO pdf_text (pdf_hash, text, size, last_used) VALUES (?, ?, ?, ?)',
+                    (pdf_hash, text, size, time.time())
+                )
+                self._total_bytes += size
+                if self._total_bytes > self.max_bytes:
+                    self._evict(conn)
+                conn.commit()
+        except sqlite3.Error:
+            pass
+    
+    def _evict(self, conn: sqlite3.Connection):
+        """Neueste Einträge behalten bis max_bytes erreicht ist, den Rest löschen"""
+        conn.execute('''
+            DELETE FROM pdf_text WHERE pdf_hash IN (
+                SELECT pdf_hash FROM (
+                    SELECT pdf_hash, SUM(size) OVER (ORDER BY last_used DESC, pdf_hash) AS running
+                    FROM pdf_text
+                ) WHERE running > ?
+            )
+        ''', (self.max_bytes,))
+        self._total_bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM pdf_text').fetchone()[0]
+    
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+
+# Gemeinsamer Cache für alle Parser eines Prozesses
+TEXT_CACHE = PDFTextCache()
 
 
 @dataclass
@@ -260,14 +435,48 @@ class CategoryClassifier:
         'Sonstiges': [],
     }
     
+    # Kompilierte Matcher – werden einmal pro Regelwerk gebaut (siehe _matchers)
+    _compiled_for = None
+    _compiled = None
+    
+    @staticmethod
+    def _compile_matcher(categories) -> Tuple[re.Pattern, Dict[str, str]]:
+        """
+        Baut EINEN Regex über alle Kategorien.
+        Jede Kategorie wird zu einem Lookahead-Zweig, der am Textanfang prüft ob
+        irgendwo eines ihrer Patterns vorkommt (= re.search). Die Zweige werden
+        in dict-Reihenfolge probiert, der erste Treffer gewinnt – wie bisher.
+        """
+        branches = []
+        groups = {}
+        for index, (category, patterns) in enumerate(categories):
+            if not patterns:
+                continue
+            group = f"c{index}"
+            alternatives = '|'.join(f'(?:{pattern})' for pattern in patterns)
+            branches.append(f'(?=[\\s\\S]*?(?:{alternatives}))(?P<{group}>)')
+            groups[group] = category
+        return re.compile('|'.join(branches) or r'(?!)'), groups
+    
     @classmethod
-    def classify(cls, item_name: str) -> str:
-        """Klassifiziert einen Artikel anhand des Namens"""
-        item_lower = item_name.lower()
-        
+    def _matchers(cls) -> Dict[str, Tuple[re.Pattern, Dict[str, str]]]:
+        """Liefert die kompilierten Matcher (neu gebaut wenn CATEGORIES ersetzt wurde)"""
+        if cls._compiled_for is not cls.CATEGORIES:
+            rules = [(c, p) for c, p in cls.CATEGORIES.items() if c != 'Sonstiges']
+            cls._compiled = {
+                'alle': cls._compile_matcher(rules),
+                # Für Essig/Spirituosen: ohne Wein-Kategorien
+                'ohne_wein': cls._compile_matcher([(c, p) for c, p in rules if 'Wein' not in c]),
+            }
+            cls._compiled_for = cls.CATEGORIES
+        return cls._compiled
+    
+    @staticmethod
+    def _is_system_or_spirits(item_lower: str) -> Tuple[bool, bool]:
+        """Prüft Pfand/Leergut und den Essig/Spirituosen-Negativfilter"""
         # Pfand und Leergut ignorieren
         if any(keyword in item_lower for keyword in ['pfand', 'leergut', 'coupon']):
-            return 'System'
+            return True, False
         
         # NEGATIV-FILTER: Essig und Spirituosen sind KEIN Wein!
         # ABER: "Weintrauben" ist Obst, nicht Essig!
@@ -276,7 +485,32 @@ class CategoryClassifier:
         if 'weintraube' not in item_lower and ('brandy' in item_lower or 'weinbrand' in item_lower):
             essig_spirituosen.append('match')
         
-        if any(keyword in item_lower for keyword in essig_spirituosen):
+        return False, any(keyword in item_lower for keyword in essig_spirituosen)
+    
+    @classmethod
+    def classify(cls, item_name: str) -> str:
+        """Klassifiziert einen Artikel anhand des Namens"""
+        item_lower = item_name.lower()
+        
+        is_system, is_spirits = cls._is_system_or_spirits(item_lower)
+        if is_system:
+            return 'System'
+        
+        # WICHTIG: Reihenfolge wird beibehalten (dict in Python 3.7+)
+        matcher, groups = cls._matchers()['ohne_wein' if is_spirits else 'alle']
+        match = matcher.match(item_lower)
+        return groups[match.lastgroup] if match else 'Sonstiges'
+    
+    @classmethod
+    def classify_reference(cls, item_name: str) -> str:
+        """Unkompilierte Referenz-Implementierung (Pattern für Pattern) – für Äquivalenz-Checks"""
+        item_lower = item_name.lower()
+        
+        is_system, is_spirits = cls._is_system_or_spirits(item_lower)
+        if is_system:
+            return 'System'
+        
+        if is_spirits:
             # Prüfe ob es trotzdem in andere Kategorien passt
             for category, patterns in cls.CATEGORIES.items():
                 if 'Wein' in category or category == 'Sonstiges':
@@ -286,7 +520,6 @@ class CategoryClassifier:
                         return category
             return 'Sonstiges'
         
-        # WICHTIG: Reihenfolge wird beibehalten (dict in Python 3.7+)
         for category, patterns in cls.CATEGORIES.items():
             if category == 'Sonstiges':
                 continue
@@ -297,11 +530,102 @@ class CategoryClassifier:
         return 'Sonstiges'
 
 
+class KeywordAutomaton:
+    """
+    Aho-Corasick-Automat über die Keyword-Listen aus categories.json.
+    Findet in EINEM Durchlauf über den Artikelnamen die erste passende
+    Kategorie (Reihenfolge der categories.json, einfache Substring-Suche).
+    """
+    
+    # Bereits gebaute Automaten je Regelwerk-Version (Inhalt der Kategorien)
+    _cache: Dict[tuple, 'KeywordAutomaton'] = {}
+    _CACHE_SIZE = 8
+    
+    def __init__(self, categories: dict):
+        self.categories: List[str] = []      # Priorität (Index) → Kategorie
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._best: List[Optional[int]] = [None]  # beste Priorität die in diesem Zustand endet
+        
+        for category, keywords in categories.items():
+            if not keywords:  # Leere Liste
+                continue
+            priority = len(self.categories)
+            self.categories.append(category)
+            for keyword in keywords:
+                if not keyword:  # Leerer String
+                    continue
+                self._add(keyword.lower(), priority)
+        
+        self._build_failure_links()
+    
+    def _add(self, keyword: str, priority: int):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(None)
+                self._goto[state][char] = next_state
+            state = next_state
+        if self._best[state] is None or priority < self._best[state]:
+            self._best[state] = priority
+    
+    def _build_failure_links(self):
+        """Breitensuche: Fehler-Links setzen und Treffer der Suffixe übernehmen"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                inherited = self._best[self._fail[child]]
+                if inherited is not None and (self._best[child] is None or inherited < self._best[child]):
+                    self._best[child] = inherited
+    
+    def find(self, text_lower: str) -> Optional[str]:
+        """Kategorie mit der höchsten Priorität, deren Keyword im Text vorkommt"""
+        goto, fail, best_at = self._goto, self._fail, self._best
+        state = 0
+        best = None
+        for char in text_lower:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found = best_at[state]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return self.categories[best] if best is not None else None
+    
+    @classmethod
+    def for_ruleset(cls, categories: dict) -> 'KeywordAutomaton':
+        """Automat aus dem Cache – wird nur neu gebaut wenn sich das Regelwerk geändert hat"""
+        version = tuple((category, tuple(keywords or ())) for category, keywords in categories.items())
+        automaton = cls._cache.get(version)
+        if automaton is None:
+            automaton = cls(categories)
+            if len(cls._cache) >= cls._CACHE_SIZE:
+                cls._cache.pop(next(iter(cls._cache)))
+            cls._cache[version] = automaton
+        return automaton
+
+
 class ReceiptParser:
     """Parser für Kassenbon-PDFs"""
     
-    def __init__(self):
+    def __init__(self, use_text_cache: bool = True):
         self.current_receipt = None
+        self.text_cache = TEXT_CACHE if use_text_cache else None
+        # Automat für das zuletzt übergebene categories-Dict (gleiches Objekt → kein Neubau)
+        self._automaton_source = None
+        self._automaton = None
     
     def classify_item(self, item_name: str, categories: dict = None) -> str:
         """Klassifiziert einen Artikel mit den gegebenen Kategorien"""
@@ -310,6 +634,20 @@ class ReceiptParser:
         
         item_lower = item_name.lower()
         
+        # Pfand und Leergut ignorieren
+        if any(keyword in item_lower for keyword in ['pfand', 'leergut', 'coupon']):
+            return 'System'
+        
+        if categories is not self._automaton_source:
+            self._automaton = KeywordAutomaton.for_ruleset(categories)
+            self._automaton_source = categories
+        
+        return self._automaton.find(item_lower) or 'Sonstiges'
+    
+    def classify_item_reference(self, item_name: str, categories: dict) -> str:
+        """Ursprüngliche verschachtelte Schleife (Kategorie × Keyword) – für Äquivalenz-Checks"""
+        item_lower = item_name.lower()
+        
         # Pfand und Leergut ignorieren
         if any(keyword in item_lower for keyword in ['pfand', 'leergut', 'coupon']):
             return 'System'
@@ -331,15 +669,44 @@ class ReceiptParser:
         
         return 'Sonstiges'
     
-    def parse_pdf(self, pdf_path: Path) -> Receipt:
-        """Parst eine PDF-Datei und extrahiert Kassenbondaten"""
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-        
-        return self._parse_text(text)
+    def parse_pdf(self, pdf_path: Path, pdf_hash: str = None) -> Receipt:
+        """
+        Parst eine PDF-Datei und extrahiert Kassenbondaten.
+        pdf_hash (SHA-256) kann übergeben werden, wenn er schon bekannt ist.
+        pdf_path darf auch ein Binär-Stream sein (Upload im Speicher) –
+        dann muss pdf_hash angegeben werden.
+        """
+        return self._parse_text(self.extract_text(pdf_path, pdf_hash))
+    
+    def extract_text(self, pdf_path: Path, pdf_hash: str = None) -> str:
+        """Text der PDF – aus dem Cache, sonst per PyPDF2 extrahiert und gecacht"""
+        if self.text_cache is None:
+            return self._extract_pdf_text(pdf_path)
+        
+        if pdf_hash is None:
+            pdf_hash = calculate_file_hash(pdf_path)
+        
+        text = self.text_cache.get(pdf_hash)
+        if text is None:
+            text = self._extract_pdf_text(pdf_path)
+            self.text_cache.put(pdf_hash, text)
+        return text
+    
+    @staticmethod
+    def _extract_pdf_text(pdf_path) -> str:
+        """Dekodiert die PDF (Pfad oder Binär-Stream) mit PyPDF2 (teuer)"""
+        import PyPDF2
+        
+        if not hasattr(pdf_path, 'read'):
+            with open(pdf_path, 'rb') as file:
+                return ReceiptParser._extract_pdf_text(file)
+        
+        pdf_path.seek(0)
+        pdf_reader = PyPDF2.PdfReader(pdf_path)
+        text = ""
+        for page in pdf_reader.pages:
+            text += page.extract_text()
+        return text
     
     def _parse_text(self, text: str) -> Receipt:
         """Extrahiert strukturierte Daten aus dem Kassenbon-Text"""
@@ -440,25 +807,16 @@ class ReceiptParser:
         return ', '.join(address_lines) if address_lines else ""
     
     def _extract_date(self, text: str) -> Optional[datetime]:
-        """Extrahiert das Datum - robust mit dateparser + Regex-Fallback"""
+        """Extrahiert das Datum - Schnellpfad, dateparser als Fallback + Regex-Fallback"""
         
-        # PASS 1: dateparser (falls installiert) - erkennt viele Formate automatisch
-        if DATEPARSER_AVAILABLE:
-            # Extrahiere Datum-ähnliche Zeilen (z.B. "29.1.2026 · 16:59")
-            date_candidates = re.findall(r'\d{1,2}[./\-]\d{1,2}[./\-]\d{2,4}[^\n]{0,20}', text)
-            
-            for candidate in date_candidates:
-                parsed = dateparser.parse(
-                    candidate,
-                    languages=['de', 'en'],
-                    settings={
-                        'PREFER_DAY_OF_MONTH': 'first',  # DD.MM.YYYY nicht MM.DD.YYYY
-                        'PREFER_DATES_FROM': 'past',      # Kassenbons sind meist vergangene Daten
-                        'RELATIVE_BASE': datetime.now(),
-                    }
-                )
-                if parsed:
-                    return parsed
+        # PASS 1: Datum-ähnliche Zeilen (z.B. "29.1.2026 · 16:59") – erst der
+        # Schnellpfad für deutsche Formate, dateparser nur wenn der nicht entscheiden kann
+        date_candidates = re.findall(r'\d{1,2}[./\-]\d{1,2}[./\-]\d{2,4}[^\n]{0,20}', text)
+        
+        for candidate in date_candidates:
+            parsed = parse_date_candidate(candidate)
+            if parsed:
+                return parsed
         
         # PASS 2: Regex-Fallback (wie vorher) - DD.MM.YY HH:MM
         date_pattern = r'(\d{2})\.(\d{2})\.(\d{2})\s+(\d{2}):(\d{2})'
@@ -584,141 +942,33 @@ class ReceiptDatabase:
         cursor.execute("PRAGMA journal_mode=WAL;")
         cursor.execute("PRAGMA synchronous=NORMAL;")  # NORMAL ist schneller als FULL, aber sicher genug
         
-        # Tabelle für Kassenbons
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS receipts (
-                receipt_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                store_name TEXT,
-                store_address TEXT,
-                date TIMESTAMP,
-                total_amount REAL,
-                payment_method TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabelle für Artikel
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS items (
-                item_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                receipt_id INTEGER,
-                name TEXT,
-                unit_price REAL,
-                quantity INTEGER,
-                total_price REAL,
-                tax_category TEXT,
-                category TEXT,
-                FOREIGN KEY (receipt_id) REFERENCES receipts (receipt_id)
-            )
-        ''')
-        
-        # Tabelle für Preisverlauf
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS price_history (
-                history_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                item_name TEXT,
-                price REAL,
-                date TIMESTAMP,
-                store_name TEXT,
-                UNIQUE(item_name, date, store_name)
-            )
-        ''')
-        
-        # Index für schnellere Suche
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_items_name 
-            ON items(name)
-        ''')
-        
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_price_history_name 
-            ON price_history(item_name)
-        ''')
-        
-        # ═══ PERFORMANCE: Zusätzliche Indizes ═══
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_receipts_date ON receipts(date)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_category ON items(category)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_receipts_store ON receipts(store_name)')
-        
-        self.conn.commit()
+        # Tabellen + Indizes (gemeinsames Schema mit Web-App und Batch-Import)
+        receipt_store.init_schema(self.conn)
     
     def save_receipt(self, receipt: Receipt) -> int:
         """Speichert einen Kassenbon in der Datenbank"""
-        cursor = self.conn.cursor()
-        
-        # Speichere Kassenbon
-        cursor.execute('''
-            INSERT INTO receipts (store_name, store_address, date, total_amount, payment_method)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (receipt.store_name, receipt.store_address, receipt.date, 
-              receipt.total_amount, receipt.payment_method))
-        
-        receipt_id = cursor.lastrowid
-        
-        # Speichere Artikel
-        for item in receipt.items:
-            cursor.execute('''
-                INSERT INTO items (receipt_id, name, unit_price, quantity, total_price, 
-                                  tax_category, category)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (receipt_id, item.name, item.unit_price, item.quantity, 
-                  item.total_price, item.tax_category, item.category))
-            
-            # Aktualisiere Preisverlauf
-            try:
-                cursor.execute('''
-                    INSERT INTO price_history (item_name, price, date, store_name)
-                    VALUES (?, ?, ?, ?)
-                ''', (item.name, item.unit_price, receipt.date, receipt.store_name))
-            except sqlite3.IntegrityError:
-                # Eintrag existiert bereits
-                pass
-        
-        self.conn.commit()
-        return receipt_id
+        return receipt_store.save_receipt(self.conn, receipt)
     
     def get_price_history(self, item_name: str) -> List[Dict]:
         """Ruft den Preisverlauf eines Artikels ab"""
+        # Passende Namen über den Volltextindex, Preise über idx_items_name_price
+        names_sql, params = receipt_store.matching_names_sql(self.conn, item_name)
         cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT item_name, price, date, store_name
-            FROM price_history
-            WHERE item_name LIKE ?
-            ORDER BY date
-        ''', (f'%{item_name}%',))
+        cursor.execute(receipt_store.price_history_sql(names_sql), params)
         
         results = []
         for row in cursor.fetchall():
             results.append({
-                'item_name': row[0],
-                'price': row[1],
-                'date': row[2],
-                'store_name': row[3]
+                'item_name': row[1],
+                'price': row[2],
+                'date': row[3],
+                'store_name': row[4]
             })
         return results
     
     def get_category_statistics(self) -> Dict[str, Dict]:
         """Statistiken pro Kategorie"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT category, 
-                   COUNT(*) as count,
-                   SUM(total_price) as total_spent,
-                   AVG(unit_price) as avg_price
-            FROM items
-            WHERE category != 'System'
-            GROUP BY category
-            ORDER BY total_spent DESC
-        ''')
-        
-        stats = {}
-        for row in cursor.fetchall():
-            stats[row[0]] = {
-                'count': row[1],
-                'total_spent': round(row[2], 2),
-                'avg_price': round(row[3], 2)
-            }
-        return stats
+        return receipt_store.category_statistics(self.conn)
     
     def get_shopping_history(self, limit: int = 10) -> List[Dict]:
         """Letzte Einkäufe"""
@@ -743,26 +993,7 @@ class ReceiptDatabase:
     
     def search_items(self, search_term: str) -> List[Dict]:
         """Sucht nach Artikeln"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT DISTINCT i.name, i.category, 
-                   AVG(i.unit_price) as avg_price,
-                   COUNT(*) as purchase_count
-            FROM items i
-            WHERE i.name LIKE ? AND i.category != 'System'
-            GROUP BY i.name, i.category
-            ORDER BY purchase_count DESC
-        ''', (f'%{search_term}%',))
-        
-        results = []
-        for row in cursor.fetchall():
-            results.append({
-                'name': row[0],
-                'category': row[1],
-                'avg_price': round(row[2], 2),
-                'purchase_count': row[3]
-            })
-        return results
+        return receipt_store.search_items(self.conn, search_term)
     
     def close(self):
         """Schließt die Datenbankverbindung"""
@@ -0,0 +1,729 @@
+#!/usr/bin/env python3
+"""
+receipt_store.py
+────────────────
+Gemeinsame Persistenz-Schicht für Kassenbons.
+
+Wird vom Web-Upload (web_app.py), vom Batch-Import (batch_import.py) und von
+der Kommandozeilen-Analyse (receipt_analyzer.ReceiptDatabase) verwendet:
+
+    init_schema(conn)                 ← Tabellen + Indizes (idempotent)
+    save_receipt(conn, receipt, ...)  ← ein Kassenbon, atomar
+    save_receipts(conn, entries)      ← viele Kassenbons in EINER Transaktion
+    search_items(conn, term)          ← Artikelsuche über den Volltextindex
+    category_statistics(conn, ...)    ← Ausgaben pro Kategorie aus den Rollups
+    price_comparison(conn, name)      ← aktueller Preis je Markt, günstigster zuerst
+    change_counter(conn)              ← zählt jede Änderung an Kassenbons/Artikeln, prozessübergreifend
+
+Artikel werden per executemany geschrieben. Der Preisverlauf ist keine
+eigene Tabelle mehr, sondern die Sicht price_history über items × receipts
+(abgedeckt von idx_items_name_price) – jeder Artikel wird nur einmal geschrieben.
+
+Jeder verschiedene Artikelname steht einmal in item_names (mit Anzahl der
+Käufe) und dort in einem FTS5-Index (Trigramm-Tokenizer); Trigger auf items
+halten beides synchron. Die Teilwortsuche läuft so über die paar tausend
+Namen statt per LIKE '%…%' über alle Artikel. Ohne FTS5 (alte SQLite-Version)
+wird per LIKE in item_names gesucht.
+
+Für Dashboard und Statistik werden Summen pro Tag × Markt × Kategorie in
+spending_rollup (und Bons pro Tag × Markt in receipt_rollup) mitgeführt –
+ebenfalls per Trigger, also auch bei Reklassifizierung. Die Auswertungen
+lesen nur noch diese kleinen Tabellen statt items komplett zu aggregieren.
+
+Für den Preisvergleich steht in store_prices je Artikel × Markt der neueste
+und der niedrigste Stückpreis. Ein neuer Artikel ist dort ein einzelner
+Upsert; Löschen und Ändern berechnen nur die betroffenen Zeilen neu.
+"""
+
+import re
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+INSERT_RECEIPT_SQL = '''
+    INSERT INTO receipts (store_name, store_address, date, total_amount, payment_method)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+INSERT_RECEIPT_WITH_PDF_SQL = '''
+    INSERT INTO receipts (store_name, store_address, date, total_amount,
+                          payment_method, pdf_path, pdf_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_ITEM_SQL = '''
+    INSERT INTO items (receipt_id, name, unit_price, quantity, total_price,
+                       tax_category, category)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Preisverlauf direkt aus items × receipts (früher eine eigene Tabelle mit
+# UNIQUE(item_name, date, store_name) und INSERT OR IGNORE): pro Name, Datum
+# und Markt zählt der zuerst gespeicherte Artikel; Zeilen mit NULL darin
+# waren nie eindeutig und bleiben einzeln. idx_items_name_price deckt
+# items vollständig ab, receipts kommt über den Primärschlüssel dazu.
+# Datum vorn im Gruppenschlüssel: ORDER BY denselben Schlüssel kostet
+# keine zweite Sortierung.
+PRICE_HISTORY_KEY = '''r.date, r.store_name, i.name,
+             CASE WHEN i.name IS NULL OR r.date IS NULL OR r.store_name IS NULL
+                  THEN i.item_id END'''
+
+PRICE_HISTORY_SELECT = f'''
+    SELECT MIN(i.item_id) AS history_id, i.name AS item_name, i.unit_price AS price,
+           r.date AS date, r.store_name AS store_name
+    FROM items i
+    JOIN receipts r ON r.receipt_id = i.receipt_id
+    {{where}}
+    GROUP BY {PRICE_HISTORY_KEY}
+'''
+
+# Trigramme brauchen mindestens 3 Zeichen – kürzere Suchbegriffe gehen über LIKE
+SEARCH_MIN_LENGTH = 3
+
+NAME_TRIGGERS_SQL = (
+    '''CREATE TRIGGER IF NOT EXISTS items_names_insert AFTER INSERT ON items BEGIN
+           INSERT INTO item_names (name, purchase_count)
+           SELECT new.name, 1 WHERE new.name IS NOT NULL
+           ON CONFLICT(name) DO UPDATE SET purchase_count = purchase_count + 1;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS items_names_delete AFTER DELETE ON items BEGIN
+           UPDATE item_names SET purchase_count = purchase_count - 1 WHERE name = old.name;
+           DELETE FROM item_names WHERE name = old.name AND purchase_count <= 0;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS items_names_update AFTER UPDATE OF name ON items BEGIN
+           UPDATE item_names SET purchase_count = purchase_count - 1 WHERE name = old.name;
+           DELETE FROM item_names WHERE name = old.name AND purchase_count <= 0;
+           INSERT INTO item_names (name, purchase_count)
+           SELECT new.name, 1 WHERE new.name IS NOT NULL
+           ON CONFLICT(name) DO UPDATE SET purchase_count = purchase_count + 1;
+       END''',
+)
+
+SEARCH_INDEX_SQL = (
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS item_names_fts USING fts5(
+           name, content='item_names', content_rowid='name_id', tokenize='trigram'
+       )''',
+    '''CREATE TRIGGER IF NOT EXISTS item_names_fts_insert AFTER INSERT ON item_names BEGIN
+           INSERT INTO item_names_fts(rowid, name) VALUES (new.name_id, new.name);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS item_names_fts_delete AFTER DELETE ON item_names BEGIN
+           INSERT INTO item_names_fts(item_names_fts, rowid, name)
+           VALUES ('delete', old.name_id, old.name);
+       END''',
+)
+
+
+# Schlüssel der Rollups: Tag (YYYY-MM-DD) und Markt, NULL wird zu ''
+ROLLUP_DAY = "COALESCE(substr({0}.date, 1, 10), '')"
+ROLLUP_STORE = "COALESCE({0}.store_name, '')"
+
+ROLLUP_UPSERT = '''
+    ON CONFLICT(day, store_name, category) DO UPDATE SET
+        item_count     = item_count     + excluded.item_count,
+        total_spent    = total_spent    + excluded.total_spent,
+        unit_price_sum = unit_price_sum + excluded.unit_price_sum
+'''
+
+
+def _rollup_item_sql(row: str, sign: str) -> str:
+    """Addiert (sign='') bzw. subtrahiert (sign='-') einen Artikel im Rollup"""
+    return f'''
+        INSERT INTO spending_rollup (day, store_name, category, item_count,
+                                     total_spent, unit_price_sum)
+        SELECT {ROLLUP_DAY.format('r')}, {ROLLUP_STORE.format('r')}, {row}.category, {sign}1,
+               {sign}COALESCE({row}.total_price, 0), {sign}COALESCE({row}.unit_price, 0)
+        FROM receipts r
+        WHERE r.receipt_id = {row}.receipt_id AND {row}.category IS NOT NULL
+        {ROLLUP_UPSERT};
+    '''
+
+
+def _rollup_receipt_items_sql(row: str, sign: str) -> str:
+    """Addiert bzw. subtrahiert alle Artikel eines Kassenbons im Rollup"""
+    return f'''
+        INSERT INTO spending_rollup (day, store_name, category, item_count,
+                                     total_spent, unit_price_sum)
+        SELECT {ROLLUP_DAY.format(row)}, {ROLLUP_STORE.format(row)}, i.category, {sign}COUNT(*),
+               {sign}SUM(COALESCE(i.total_price, 0)), {sign}SUM(COALESCE(i.unit_price, 0))
+        FROM items i
+        WHERE i.receipt_id = {row}.receipt_id AND i.category IS NOT NULL
+        GROUP BY i.category
+        {ROLLUP_UPSERT};
+    '''
+
+
+def _rollup_receipt_sql(row: str, sign: str) -> str:
+    """Addiert bzw. subtrahiert einen Kassenbon im Bon-Rollup"""
+    return f'''
+        INSERT INTO receipt_rollup (day, store_name, receipt_count)
+        VALUES ({ROLLUP_DAY.format(row)}, {ROLLUP_STORE.format(row)}, {sign}1)
+        ON CONFLICT(day, store_name) DO UPDATE SET
+            receipt_count = receipt_count + excluded.receipt_count;
+    '''
+
+
+ROLLUP_TRIGGERS_SQL = (
+    f'''CREATE TRIGGER IF NOT EXISTS items_rollup_insert AFTER INSERT ON items BEGIN
+           {_rollup_item_sql('new', '')}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS items_rollup_delete AFTER DELETE ON items BEGIN
+           {_rollup_item_sql('old', '-')}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS items_rollup_update
+       AFTER UPDATE OF category, total_price, unit_price, receipt_id ON items BEGIN
+           {_rollup_item_sql('old', '-')}
+           {_rollup_item_sql('new', '')}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS receipts_rollup_insert AFTER INSERT ON receipts BEGIN
+           {_rollup_receipt_sql('new', '')}
+           {_rollup_receipt_items_sql('new', '')}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS receipts_rollup_delete AFTER DELETE ON receipts BEGIN
+           {_rollup_receipt_sql('old', '-')}
+           {_rollup_receipt_items_sql('old', '-')}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS receipts_rollup_update
+       AFTER UPDATE OF date, store_name ON receipts BEGIN
+           {_rollup_receipt_sql('old', '-')}
+           {_rollup_receipt_items_sql('old', '-')}
+           {_rollup_receipt_sql('new', '')}
+           {_rollup_receipt_items_sql('new', '')}
+       END''',
+)
+
+# Preisvergleich: neuester und niedrigster Stückpreis je (Artikel, Markt).
+# "Neuester" = spätestes Datum (Bons ohne Datum gelten als älteste), bei
+# Gleichstand der zuletzt gespeicherte Artikel; beim Tiefstpreis gewinnt
+# unter gleichen Preisen ebenso der neueste.
+STORE_PRICES_SELECT = f'''
+    SELECT name, store_name, latest_price, latest_date, min_price, min_date, purchase_count
+    FROM (
+        SELECT i.name AS name, {ROLLUP_STORE.format('r')} AS store_name,
+               i.unit_price AS latest_price, r.date AS latest_date,
+               FIRST_VALUE(i.unit_price) OVER cheapest AS min_price,
+               FIRST_VALUE(r.date) OVER cheapest AS min_date,
+               COUNT(*) OVER grp AS purchase_count,
+               ROW_NUMBER() OVER newest AS position
+        FROM items i
+        JOIN receipts r ON r.receipt_id = i.receipt_id
+        WHERE i.name IS NOT NULL AND i.unit_price IS NOT NULL {{where}}
+        WINDOW grp AS (PARTITION BY i.name, {ROLLUP_STORE.format('r')}),
+               newest AS (grp ORDER BY r.date IS NULL, r.date DESC, i.item_id DESC),
+               cheapest AS (grp ORDER BY i.unit_price, r.date IS NULL, r.date DESC, i.item_id DESC)
+    )
+    WHERE position = 1
+'''
+
+# Ist das eingefügte Datum mindestens so neu wie das gespeicherte {0}?
+STORE_PRICE_NEWER = ("(excluded.latest_date IS NOT NULL AND ({0} IS NULL OR excluded.latest_date >= {0}) "
+                     "OR excluded.latest_date IS NULL AND {0} IS NULL)")
+STORE_PRICE_CHEAPER = ("(excluded.min_price < min_price OR excluded.min_price = min_price AND "
+                       + STORE_PRICE_NEWER.format('min_date') + ")")
+
+
+def _store_price_refresh_sql(names: str, stores: str) -> str:
+    """Berechnet die Preis-Zeilen der betroffenen (Artikel, Markt) neu"""
+    return f'''
+        DELETE FROM store_prices WHERE name IN ({names}) AND store_name IN ({stores});
+        INSERT INTO store_prices (name, store_name, latest_price, latest_date,
+                                  min_price, min_date, purchase_count)
+        {STORE_PRICES_SELECT.format(
+            where=f"AND i.name IN ({names}) AND {ROLLUP_STORE.format('r')} IN ({stores})")};
+    '''
+
+
+def _store_of(receipt_id: str) -> str:
+    return f"SELECT {ROLLUP_STORE.format('r')} FROM receipts r WHERE r.receipt_id = {receipt_id}"
+
+
+def _names_of(receipt_id: str) -> str:
+    return f"SELECT name FROM items WHERE receipt_id = {receipt_id}"
+
+
+STORE_PRICE_TRIGGERS_SQL = (
+    # Der Normalfall (neuer Artikel) ist ein einzelner Upsert ohne Neuberechnung
+    f'''CREATE TRIGGER IF NOT EXISTS items_store_prices_insert AFTER INSERT ON items
+       WHEN new.name IS NOT NULL AND new.unit_price IS NOT NULL BEGIN
+           INSERT INTO store_prices (name, store_name, latest_price, latest_date,
+                                     min_price, min_date, purchase_count)
+           SELECT new.name, {ROLLUP_STORE.format('r')}, new.unit_price, r.date,
+                  new.unit_price, r.date, 1
+           FROM receipts r WHERE r.receipt_id = new.receipt_id
+           ON CONFLICT(name, store_name) DO UPDATE SET
+               latest_price = CASE WHEN {STORE_PRICE_NEWER.format('latest_date')}
+                                   THEN excluded.latest_price ELSE latest_price END,
+               latest_date  = CASE WHEN {STORE_PRICE_NEWER.format('latest_date')}
+                                   THEN excluded.latest_date ELSE latest_date END,
+               min_price    = CASE WHEN {STORE_PRICE_CHEAPER}
+                                   THEN excluded.min_price ELSE min_price END,
+               min_date     = CASE WHEN {STORE_PRICE_CHEAPER}
+                                   THEN excluded.min_date ELSE min_date END,
+               purchase_count = purchase_count + 1;
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS items_store_prices_delete AFTER DELETE ON items
+       WHEN old.name IS NOT NULL AND old.unit_price IS NOT NULL BEGIN
+           {_store_price_refresh_sql('old.name', _store_of('old.receipt_id'))}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS items_store_prices_update
+       AFTER UPDATE OF name, unit_price, receipt_id ON items BEGIN
+           {_store_price_refresh_sql('old.name, new.name',
+                                     _store_of('old.receipt_id') + ' UNION ' + _store_of('new.receipt_id'))}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS receipts_store_prices_delete AFTER DELETE ON receipts BEGIN
+           {_store_price_refresh_sql(_names_of('old.receipt_id'), ROLLUP_STORE.format('old'))}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS receipts_store_prices_update
+       AFTER UPDATE OF date, store_name ON receipts BEGIN
+           {_store_price_refresh_sql(_names_of('new.receipt_id'),
+                                     ROLLUP_STORE.format('old') + ', ' + ROLLUP_STORE.format('new'))}
+       END''',
+)
+
+# Änderungszähler für Caches: jeder Schreiber (Web-App, batch_import.py,
+# folder_watcher.py, ein zweiter Server) zählt ihn per Trigger mit hoch.
+# Neue Artikel kommen immer zusammen mit ihrem Kassenbon (gleiche
+# Transaktion) – ein Trigger pro Artikel-Insert wäre nur Mehraufwand.
+CHANGE_COUNTER_SQL = 'UPDATE data_changes SET counter = counter + 1 WHERE id = 1;'
+
+CHANGE_COUNTER_TRIGGERS_SQL = tuple(
+    f'''CREATE TRIGGER IF NOT EXISTS {table}_changes_{event.lower()} AFTER {event} ON {table} BEGIN
+           {CHANGE_COUNTER_SQL}
+       END'''
+    for table, events in (('receipts', ('INSERT', 'UPDATE', 'DELETE')), ('items', ('UPDATE', 'DELETE')))
+    for event in events
+)
+
+# Filter im Format YYYY-MM-DD lassen sich auf Tages-Rollups abbilden
+PLAIN_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def init_schema(conn: sqlite3.Connection):
+    """Erstellt die Datenbankstruktur falls nicht vorhanden"""
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS receipts (
+            receipt_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            store_name TEXT,
+            store_address TEXT,
+            date TIMESTAMP,
+            total_amount REAL,
+            payment_method TEXT,
+            pdf_path TEXT,
+            pdf_hash TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS items (
+            item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            receipt_id INTEGER,
+            name TEXT,
+            unit_price REAL,
+            quantity INTEGER,
+            total_price REAL,
+            tax_category TEXT,
+            category TEXT,
+            FOREIGN KEY (receipt_id) REFERENCES receipts (receipt_id)
+        )
+    ''')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_name_category ON items(name, category)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_category ON items(category)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_receipt_category ON items(receipt_id, category)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_receipts_pdf_hash ON receipts(pdf_hash)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_receipts_date ON receipts(date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_receipts_store ON receipts(store_name)')
+
+    init_search_index(conn)
+    init_rollups(conn)
+    init_store_prices(conn)
+    init_price_history(conn)
+    init_change_counter(conn)
+
+    conn.commit()
+
+
+def table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    """Gibt es die Tabelle name in dieser Datenbank?"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def has_search_index(conn: sqlite3.Connection) -> bool:
+    """Gibt es den Volltextindex item_names_fts in dieser Datenbank?"""
+    return table_exists(conn, 'item_names_fts')
+
+
+def init_search_index(conn: sqlite3.Connection) -> bool:
+    """
+    Legt item_names und den Volltextindex samt Triggern an (idempotent).
+    Wird etwas davon neu angelegt, werden vorhandene Artikel sofort
+    nachgetragen. Gibt False zurück, wenn SQLite kein FTS5/Trigramm kann.
+    """
+    names_created = not table_exists(conn, 'item_names')
+    index_created = not has_search_index(conn)
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS item_names (
+            name_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            purchase_count INTEGER NOT NULL
+        )
+    ''')
+    for sql in NAME_TRIGGERS_SQL:
+        conn.execute(sql)
+
+    try:
+        for sql in SEARCH_INDEX_SQL:
+            conn.execute(sql)
+        available = True
+    except sqlite3.OperationalError:
+        # "no such module: fts5" / "no such tokenizer: trigram"
+        available = False
+
+    if names_created or (index_created and available):
+        rebuild_search_index(conn)
+    return available
+
+
+def rebuild_search_index(conn: sqlite3.Connection):
+    """Befüllt item_names neu aus der items-Tabelle und baut den Volltextindex auf (Backfill)"""
+    conn.execute('DELETE FROM item_names')
+    conn.execute('''
+        INSERT INTO item_names (name, purchase_count)
+        SELECT name, COUNT(*) FROM items WHERE name IS NOT NULL GROUP BY name
+    ''')
+    if has_search_index(conn):
+        conn.execute("INSERT INTO item_names_fts(item_names_fts) VALUES ('rebuild')")
+
+
+def init_rollups(conn: sqlite3.Connection):
+    """
+    Legt die Rollup-Tabellen samt Triggern an (idempotent). Werden sie neu
+    angelegt, werden sie sofort aus den vorhandenen Daten befüllt.
+    """
+    created = not table_exists(conn, 'spending_rollup')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS spending_rollup (
+            day TEXT NOT NULL,
+            store_name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            item_count INTEGER NOT NULL,
+            total_spent REAL NOT NULL,
+            unit_price_sum REAL NOT NULL,
+            PRIMARY KEY (day, store_name, category)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS receipt_rollup (
+            day TEXT NOT NULL,
+            store_name TEXT NOT NULL,
+            receipt_count INTEGER NOT NULL,
+            PRIMARY KEY (day, store_name)
+        ) WITHOUT ROWID
+    ''')
+    for sql in ROLLUP_TRIGGERS_SQL:
+        conn.execute(sql)
+
+    if created:
+        rebuild_rollups(conn)
+
+
+def rebuild_rollups(conn: sqlite3.Connection):
+    """Befüllt die Rollup-Tabellen komplett neu aus receipts + items (Backfill)"""
+    conn.execute('DELETE FROM spending_rollup')
+    conn.execute('DELETE FROM receipt_rollup')
+    conn.execute(f'''
+        INSERT INTO spending_rollup (day, store_name, category, item_count,
+                                     total_spent, unit_price_sum)
+        SELECT {ROLLUP_DAY.format('r')}, {ROLLUP_STORE.format('r')}, i.category, COUNT(*),
+               SUM(COALESCE(i.total_price, 0)), SUM(COALESCE(i.unit_price, 0))
+        FROM items i
+        JOIN receipts r ON i.receipt_id = r.receipt_id
+        WHERE i.category IS NOT NULL
+        GROUP BY 1, 2, 3
+    ''')
+    conn.execute(f'''
+        INSERT INTO receipt_rollup (day, store_name, receipt_count)
+        SELECT {ROLLUP_DAY.format('r')}, {ROLLUP_STORE.format('r')}, COUNT(*)
+        FROM receipts r
+        GROUP BY 1, 2
+    ''')
+
+
+def init_store_prices(conn: sqlite3.Connection):
+    """
+    Legt store_prices samt Triggern an (idempotent). Wird die Tabelle neu
+    angelegt, wird sie sofort aus den vorhandenen Artikeln befüllt.
+    """
+    created = not table_exists(conn, 'store_prices')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS store_prices (
+            name TEXT NOT NULL,
+            store_name TEXT NOT NULL,
+            latest_price REAL NOT NULL,
+            latest_date TEXT,
+            min_price REAL NOT NULL,
+            min_date TEXT,
+            purchase_count INTEGER NOT NULL,
+            PRIMARY KEY (name, store_name)
+        ) WITHOUT ROWID
+    ''')
+    for sql in STORE_PRICE_TRIGGERS_SQL:
+        conn.execute(sql)
+
+    if created:
+        rebuild_store_prices(conn)
+
+
+def rebuild_store_prices(conn: sqlite3.Connection):
+    """Befüllt store_prices komplett neu aus receipts + items (Backfill)"""
+    conn.execute('DELETE FROM store_prices')
+    conn.execute(f'''
+        INSERT INTO store_prices (name, store_name, latest_price, latest_date,
+                                  min_price, min_date, purchase_count)
+        {STORE_PRICES_SELECT.format(where='')}
+    ''')
+
+
+def price_comparison(conn: sqlite3.Connection, name: str) -> List[Dict]:
+    """
+    Aktueller Preis eines Artikels in jedem Markt, günstigster zuerst –
+    dazu der Tiefstpreis dort und wann er galt. Liest nur store_prices.
+    """
+    rows = conn.execute('''
+        SELECT store_name, latest_price, latest_date, min_price, min_date, purchase_count
+        FROM store_prices
+        WHERE name = ?
+        ORDER BY latest_price, latest_date DESC, store_name
+    ''', (name,))
+    return [dict(zip(('store_name', 'latest_price', 'latest_date', 'min_price',
+                      'min_date', 'purchase_count'), row)) for row in rows]
+
+
+def init_price_history(conn: sqlite3.Connection) -> bool:
+    """
+    Legt idx_items_name_price und die Sicht price_history an und ersetzt
+    dabei die alte gleichnamige Tabelle (idempotent). idx_items_name ist in
+    idx_items_name_price enthalten und entfällt. Gibt True zurück, wenn
+    eine alte Datenbank umgebaut wurde.
+    """
+    migrated = table_exists(conn, 'price_history')
+    if migrated:
+        conn.execute('DROP TABLE price_history')  # samt idx_price_history_name
+    has_old_index = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_items_name'"
+    ).fetchone() is not None
+    if has_old_index:
+        conn.execute('DROP INDEX idx_items_name')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_items_name_price ON items(name, receipt_id, unit_price)')
+    conn.execute(f'CREATE VIEW IF NOT EXISTS price_history AS {PRICE_HISTORY_SELECT.format(where="")}')
+    return migrated or has_old_index
+
+
+def init_change_counter(conn: sqlite3.Connection):
+    """Legt den Änderungszähler data_changes samt Triggern an (idempotent)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_changes (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            counter INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO data_changes (id, counter) VALUES (1, 0)')
+    for sql in CHANGE_COUNTER_TRIGGERS_SQL:
+        conn.execute(sql)
+
+
+def change_counter(conn: sqlite3.Connection) -> int:
+    """Stand des Änderungszählers – ändert sich mit jedem Commit auf receipts/items"""
+    return conn.execute('SELECT counter FROM data_changes WHERE id = 1').fetchone()[0]
+
+
+def price_history_sql(names_sql: str) -> str:
+    """Preisverlauf der Namen aus names_sql, nach Datum – ohne Umweg über die Sicht"""
+    # Die Sicht bekäme den IN-Filter erst nach dem Gruppieren aller Artikel
+    return (PRICE_HISTORY_SELECT.format(where=f'WHERE i.name IN ({names_sql})')
+            + f'    ORDER BY {PRICE_HISTORY_KEY}')
+
+
+def category_statistics(conn: sqlite3.Connection, store: str = '', date_from: str = '',
+                        date_to: str = '') -> Dict[str, Dict]:
+    """
+    Anzahl, Ausgaben und Durchschnittspreis pro Kategorie (ohne 'System'),
+    optional gefiltert nach Markt (Teilwort) und Zeitraum (date_to inklusive).
+    Liest aus spending_rollup; nur Zeitfilter mit Uhrzeit brauchen items.
+    """
+    params = []
+    if all(not value or PLAIN_DATE.fullmatch(value) for value in (date_from, date_to)):
+        query = '''
+            SELECT category,
+                   SUM(item_count) as count,
+                   SUM(total_spent) as total_spent,
+                   SUM(unit_price_sum) / SUM(item_count) as avg_price
+            FROM spending_rollup
+            WHERE category != 'System'
+        '''
+        if store:
+            query += ' AND store_name LIKE ?'
+            params.append(f'%{store}%')
+        if date_from:
+            query += ' AND day >= ?'
+            params.append(date_from)
+        if date_to:
+            query += " AND day <= ? AND day != ''"
+            params.append(date_to)
+        query += '''
+            GROUP BY category
+            HAVING SUM(item_count) > 0
+            ORDER BY total_spent DESC
+        '''
+    else:
+        query = '''
+            SELECT i.category,
+                   COUNT(*) as count,
+                   SUM(i.total_price) as total_spent,
+                   AVG(i.unit_price) as avg_price
+            FROM items i
+            JOIN receipts r ON i.receipt_id = r.receipt_id
+            WHERE i.category != 'System'
+        '''
+        if store:
+            query += ' AND r.store_name LIKE ?'
+            params.append(f'%{store}%')
+        if date_from:
+            query += ' AND r.date >= ?'
+            params.append(date_from)
+        if date_to:
+            query += ' AND r.date <= ?'
+            params.append(date_to + 'T23:59:59')
+        query += ' GROUP BY i.category ORDER BY total_spent DESC'
+
+    stats = {}
+    for row in conn.execute(query, params).fetchall():
+        stats[row[0]] = {
+            'count': row[1],
+            'total_spent': round(row[2], 2),
+            'avg_price': round(row[3], 2)
+        }
+    return stats
+
+
+def receipt_count(conn: sqlite3.Connection) -> int:
+    """Anzahl aller Kassenbons (aus receipt_rollup)"""
+    return conn.execute('SELECT COALESCE(SUM(receipt_count), 0) FROM receipt_rollup').fetchone()[0]
+
+
+def match_expression(term: str) -> str:
+    """Suchbegriff als FTS5-Phrase (Teilwortsuche, Sonderzeichen maskiert)"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def matching_names_sql(conn: sqlite3.Connection, term: str) -> Tuple[str, tuple]:
+    """
+    SQL-Teilabfrage (+ Parameter) für die Artikelnamen, die term enthalten.
+    Nutzt den Volltextindex, sonst LIKE über item_names.
+    """
+    if len(term) >= SEARCH_MIN_LENGTH and has_search_index(conn):
+        return ('''SELECT name FROM item_names WHERE name_id IN
+                   (SELECT rowid FROM item_names_fts WHERE item_names_fts MATCH ?)''',
+                (match_expression(term),))
+    return 'SELECT name FROM item_names WHERE name LIKE ?', (f'%{term}%',)
+
+
+def search_items(conn: sqlite3.Connection, term: str) -> List[Dict]:
+    """
+    Artikelsuche (Teilwort, ohne Groß-/Kleinschreibung), sortiert nach
+    Anzahl der Käufe – häufig gekaufte Artikel zuerst.
+    """
+    names_sql, params = matching_names_sql(conn, term)
+    cursor = conn.execute(f'''
+        SELECT i.name, i.category,
+               AVG(i.unit_price) as avg_price,
+               COUNT(*) as purchase_count
+        FROM items i
+        WHERE i.name IN ({names_sql}) AND i.category != 'System'
+        GROUP BY i.name, i.category
+        ORDER BY purchase_count DESC, i.name
+    ''', params)
+
+    return [
+        {
+            'name': row[0],
+            'category': row[1],
+            'avg_price': round(row[2], 2),
+            'purchase_count': row[3]
+        }
+        for row in cursor.fetchall()
+    ]
+
+
+def insert_receipt(cursor: sqlite3.Cursor, receipt, pdf_path: Optional[str] = None,
+                   pdf_hash: Optional[str] = None) -> int:
+    """
+    Schreibt Kassenbon + Artikel – OHNE Commit.
+    Gibt die neue receipt_id zurück.
+    """
+    header = (receipt.store_name, receipt.store_address, receipt.date,
+              receipt.total_amount, receipt.payment_method)
+    if pdf_path is None and pdf_hash is None:
+        cursor.execute(INSERT_RECEIPT_SQL, header)
+    else:
+        cursor.execute(INSERT_RECEIPT_WITH_PDF_SQL, header + (pdf_path, pdf_hash))
+    receipt_id = cursor.lastrowid
+
+    cursor.executemany(INSERT_ITEM_SQL, [
+        (receipt_id, item.name, item.unit_price, item.quantity,
+         item.total_price, item.tax_category, item.category)
+        for item in receipt.items
+    ])
+    return receipt_id
+
+
+def save_receipt(conn: sqlite3.Connection, receipt, pdf_path: Optional[str] = None,
+                 pdf_hash: Optional[str] = None, commit: bool = True) -> int:
+    """
+    Speichert einen Kassenbon atomar (SAVEPOINT): bei einem Fehler bleibt
+    nichts von ihm in der Datenbank, bereits gesammelte Kassenbons der
+    laufenden Transaktion aber schon.
+
+    commit=False: Transaktion bleibt offen, damit viele Kassenbons mit einem
+    einzigen Commit geschrieben werden können (Batch-Import).
+    """
+    cursor = conn.cursor()
+    if not conn.in_transaction:
+        cursor.execute('BEGIN')
+    cursor.execute('SAVEPOINT save_receipt')
+    try:
+        receipt_id = insert_receipt(cursor, receipt, pdf_path, pdf_hash)
+    except Exception:
+        cursor.execute('ROLLBACK TO save_receipt')
+        cursor.execute('RELEASE save_receipt')
+        raise
+    cursor.execute('RELEASE save_receipt')
+
+    if commit:
+        conn.commit()
+    return receipt_id
+
+
+def save_receipts(conn: sqlite3.Connection,
+                  entries: Iterable[Tuple[object, Optional[str], Optional[str]]]) -> List[int]:
+    """
+    Speichert viele Kassenbons in EINER Transaktion.
+    entries: (receipt, pdf_path, pdf_hash) – Fehler rollen ALLES zurück.
+    """
+    try:
+        receipt_ids = [
+            save_receipt(conn, receipt, pdf_path, pdf_hash, commit=False)
+            for receipt, pdf_path, pdf_hash in entries
+        ]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return receipt_ids
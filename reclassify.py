@@ -12,6 +12,70 @@ from receipt_analyzer import CategoryClassifier
 
 DB_PATH = Path(__file__).parent / 'receipts.db'
 
+# Maximale Anzahl Namen pro "UPDATE ... WHERE name IN (...)"
+# (ältere SQLite-Versionen erlauben nur 999 Parameter pro Statement)
+UPDATE_BATCH_SIZE = 500
+
+
+def plan_reclassification(conn: sqlite3.Connection, classify) -> tuple:
+    """
+    Klassifiziert jeden DISTINCT Artikelnamen genau einmal.
+    
+    Returns: (changes, total_items, distinct_names)
+             changes = [(name, alte_kategorie, neue_kategorie, anzahl_zeilen), ...]
+    """
+    cursor = conn.execute('SELECT name, category, COUNT(*) FROM items GROUP BY name, category')
+    
+    classified = {}
+    changes = []
+    total_items = 0
+    for name, old_category, count in cursor:
+        total_items += count
+        if name is None:
+            continue
+        new_category = classified.get(name)
+        if new_category is None:
+            new_category = classified[name] = classify(name)
+        if new_category != old_category:
+            changes.append((name, old_category, new_category, count))
+    
+    return changes, total_items, len(classified)
+
+
+def summarize_changes(changes: list) -> dict:
+    """Anzahl geänderter Artikelzeilen pro Kategorie (Zugang / Abgang)"""
+    summary = defaultdict(lambda: {'zugang': 0, 'abgang': 0})
+    for _, old_category, new_category, count in changes:
+        summary[new_category]['zugang'] += count
+        summary[old_category or 'Unbekannt']['abgang'] += count
+    return dict(summary)
+
+
+def apply_reclassification(conn: sqlite3.Connection, changes: list) -> int:
+    """
+    Schreibt die Änderungen mengenbasiert (UPDATE ... WHERE name IN (...))
+    in EINER Transaktion. Gibt die Anzahl geänderter Zeilen zurück.
+    """
+    names_by_category = defaultdict(list)
+    for name, _, new_category, _ in changes:
+        names_by_category[new_category].append(name)
+    
+    updated = 0
+    with conn:  # Commit am Ende, Rollback bei Fehler
+        for new_category, names in names_by_category.items():
+            names = list(dict.fromkeys(names))  # gleicher Name mit mehreren alten Kategorien
+            for start in range(0, len(names), UPDATE_BATCH_SIZE):
+                batch = names[start:start + UPDATE_BATCH_SIZE]
+                placeholders = ', '.join('?' * len(batch))
+                cursor = conn.execute(
+                    f'UPDATE items SET category = ? '
+                    f'WHERE name IN ({placeholders}) AND category IS NOT ?',
+                    [new_category, *batch, new_category]
+                )
+                updated += cursor.rowcount
+    return updated
+
+
 def reclassify_all():
     """Reklassifiziert alle Artikel in der Datenbank"""
     if not DB_PATH.exists():
@@ -19,13 +83,11 @@ def reclassify_all():
         return
     
     conn = sqlite3.connect(str(DB_PATH))
-    cursor = conn.cursor()
     
-    # Alle Artikel laden
-    cursor.execute('SELECT item_id, name, category FROM items')
-    items = cursor.fetchall()
+    # Jeden Artikelnamen nur einmal klassifizieren
+    changes, total_items, distinct_names = plan_reclassification(conn, CategoryClassifier.classify)
     
-    if not items:
+    if not total_items:
         print("📭 Keine Artikel in der Datenbank.")
         conn.close()
         return
@@ -34,16 +96,9 @@ def reclassify_all():
     print("=" * 80)
     print("  REKLASSIFIZIERUNG MIT UNTERKATEGORIEN")
     print("=" * 80)
-    print(f"  Gefundene Artikel: {len(items)}")
+    print(f"  Gefundene Artikel: {total_items} ({distinct_names} verschiedene Namen)")
     print()
     
-    # Änderungen sammeln
-    changes = []
-    for item_id, name, old_category in items:
-        new_category = CategoryClassifier.classify(name)
-        if new_category != old_category:
-            changes.append((item_id, name, old_category, new_category))
-    
     if not changes:
         print("  ✅ Alle Artikel sind bereits korrekt klassifiziert.")
         print("=" * 80)
@@ -52,23 +107,24 @@ def reclassify_all():
     
     # Gruppiere nach Hauptkategorie (vor dem "-")
     grouped = defaultdict(list)
-    for item_id, name, old_cat, new_cat in changes:
+    for name, old_cat, new_cat, count in changes:
         main_cat = new_cat.split(' - ')[0] if ' - ' in new_cat else new_cat
-        grouped[main_cat].append((item_id, name, old_cat, new_cat))
+        grouped[main_cat].append((name, old_cat or 'Unbekannt', new_cat, count))
     
-    print(f"  📊 Änderungen: {len(changes)} Artikel in {len(grouped)} Hauptkategorien")
+    changed_rows = sum(count for _, _, _, count in changes)
+    print(f"  📊 Änderungen: {changed_rows} Artikel ({len(changes)} Namen) in {len(grouped)} Hauptkategorien")
     print()
     
     # Zeige gruppiert nach Hauptkategorie
     shown = 0
     for main_cat in sorted(grouped.keys()):
         items_in_cat = grouped[main_cat]
-        print(f"  ─── {main_cat} ({len(items_in_cat)} Artikel) ───")
+        print(f"  ─── {main_cat} ({sum(c for _, _, _, c in items_in_cat)} Artikel) ───")
         
-        for item_id, name, old_cat, new_cat in items_in_cat[:5]:  # Max 5 pro Kategorie
+        for name, old_cat, new_cat, count in items_in_cat[:5]:  # Max 5 pro Kategorie
             old_short = old_cat.split(' - ')[-1] if ' - ' in old_cat else old_cat
             new_short = new_cat.split(' - ')[-1] if ' - ' in new_cat else new_cat
-            print(f"    {name[:40]:42s}  {old_short:15s} → {new_short}")
+            print(f"    {name[:36]:36s} {count:4d}x  {old_short:15s} → {new_short}")
             shown += 1
         
         if len(items_in_cat) > 5:
@@ -89,16 +145,12 @@ def reclassify_all():
         conn.close()
         return
     
-    # Änderungen durchführen
-    for item_id, _, _, new_category in changes:
-        cursor.execute('UPDATE items SET category = ? WHERE item_id = ?',
-                      (new_category, item_id))
-    
-    conn.commit()
+    # Änderungen durchführen (eine Transaktion)
+    updated = apply_reclassification(conn, changes)
     conn.close()
     
     print()
-    print(f"  ✅ {len(changes)} Artikel neu klassifiziert!")
+    print(f"  ✅ {updated} Artikel neu klassifiziert!")
     print("=" * 80)
     print()
 
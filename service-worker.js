@@ -56,10 +56,13 @@ self.addEventListener('fetch', event => {
           // Clone response weil Stream nur einmal gelesen werden kann
           const responseClone = response.clone();
           
-          // Cache für Offline-Fallback
-          caches.open(RUNTIME_CACHE).then(cache => {
-            cache.put(request, responseClone);
-          });
+          // Cache für Offline-Fallback (nur vollständige Antworten –
+          // 206-Teilantworten auf Range-Anfragen lehnt die Cache-API ab)
+          if (response.status === 200) {
+            caches.open(RUNTIME_CACHE).then(cache => {
+              cache.put(request, responseClone);
+            });
+          }
           
           return response;
         })
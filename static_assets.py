@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+static_assets.py
+────────────────
+App-Shell für den Produktionsmodus: die Startseite wird einmal gerendert,
+ihre Inline-Styles und -Skripte werden zu Dateien mit Inhalts-Hash im Namen
+und alles liegt fertig gzip-komprimiert im Speicher.
+
+    build_shell(html, out_dir, url_prefix)  ← Seite + Assets (dateiname → Asset)
+    make_asset(data, mimetype)              ← Rohdaten + gzip + ETag
+
+Weil sich der Name eines Assets mit seinem Inhalt ändert, darf der Browser
+es unbegrenzt cachen (immutable); neu geladen wird nur die kleine Seite,
+und die auch nur, wenn ihr ETag nicht mehr passt.
+"""
+
+import gzip
+import hashlib
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+# <style>…</style> und <script>…</script> ohne Attribute (Inline-Code)
+INLINE_BLOCK = re.compile(r'<(style|script)>(.*?)</\1>', re.S)
+
+# <script src="…">…</script> – der Inhalt wird vom Browser ignoriert
+EXTERNAL_SCRIPT = re.compile(r'(<script\s[^>]*\bsrc=[^>]*>).*?(</script>)', re.S)
+
+EXTENSIONS = {'style': ('css', 'text/css'), 'script': ('js', 'application/javascript')}
+
+
+@dataclass(frozen=True)
+class Asset:
+    """Eine auslieferbare Datei: Rohdaten, gzip-Variante und ETag"""
+    data: bytes
+    gzip: bytes
+    mimetype: str
+    etag: str
+
+
+def make_asset(data: bytes, mimetype: str) -> Asset:
+    # mtime=0: gleicher Inhalt → byte-gleiches gzip (reproduzierbar)
+    return Asset(data, gzip.compress(data, compresslevel=9, mtime=0), mimetype,
+                 hashlib.sha256(data).hexdigest()[:16])
+
+
+def build_shell(html: str, out_dir: Optional[Path] = None,
+                url_prefix: str = '/static/build/') -> Tuple[Asset, Dict[str, Asset]]:
+    """
+    Lagert Inline-Styles und -Skripte in app.<hash>.css/.js aus und ersetzt
+    sie an derselben Stelle durch <link>/<script src> – die Ausführungs-
+    reihenfolge bleibt damit gleich. Mit out_dir werden die Dateien (und
+    ihre .gz-Varianten, z.B. für nginx gzip_static) dort abgelegt, ältere
+    Builds werden entfernt.
+    """
+    assets: Dict[str, Asset] = {}
+
+    def extract(match) -> str:
+        kind, body = match.group(1), match.group(2)
+        extension, mimetype = EXTENSIONS[kind]
+        data = body.strip().encode('utf-8') + b'\n'
+        name = f"app.{hashlib.sha256(data).hexdigest()[:12]}.{extension}"
+        assets[name] = make_asset(data, mimetype)
+        if kind == 'style':
+            return f'<link rel="stylesheet" href="{url_prefix}{name}">'
+        return f'<script src="{url_prefix}{name}"></script>'
+
+    html = EXTERNAL_SCRIPT.sub(r'\1\2', html)
+    html = INLINE_BLOCK.sub(extract, html)
+    page = make_asset(html.encode('utf-8'), 'text/html; charset=utf-8')
+
+    if out_dir is not None:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for old in out_dir.glob('app.*'):
+            if old.name not in assets and old.name.removesuffix('.gz') not in assets:
+                old.unlink()
+        for name, asset in assets.items():
+            (out_dir / name).write_bytes(asset.data)
+            (out_dir / f"{name}.gz").write_bytes(asset.gzip)
+
+    return page, assets
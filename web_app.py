@@ -5,16 +5,34 @@ Web-Interface für Kassenbon-Analyse (VERBESSERT)
 ✅ 2️⃣ Sauberes Fehler-Handling + Logging
 """
 
-from flask import Flask, render_template, request, jsonify, g, send_file
+from flask import Flask, Request, Response, render_template, request, jsonify, g, send_file
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from pathlib import Path
 import sqlite3
 import os
+import queue
 import shutil
-import hashlib
+import base64
+import tempfile
 import logging
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from functools import wraps
 from receipt_analyzer import ReceiptParser
-from batch_import import run_import, EINGANG
+from receipt_store import (init_schema, save_receipt, search_items as search_item_index,
+                           category_statistics, price_comparison, receipt_count, change_counter)
+from batch_import import EINGANG, PARSE_WORKERS
+from import_jobs import ImportJobRunner, AKTIV as JOB_AKTIV, job_status, list_jobs
+from folder_watcher import FolderWatcher, list_pdfs
+from pdf_ingest import HashingBuffer, archive_pdf, db_path_for, collect_uploads, ingest_batch
+from pdf_backfill import backfill_pdf_paths, find_archived_pdf
+from reclassify import plan_reclassification, apply_reclassification, summarize_changes
+from export import export_query, iter_csv, iter_gzip, iter_xlsx_export
+from xlsx_writer import MIMETYPE as XLSX_MIMETYPE
+from static_assets import build_shell, make_asset
+from name_index import NamePrefixIndex
 from datetime import datetime
 import json
 
@@ -34,20 +52,47 @@ logger = logging.getLogger(__name__)
 # ══════════════════════════════════════════════════════
 # FLASK APP SETUP
 # ══════════════════════════════════════════════════════
+class UploadRequest(Request):
+    """Datei-Uploads landen im Speicher und werden schon beim Empfang gehasht"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return HashingBuffer()  # Größe begrenzt durch MAX_CONTENT_LENGTH
+
+    @property
+    def max_content_length(self):
+        """Mehrfach-Uploads dürfen größer sein als ein einzelner Upload"""
+        if self.endpoint == 'upload_bulk':
+            return app.config['MAX_BULK_CONTENT_LENGTH']
+        return super().max_content_length
+
+
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.request_class = UploadRequest
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+app.config['MAX_BULK_CONTENT_LENGTH'] = 64 * 1024 * 1024  # Mehrfach-Upload (liegt im Speicher)
+app.config['UPLOAD_WORKERS'] = min(4, os.cpu_count() or 1)  # Parse-Prozesse beim Mehrfach-Upload
 app.config['DATABASE'] = 'receipts.db'
+app.config['DB_POOL_SIZE'] = 8  # max. Anzahl ruhender Verbindungen im Pool
 app.config['PDF_STORAGE'] = Path('Ablage')  # PDF-Archiv
-
-# Template-Caching deaktivieren
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
-app.jinja_env.auto_reload = True
-app.jinja_env.cache = {}
+app.config['PDF_MAX_AGE'] = 365 * 24 * 3600  # Sekunden – abgelegte PDFs ändern sich nie
+app.config['IMPORT_WORKERS'] = PARSE_WORKERS  # Parse-Prozesse für den Batch-Import
+app.config['IMPORT_EVENT_KEEPALIVE'] = 15  # Sekunden zwischen SSE-Keepalives
+app.config['WATCH_EINGANG'] = os.environ.get('KASSENBON_WATCH', '1') != '0'  # neue PDFs automatisch importieren
+app.config['MAX_PAGE_SIZE'] = 1000  # max. Zeilen pro Seite (History, Kategorie-Details)
+app.config['RESPONSE_CACHE_SIZE'] = 256  # max. gecachte Antworten (Statistik, Suche, …)
+app.config['SUGGEST_MAX'] = 50  # max. Vorschläge der Autovervollständigung
+app.config['PRODUCTION'] = os.environ.get('KASSENBON_PRODUCTION', '0') == '1'  # App-Shell vorab bauen
+app.config['STATIC_MAX_AGE'] = 365 * 24 * 3600  # Sekunden – Assets mit Inhalts-Hash im Namen
+
+if not app.config['PRODUCTION']:
+    # Template-Caching deaktivieren (Entwicklung: Änderungen sofort sichtbar)
+    app.config['TEMPLATES_AUTO_RELOAD'] = True
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+    app.jinja_env.auto_reload = True
+    app.jinja_env.cache = {}
 
 # Erstelle notwendige Ordner
-Path(app.config['UPLOAD_FOLDER']).mkdir(parents=True, exist_ok=True)
 app.config['PDF_STORAGE'].mkdir(parents=True, exist_ok=True)
 
 
@@ -93,126 +138,213 @@ class ParseError(AppError):
 # ══════════════════════════════════════════════════════
 # DATABASE FUNCTIONS
 # ══════════════════════════════════════════════════════
+class PooledConnection(sqlite3.Connection):
+    """sqlite3-Verbindung, die sich merkt, zu welcher Pool-Generation sie gehört"""
+    pool_generation = 0
+
+
+class ConnectionPool:
+    """
+    Thread-sicherer Pool langlebiger SQLite-Verbindungen.
+    Das Schema wird nur EINMAL beim ersten Verbindungsaufbau angelegt –
+    Requests leihen sich danach nur noch eine fertige Verbindung aus.
+    """
+    
+    def __init__(self, db_path, size=8):
+        self.db_path = str(db_path)
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._schema_ready = False
+    
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False,
+                             factory=PooledConnection)
+        db.row_factory = sqlite3.Row
+        db.pool_generation = self._generation
+        # Pro Verbindung einmalig – nicht mehr pro Request
+        db.execute('PRAGMA journal_mode=WAL')       # parallele Lesezugriffe
+        db.execute('PRAGMA synchronous=NORMAL')     # kein fsync pro Commit
+        db.execute('PRAGMA temp_store=MEMORY')
+        db.execute('PRAGMA cache_size=-16000')      # 16 MB Page-Cache
+        return db
+    
+    def acquire(self):
+        """Leiht eine Verbindung aus (erstellt bei Bedarf eine neue)"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        db = self._connect()
+        if not self._schema_ready:
+            with self._lock:
+                if not self._schema_ready:
+                    init_database(db)
+                    self._schema_ready = True
+        return db
+    
+    def release(self, db):
+        """Gibt eine Verbindung zurück (offene Transaktion wird zurückgerollt)"""
+        try:
+            if db.in_transaction:
+                db.rollback()
+            if db.pool_generation == self._generation and self._idle.qsize() < self.size:
+                self._idle.put(db)
+                return
+        except sqlite3.Error:
+            pass
+        db.close()
+    
+    def close_all(self):
+        """Schließt alle ruhenden Verbindungen; ausgeliehene werden bei Rückgabe verworfen"""
+        with self._lock:
+            self._generation += 1
+            self._schema_ready = False
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Verbindungs-Pool für app.config['DATABASE'] (wird beim ersten Zugriff erstellt)"""
+    global _db_pool
+    pool = _db_pool
+    if pool is None or pool.db_path != str(app.config['DATABASE']):
+        with _db_pool_lock:
+            if _db_pool is None or _db_pool.db_path != str(app.config['DATABASE']):
+                if _db_pool is not None:
+                    _db_pool.close_all()
+                _db_pool = ConnectionPool(app.config['DATABASE'], app.config['DB_POOL_SIZE'])
+            pool = _db_pool
+    return pool
+
+
 def get_db():
-    """Erstellt eine neue Datenbankverbindung für jeden Thread/Request"""
+    """Leiht eine Verbindung aus dem Pool für den aktuellen Request"""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(app.config['DATABASE'])
-        db.row_factory = sqlite3.Row
-        init_database(db)
+        db = g._database = get_pool().acquire()
     return db
 
 
 @app.teardown_appcontext
 def close_connection(exception):
-    """Schließt die DB-Verbindung am Ende des Requests"""
-    db = getattr(g, '_database', None)
+    """Gibt die DB-Verbindung am Ende des Requests an den Pool zurück"""
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        get_pool().release(db)
 
 
 def init_database(db):
-    """Erstellt die Datenbankstruktur falls nicht vorhanden"""
-    cursor = db.cursor()
-    
-    # ✅ NEU: pdf_path Spalte hinzugefügt!
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS receipts (
-            receipt_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            store_name TEXT,
-            store_address TEXT,
-            date TIMESTAMP,
-            total_amount REAL,
-            payment_method TEXT,
-            pdf_path TEXT,
-            pdf_hash TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS items (
-            item_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            receipt_id INTEGER,
-            name TEXT,
-            unit_price REAL,
-            quantity INTEGER,
-            total_price REAL,
-            tax_category TEXT,
-            category TEXT,
-            FOREIGN KEY (receipt_id) REFERENCES receipts (receipt_id)
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS price_history (
-            history_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            item_name TEXT,
-            price REAL,
-            date TIMESTAMP,
-            store_name TEXT,
-            UNIQUE(item_name, date, store_name)
-        )
-    ''')
-    
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_name ON items(name)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_history_name ON price_history(item_name)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_receipts_pdf_hash ON receipts(pdf_hash)')
-    
-    db.commit()
+    """
+    Erstellt die Datenbankstruktur falls nicht vorhanden und ordnet alten
+    Kassenbons ohne pdf_path im Hintergrund ihre PDF zu
+    """
+    init_schema(db)
     logger.info("[OK] Datenbank initialisiert")
+    start_pdf_backfill()
+
+
+_job_runner = None
+_job_runner_lock = threading.Lock()
+
+
+def get_job_runner():
+    """
+    Hintergrund-Runner für Import-Jobs (wird beim ersten Zugriff gestartet
+    und setzt dabei Jobs fort, die ein Neustart unterbrochen hat)
+    """
+    global _job_runner
+    if _job_runner is None:
+        with _job_runner_lock:
+            if _job_runner is None:
+                runner = ImportJobRunner(workers=app.config['IMPORT_WORKERS'])
+                for job_id in runner.start():
+                    logger.info(f"[IMPORT] Unterbrochener Job #{job_id} wird fortgesetzt")
+                _job_runner = runner
+    return _job_runner
+
+
+_folder_watcher = None
+
+
+def get_folder_watcher():
+    """
+    Überwachung des Eingangsordners (startet beim ersten Zugriff).
+    Fertig geschriebene PDFs werden als Import-Job übergeben; None, wenn
+    app.config['WATCH_EINGANG'] aus ist.
+    """
+    global _folder_watcher
+    if _folder_watcher is None and app.config['WATCH_EINGANG']:
+        runner = get_job_runner()
+
+        def submit(pdfs):
+            job_id, created = runner.submit(pdfs)
+            if created:
+                logger.info(f"[WATCH] {len(pdfs)} neue PDF(s) → Import-Job #{job_id}")
+            return created
+
+        with _job_runner_lock:
+            if _folder_watcher is None:
+                _folder_watcher = FolderWatcher(EINGANG, submit, runner.idle)
+                _folder_watcher.start()
+    return _folder_watcher
+
+
+_pdf_backfill = None
+
+
+def start_pdf_backfill():
+    """
+    Startet die einmalige PDF-Zuordnung für Kassenbons ohne pdf_path
+    (pdf_backfill) in einem Hintergrund-Thread – danach liefert
+    /api/receipt/<id>/pdf jede PDF über einen Primärschlüssel-Zugriff aus.
+    """
+    global _pdf_backfill
+    with _job_runner_lock:
+        if _pdf_backfill is not None and _pdf_backfill.is_alive():
+            return
+        _pdf_backfill = threading.Thread(target=run_pdf_backfill, name='pdf-backfill', daemon=True)
+        _pdf_backfill.start()
+
+
+def run_pdf_backfill():
+    pool = get_pool()
+    db = pool.acquire()
+    try:
+        stats = backfill_pdf_paths(db, app.config['PDF_STORAGE'])
+    except Exception:
+        logger.exception("[ERROR] PDF-Zuordnung fehlgeschlagen")
+        return
+    finally:
+        pool.release(db)
+    if stats['offen']:
+        logger.info(f"[PDF] {stats['zugeordnet']} von {stats['offen']} alten Kassenbons "
+                    f"ihre PDF zugeordnet ({stats['ohne_treffer']} ohne Treffer)")
 
 
 # ══════════════════════════════════════════════════════
 # PDF HELPER FUNCTIONS
 # ══════════════════════════════════════════════════════
-def calculate_file_hash(filepath):
-    """Berechnet SHA256-Hash einer Datei"""
-    sha256 = hashlib.sha256()
-    with open(filepath, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b''):
-            sha256.update(chunk)
-    return sha256.hexdigest()
-
-
-def store_pdf(source_path, receipt_date, store_name):
+def store_pdf(buffer, receipt_date, store_name):
     """
-    ✅ 3️⃣ Speichert PDF im Ablage-Ordner und gibt Pfad zurück
+    ✅ 3️⃣ Speichert die hochgeladene PDF (im Speicher) im Ablage-Ordner
     
-    Returns: (pdf_path, pdf_hash)
+    Returns: relativer Pfad für die DB
     """
     try:
-        # Erstelle Ordnerstruktur: Ablage/YYYY/MM/
-        year = receipt_date.strftime("%Y")
-        month = receipt_date.strftime("%m")
-        storage_dir = app.config['PDF_STORAGE'] / year / month
-        storage_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Generiere eindeutigen Dateinamen
-        date_str = receipt_date.strftime("%Y-%m-%d")
-        base_name = f"Kassenbon_{date_str}_{store_name.replace(' ', '_')}"
-        
-        # Finde freien Dateinamen (falls Duplikate)
-        counter = 1
-        pdf_filename = f"{base_name}.pdf"
-        pdf_path = storage_dir / pdf_filename
-        
-        while pdf_path.exists():
-            pdf_filename = f"{base_name}_{counter}.pdf"
-            pdf_path = storage_dir / pdf_filename
-            counter += 1
-        
-        # Kopiere PDF
-        shutil.copy2(source_path, pdf_path)
-        
-        # Berechne Hash
-        pdf_hash = calculate_file_hash(pdf_path)
-        
-        # Relativer Pfad zur Speicherung in DB
-        rel_path = str(pdf_path.relative_to(Path.cwd()))
-        
+        pdf_path = archive_pdf(buffer, app.config['PDF_STORAGE'], receipt_date, store_name)
+        rel_path = db_path_for(pdf_path)
         logger.info(f"[OK] PDF gespeichert: {rel_path}")
-        return rel_path, pdf_hash
+        return rel_path
         
     except Exception as e:
         logger.error(f"[ERROR] PDF-Speicherung fehlgeschlagen: {e}")
@@ -234,35 +366,10 @@ def check_duplicate_by_hash(pdf_hash):
 def save_receipt_to_db(receipt, pdf_path, pdf_hash):
     """Speichert einen Kassenbon MIT PDF-Referenz in der Datenbank"""
     db = get_db()
-    cursor = db.cursor()
     
     try:
-        cursor.execute('''
-            INSERT INTO receipts (store_name, store_address, date, total_amount, 
-                                payment_method, pdf_path, pdf_hash)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (receipt.store_name, receipt.store_address, receipt.date, 
-              receipt.total_amount, receipt.payment_method, pdf_path, pdf_hash))
-        
-        receipt_id = cursor.lastrowid
-        
-        for item in receipt.items:
-            cursor.execute('''
-                INSERT INTO items (receipt_id, name, unit_price, quantity, total_price, 
-                                  tax_category, category)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (receipt_id, item.name, item.unit_price, item.quantity, 
-                  item.total_price, item.tax_category, item.category))
-            
-            try:
-                cursor.execute('''
-                    INSERT INTO price_history (item_name, price, date, store_name)
-                    VALUES (?, ?, ?, ?)
-                ''', (item.name, item.unit_price, receipt.date, receipt.store_name))
-            except sqlite3.IntegrityError:
-                pass  # Duplikat in Price History - ist OK
-        
-        db.commit()
+        receipt_id = save_receipt(db, receipt, pdf_path, pdf_hash)
+        bump_data_generation()
         logger.info(f"[OK] Kassenbon #{receipt_id} gespeichert")
         return receipt_id
         
@@ -272,12 +379,195 @@ def save_receipt_to_db(receipt, pdf_path, pdf_hash):
         raise AppError(f"Datenbank-Fehler: {e}", code=500)
 
 
+# ══════════════════════════════════════════════════════
+# PAGINIERUNG (Keyset)
+# ══════════════════════════════════════════════════════
+# Seiten werden über die Sortierschlüssel der letzten Zeile fortgesetzt
+# (Datum ↓, IDs ↓) statt über OFFSET – jede Seite ist ein Index-Range-Scan,
+# egal wie weit der Client schon geblättert hat. Der Cursor für die nächste
+# Seite steht im Header X-Next-Cursor, der Body bleibt eine Liste.
+
+def encode_cursor(values):
+    """Sortierschlüssel → undurchsichtiger Cursor-String"""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Cursor-String → Liste mit size Sortierschlüsseln (AppError 400 bei Unsinn)"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        values = None
+    if (not isinstance(values, list) or len(values) != size
+            or not all(isinstance(v, int) for v in values[1:])
+            or not (values[0] is None or isinstance(values[0], str))):
+        raise AppError("Ungültiger Cursor", code=400)
+    return values
+
+
+def page_size(default):
+    """?limit=… auf 1..MAX_PAGE_SIZE begrenzt"""
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, app.config['MAX_PAGE_SIZE']))
+
+
+def fetch_page(db, query, params, keys, limit, include_undated=True):
+    """
+    Liest eine Seite aus query (SELECT … WHERE …, ohne ORDER BY/LIMIT).
+
+    keys: Sortierspalten [(sql, feldname), …], absteigend sortiert; die erste
+    ist das Datum. Kassenbons ohne Datum kommen (wie bei ORDER BY date DESC)
+    ganz am Ende – als eigener Abschnitt, damit beide Abschnitte den Index
+    auf date nutzen. include_undated=False, wenn ein Datumsfilter sie
+    ohnehin ausschließt.
+
+    Gibt (rows, next_cursor) zurück; next_cursor ist None auf der letzten Seite.
+    """
+    token = request.args.get('cursor', '')
+    after = decode_cursor(token, len(keys)) if token else None
+    columns = [sql for sql, _ in keys]
+    rows = []
+
+    if after is None or after[0] is not None:
+        sql = query + f' AND {columns[0]} IS NOT NULL'
+        args = list(params)
+        if after:
+            # (Datum, ID) <= … grenzt den Index-Bereich ein, das volle Tupel ist exakt
+            sql += (f' AND ({columns[0]}, {columns[1]}) <= (?, ?)'
+                    f' AND ({", ".join(columns)}) < ({", ".join("?" * len(columns))})')
+            args += after[:2] + after
+        sql += ' ORDER BY ' + ', '.join(f'{c} DESC' for c in columns) + ' LIMIT ?'
+        rows += db.execute(sql, args + [limit + 1]).fetchall()
+
+    if include_undated and len(rows) <= limit:
+        sql = query + f' AND {columns[0]} IS NULL'
+        args = list(params)
+        if after and after[0] is None:
+            sql += f' AND ({", ".join(columns[1:])}) < ({", ".join("?" * (len(columns) - 1))})'
+            args += after[1:]
+        sql += ' ORDER BY ' + ', '.join(f'{c} DESC' for c in columns[1:]) + ' LIMIT ?'
+        rows += db.execute(sql, args + [limit + 1 - len(rows)]).fetchall()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([rows[-1][field] for _, field in keys])
+
+
+def paged_response(items, next_cursor):
+    """JSON-Liste + Cursor der nächsten Seite im Header"""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+# ══════════════════════════════════════════════════════
+# RESPONSE-CACHE (Daten-Generation)
+# ══════════════════════════════════════════════════════
+# Die Daten ändern sich nur durch Upload, Import, Reklassifizierung und
+# Reset. Jeder dieser Schreibpfade zählt die Daten-Generation hoch, die
+# Import-Jobs über runner.version. Lesende Endpoints mit @cached_response
+# werden pro Generation nur einmal berechnet; das ETag ist die Generation,
+# Browser und Service Worker bekommen bis zur nächsten Änderung 304.
+# Schreibt ein anderer Prozess (batch_import.py, folder_watcher.py, ein
+# zweiter Server), zählen Trigger den Änderungszähler in der Datenbank
+# hoch – er ist Teil der Generation (ein Lesezugriff auf eine Zeile).
+
+_data_generation = 0
+_data_generation_lock = threading.Lock()
+_server_instance = os.urandom(4).hex()  # Zähler beginnt nach einem Neustart wieder bei 0
+
+
+def bump_data_generation():
+    """Nach jedem Commit, der Kassenbons oder Artikel ändert, aufrufen"""
+    global _data_generation
+    with _data_generation_lock:
+        _data_generation += 1
+
+
+def data_generation():
+    """Aktuelle Daten-Generation (inkl. Fortschritt laufender Import-Jobs und fremder Schreiber)"""
+    runner_version = _job_runner.version if _job_runner is not None else 0
+    return f"{_server_instance}-{_data_generation}-{runner_version}-{change_counter(get_db())}"
+
+
+class ResponseCache:
+    """LRU-Cache fertiger Antwort-Bodies; Einträge einer alten Generation verfallen"""
+    
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, generation):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != generation:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def put(self, key, generation, body):
+        with self._lock:
+            self._entries[key] = (generation, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+_response_cache = ResponseCache(app.config['RESPONSE_CACHE_SIZE'])
+
+
+def cached_response(*params):
+    """
+    Cacht die JSON-Antwort eines lesenden Endpoints je Endpoint und Filter
+    (nur die genannten Query-Parameter, in fester Reihenfolge) und
+    beantwortet If-None-Match mit der aktuellen Generation ohne SQL mit 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            generation = data_generation()
+            if request.if_none_match.contains_weak(generation):
+                return revalidate_headers(Response(status=304), generation)
+            
+            key = (request.endpoint, tuple(kwargs.items()),
+                   tuple(request.args.get(name, '') for name in params))
+            body = _response_cache.get(key, generation)
+            if body is None:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                _response_cache.put(key, generation, response.get_data())
+            else:
+                response = app.response_class(body, mimetype='application/json')
+            return revalidate_headers(response, generation)
+        return wrapper
+    return decorator
+
+
+def revalidate_headers(response, etag):
+    """ETag + no-cache: der Client darf die Antwort behalten, fragt aber jedes Mal nach"""
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
 # ══════════════════════════════════════════════════════
 # API ROUTES
 # ══════════════════════════════════════════════════════
 @app.route('/')
 def index():
-    """Hauptseite"""
+    """Hauptseite (Produktionsmodus: vorab gebaute App-Shell)"""
+    if _app_shell is not None:
+        return send_asset(_app_shell['page'])
     return render_template('index.html')
 
 
@@ -298,54 +588,50 @@ def upload_receipt():
         if not file.filename.endswith('.pdf'):
             raise AppError('Nur PDF-Dateien erlaubt', code=400)
         
-        # Temporäre Speicherung
         filename = secure_filename(file.filename)
-        temp_path = Path(app.config['UPLOAD_FOLDER']) / filename
-        file.save(temp_path)
+        
+        # Hash wurde schon beim Empfang berechnet (UploadRequest)
+        pdf_hash = file.stream.hexdigest()
+        
+        # Duplikat-Check – bevor irgendetwas auf die Platte geht
+        existing_id = check_duplicate_by_hash(pdf_hash)
+        if existing_id:
+            logger.warning(f"[WARN] Duplikat erkannt: {filename} (bereits als #{existing_id})")
+            return jsonify({
+                'success': False,
+                'error': 'Duplikat',
+                'message': f'Diese PDF wurde bereits verarbeitet (Kassenbon #{existing_id})',
+                'existing_receipt_id': existing_id
+            }), 409
         
         try:
-            # Berechne Hash BEVOR Parsing
-            pdf_hash = calculate_file_hash(temp_path)
-            
-            # Duplikat-Check
-            existing_id = check_duplicate_by_hash(pdf_hash)
-            if existing_id:
-                logger.warning(f"[WARN] Duplikat erkannt: {filename} (bereits als #{existing_id})")
-                return jsonify({
-                    'success': False,
-                    'error': 'Duplikat',
-                    'message': f'Diese PDF wurde bereits verarbeitet (Kassenbon #{existing_id})',
-                    'existing_receipt_id': existing_id
-                }), 409
-            
-            # Parse PDF
+            # Parse PDF direkt aus dem Speicher
             parser = ReceiptParser()
-            receipt = parser.parse_pdf(temp_path)
-            
-            # Speichere PDF im Archiv
-            pdf_path, pdf_hash = store_pdf(temp_path, receipt.date, receipt.store_name)
-            
-            # Speichere in DB
-            receipt_id = save_receipt_to_db(receipt, pdf_path, pdf_hash)
-            
-            logger.info(f"[OK] Upload erfolgreich: {filename} -> #{receipt_id}")
-            
-            return jsonify({
-                'success': True,
-                'receipt_id': receipt_id,
-                'store': receipt.store_name,
-                'date': receipt.date.isoformat() if receipt.date else None,
-                'total': receipt.total_amount,
-                'items_count': len(receipt.items)
-            })
-            
+            receipt = parser.parse_pdf(file.stream, pdf_hash=pdf_hash)
         except Exception as e:
             logger.error(f"[ERROR] Parsing-Fehler {filename}: {e}")
             raise ParseError(filename, e)
         
-        finally:
-            # Lösche temporäre Datei
-            temp_path.unlink(missing_ok=True)
+        # Speichere PDF im Archiv (einziger Schreibvorgang)
+        pdf_path = store_pdf(file.stream, receipt.date, receipt.store_name)
+        
+        # Speichere in DB
+        try:
+            receipt_id = save_receipt_to_db(receipt, pdf_path, pdf_hash)
+        except Exception:
+            Path(pdf_path).unlink(missing_ok=True)
+            raise
+        
+        logger.info(f"[OK] Upload erfolgreich: {filename} -> #{receipt_id}")
+        
+        return jsonify({
+            'success': True,
+            'receipt_id': receipt_id,
+            'store': receipt.store_name,
+            'date': receipt.date.isoformat() if receipt.date else None,
+            'total': receipt.total_amount,
+            'items_count': len(receipt.items)
+        })
     
     except AppError as e:
         return jsonify({'success': False, 'error': e.message}), e.code
@@ -354,74 +640,122 @@ def upload_receipt():
         return jsonify({'success': False, 'error': 'Interner Serverfehler'}), 500
 
 
+@app.route('/api/upload/bulk', methods=['POST'])
+def upload_bulk():
+    """
+    Mehrfach-Upload: beliebig viele PDFs und/oder ZIP-Archive (Feld 'files')
+    in einem Request. Duplikate per Hash, paralleles Parsen, ein Commit.
+    Antwort wie beim Ordner-Import: Zusammenfassung + Status je Datei.
+    """
+    try:
+        files = request.files.getlist('files') + request.files.getlist('file')
+        if not files:
+            raise AppError('Keine Dateien hochgeladen', code=400)
+        
+        # ZIP-Inhalte und die Parse-Aufträge liegen bis zum Ende des Requests hier
+        with tempfile.TemporaryDirectory(prefix='kassenbon-upload-') as spool:
+            uploads = collect_uploads(files, Path(spool))
+            results = ingest_batch(get_db(), uploads, app.config['PDF_STORAGE'],
+                                   Path(spool), app.config['UPLOAD_WORKERS'])
+        bump_data_generation()
+        
+        ok  = sum(1 for r in results if r["status"] == "ok")
+        dup = sum(1 for r in results if r["status"] == "duplikat")
+        err = sum(1 for r in results if r["status"] == "fehler")
+        logger.info(f"[OK] Mehrfach-Upload: {ok} neu, {dup} Duplikate, {err} Fehler")
+        
+        return jsonify({
+            'success': True,
+            'zusammenfassung': {
+                'gesamt': len(results),
+                'neu': ok,
+                'duplikat': dup,
+                'fehler': err
+            },
+            'details': results
+        })
+    
+    except AppError as e:
+        return jsonify({'success': False, 'error': e.message}), e.code
+    except RequestEntityTooLarge:
+        limit_mb = app.config['MAX_BULK_CONTENT_LENGTH'] // (1024 * 1024)
+        return jsonify({'success': False, 'error': f'Upload zu groß (max. {limit_mb} MB)'}), 413
+    except Exception as e:
+        logger.exception("[ERROR] Unerwarteter Fehler beim Mehrfach-Upload")
+        return jsonify({'success': False, 'error': 'Interner Serverfehler'}), 500
+
+
+def pdf_cache_headers(response, etag, immutable):
+    """Cache-Header einer Kassenbon-PDF (private: Kassenbons sind persönliche Daten)"""
+    if etag:
+        response.set_etag(etag)
+    response.headers.pop('Expires', None)  # send_file setzt es für max_age=0
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = app.config['PDF_MAX_AGE']
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True
+    return response
+
+
 @app.route('/api/receipt/<int:receipt_id>/pdf')
 def serve_receipt_pdf(receipt_id):
     """
-    HYBRID: Funktioniert mit alter UND neuer Datenbank
-    - Neue DB: pdf_path vorhanden -> direkt verwenden
-    - Alte DB: pdf_path NULL -> Glob-Suche im Ablage-Ordner
+    Liefert die PDF eines Kassenbons über receipts.pdf_path aus.
+    Alten Kassenbons ohne pdf_path ordnet start_pdf_backfill() ihre PDF zu;
+    hat er einen Kassenbon noch nicht erreicht, prüft find_archived_pdf()
+    ihn einmalig mit denselben Regeln. Sonst 404 – nie eine fremde PDF.
+
+    pdf_hash ist das (starke) ETag: If-None-Match wird ohne Dateizugriff mit
+    304 beantwortet, Range-Anfragen liefern 206. Mit ?v=<pdf_hash> ist die
+    URL an genau diese Datei gebunden und darf unbegrenzt gecacht werden
+    (immutable) – ohne ?v= muss der Browser erst nachfragen, weil eine
+    Kassenbon-ID nach einem System-Reset neu vergeben wird.
     """
     try:
         db = get_db()
-        cursor = db.cursor()
-        
-        # Hole Kassenbon-Details
-        cursor.execute('''
-            SELECT pdf_path, store_name, date
-            FROM receipts
-            WHERE receipt_id = ?
-        ''', (receipt_id,))
-        
-        row = cursor.fetchone()
+        row = db.execute(
+            'SELECT pdf_path, pdf_hash FROM receipts WHERE receipt_id = ?', (receipt_id,)
+        ).fetchone()
         if not row:
             raise ReceiptNotFoundError(receipt_id)
         
-        # HYBRID: Prüfe ob pdf_path vorhanden (neue DB)
         if row['pdf_path'] and row['pdf_path'].strip():
-            # NEU: Direkter Pfad aus DB
-            pdf_path = Path(row['pdf_path'])
-            
-            if not pdf_path.exists():
-                logger.error(f"[ERROR] PDF existiert nicht: {pdf_path}")
-                raise PDFNotFoundError(receipt_id)
-            
-            logger.info(f"[PDF] PDF ausgeliefert (DB): {pdf_path.name}")
+            pdf_path, etag = Path(row['pdf_path']), row['pdf_hash']
         else:
-            # ALT: Fallback auf Glob-Suche
-            store_name = row['store_name']
-            date = row['date']
-            
-            if not date:
-                return jsonify({'error': 'Kein Datum vorhanden'}), 404
-            
-            # Baue Pfad im Ablage-Ordner
-            from datetime import datetime as dt
-            date_obj = dt.fromisoformat(date)
-            year = date_obj.strftime("%Y")
-            month = date_obj.strftime("%m")
-            date_str = date_obj.strftime("%Y-%m-%d")
-            
-            ablage_dir = Path('Ablage') / year / month
-            
-            if not ablage_dir.exists():
-                return jsonify({'error': 'Ablage-Ordner nicht gefunden'}), 404
-            
-            # Suche nach passender PDF
-            pattern = f"Kassenbon_{date_str}_*.pdf"
-            matching_files = list(ablage_dir.glob(pattern))
-            
-            if not matching_files:
-                return jsonify({'error': 'PDF-Datei nicht gefunden'}), 404
-            
-            pdf_path = matching_files[0]
-            logger.info(f"[PDF] PDF ausgeliefert (GLOB): {pdf_path.name}")
+            pdf_path = find_archived_pdf(db, app.config['PDF_STORAGE'], receipt_id)
+            if pdf_path is None:
+                logger.warning(f"[PDF] Kassenbon #{receipt_id} ist keine PDF zugeordnet")
+                raise PDFNotFoundError(receipt_id)
+            logger.info(f"[PDF] PDF beim Abruf zugeordnet: {pdf_path.name}")
+            etag = db.execute('SELECT pdf_hash FROM receipts WHERE receipt_id = ?',
+                              (receipt_id,)).fetchone()['pdf_hash']
         
-        return send_file(
+        immutable = bool(etag) and request.args.get('v') == etag
+        
+        if etag and request.if_none_match.contains_weak(etag):
+            return pdf_cache_headers(Response(status=304), etag, immutable)
+        
+        if not pdf_path.exists():
+            logger.error(f"[ERROR] PDF existiert nicht: {pdf_path}")
+            raise PDFNotFoundError(receipt_id)
+        
+        logger.info(f"[PDF] PDF ausgeliefert: {pdf_path.name}")
+        
+        response = send_file(
             pdf_path,
             mimetype='application/pdf',
             as_attachment=False,
-            download_name=pdf_path.name
+            download_name=pdf_path.name,
+            conditional=True,          # If-None-Match / If-Range / Range → 304 / 206
+            etag=etag or True,
+            max_age=0
         )
+        return pdf_cache_headers(response, etag, immutable)
     
     except AppError as e:
         return jsonify({'error': e.message}), e.code
@@ -435,97 +769,138 @@ def serve_receipt_pdf(receipt_id):
 # ══════════════════════════════════════════════════════
 @app.route('/api/import/check')
 def import_check():
-    """Gibt an wie viele PDFs im Eingangsordner auf Verarbeitung warten."""
-    pdfs = sorted(EINGANG.glob("*.pdf"))
+    """
+    Gibt an wie viele PDFs im Eingangsordner auf Verarbeitung warten
+    (aus dem Index der Ordner-Überwachung) und welcher Import-Job läuft.
+    """
+    watcher = get_folder_watcher()
+    if watcher is not None and watcher.indexed.is_set():
+        dateien = watcher.pending_files()
+    else:
+        dateien = [p.name for p in list_pdfs(EINGANG)]
     return jsonify({
         'ordner': str(EINGANG),
-        'anzahl': len(pdfs),
-        'dateien': [p.name for p in pdfs]
+        'anzahl': len(dateien),
+        'dateien': dateien,
+        'job_id': get_job_runner().current_job()
     })
 
 
 @app.route('/api/import/start', methods=['POST'])
 def import_start():
-    """Startet den Batch-Import aller PDFs aus dem Eingangsordner."""
+    """
+    Startet den Batch-Import aller PDFs aus dem Eingangsordner als
+    Hintergrund-Job und antwortet sofort mit der Job-ID.
+    Läuft bereits ein Job, wird dessen ID zurückgegeben.
+    """
     try:
-        results = run_import()
-        ok  = sum(1 for r in results if r["status"] == "ok")
-        dup = sum(1 for r in results if r["status"] == "duplikat")
-        err = sum(1 for r in results if r["status"] == "fehler")
-
-        return jsonify({
-            'success': True,
-            'zusammenfassung': {
-                'gesamt': len(results),
-                'neu': ok,
-                'duplikat': dup,
-                'fehler': err
-            },
-            'details': results
-        })
+        job_id, created = get_job_runner().submit()
+        if created:
+            logger.info(f"[IMPORT] Job #{job_id} gestartet")
+        return jsonify({'success': True, 'job_id': job_id, 'neu': created}), 202 if created else 200
     except Exception as e:
-        logger.exception("[ERROR] Batch-Import fehlgeschlagen")
+        logger.exception("[ERROR] Batch-Import konnte nicht gestartet werden")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/import/jobs')
+def import_jobs():
+    """Die letzten Import-Jobs (ohne Dateiliste)"""
+    runner = get_job_runner()
+    with closing(runner.connect()) as conn:
+        return jsonify(list_jobs(conn))
+
+
+@app.route('/api/import/jobs/<int:job_id>')
+def import_job(job_id):
+    """Status eines Import-Jobs mit den Ergebnissen je Datei (?seit=Position)"""
+    runner = get_job_runner()
+    with closing(runner.connect()) as conn:
+        status = job_status(conn, job_id, request.args.get('seit', 0, type=int))
+    if status is None:
+        raise AppError(f"Import-Job #{job_id} nicht gefunden", code=404)
+    return jsonify(status)
+
+
+@app.route('/api/import/jobs/<int:job_id>/events')
+def import_job_events(job_id):
+    """
+    Fortschritt eines Import-Jobs als Server-Sent Events. Jedes Event enthält
+    den Job-Status und die seit dem letzten Event fertigen Dateien; die
+    Event-ID ist die letzte Dateiposition, so setzt EventSource nach einem
+    Verbindungsabbruch (Last-Event-ID) genau dort wieder auf.
+    """
+    runner = get_job_runner()
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('seit', 0, type=int)
+    keepalive = app.config['IMPORT_EVENT_KEEPALIVE']
+
+    with closing(runner.connect()) as conn:
+        if job_status(conn, job_id, since=None) is None:
+            raise AppError(f"Import-Job #{job_id} nicht gefunden", code=404)
+
+    def generate(since):
+        conn = runner.connect()
+        try:
+            version, sent = runner.version, None
+            while True:
+                status = job_status(conn, job_id, since)
+                if status is None:
+                    return  # System-Reset während des Jobs
+                state = (status['status'], status['abbruch_angefordert'], status['zusammenfassung'])
+                if status['dateien'] or state != sent:
+                    if status['dateien']:
+                        since = status['dateien'][-1]['position']
+                    sent = state
+                    yield f"id: {since}\ndata: {json.dumps(status)}\n\n"
+                if status['status'] not in JOB_AKTIV:
+                    return
+                changed = runner.wait_for_change(version, keepalive)
+                if changed == version:
+                    yield ': keepalive\n\n'
+                version = changed
+        finally:
+            conn.close()
+
+    return Response(generate(since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/import/jobs/<int:job_id>/cancel', methods=['POST'])
+def import_job_cancel(job_id):
+    """Bricht einen Import-Job ab – die gerade laufende Datei wird noch fertig"""
+    status = get_job_runner().cancel(job_id)
+    if status is None:
+        raise AppError(f"Import-Job #{job_id} nicht gefunden", code=404)
+    logger.info(f"[IMPORT] Abbruch für Job #{job_id} angefordert")
+    return jsonify({'success': True, 'job_id': job_id, 'status': status})
+
+
 @app.route('/api/statistics')
+@cached_response('store', 'date_from', 'date_to')
 def get_statistics():
     """Statistiken über alle Kategorien - mit optionalen Filtern"""
-    db = get_db()
-    cursor = db.cursor()
-    
     store = request.args.get('store', '')
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
     
-    query = '''
-        SELECT i.category, 
-               COUNT(*) as count,
-               SUM(i.total_price) as total_spent,
-               AVG(i.unit_price) as avg_price
-        FROM items i
-        JOIN receipts r ON i.receipt_id = r.receipt_id
-        WHERE i.category != 'System'
-    '''
-    params = []
-    
-    if store:
-        query += ' AND r.store_name LIKE ?'
-        params.append(f'%{store}%')
-    if date_from:
-        query += ' AND r.date >= ?'
-        params.append(date_from)
-    if date_to:
-        query += ' AND r.date <= ?'
-        params.append(date_to + 'T23:59:59')
-    
-    query += ' GROUP BY i.category ORDER BY total_spent DESC'
-    
-    cursor.execute(query, params)
-    
-    stats = {}
-    for row in cursor.fetchall():
-        stats[row['category']] = {
-            'count': row['count'],
-            'total_spent': round(row['total_spent'], 2),
-            'avg_price': round(row['avg_price'], 2)
-        }
-    
-    return jsonify(stats)
+    # Aus den Rollups (Tag × Markt × Kategorie) statt über alle Artikel
+    return jsonify(category_statistics(get_db(), store, date_from, date_to))
 
 
 @app.route('/api/history')
 def get_history():
-    """Einkaufshistorie – mit optionalen Filtern"""
+    """Einkaufshistorie – mit optionalen Filtern, seitenweise (?cursor=…)"""
     db = get_db()
-    cursor = db.cursor()
-    limit = request.args.get('limit', 20, type=int)
+    limit = page_size(20)
 
     store = request.args.get('store', '')
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
 
-    query = 'SELECT receipt_id, store_name, date, total_amount, payment_method FROM receipts WHERE 1=1'
+    query = ('SELECT receipt_id, store_name, date, total_amount, payment_method, pdf_hash '
+             'FROM receipts WHERE 1=1')
     params = []
 
     if store:
@@ -538,71 +913,71 @@ def get_history():
         query += ' AND date <= ?'
         params.append(date_to + 'T23:59:59')
 
-    query += ' ORDER BY date DESC LIMIT ?'
-    params.append(limit)
-
-    cursor.execute(query, params)
+    rows, next_cursor = fetch_page(
+        db, query, params,
+        keys=[('date', 'date'), ('receipt_id', 'receipt_id')],
+        limit=limit, include_undated=not (date_from or date_to)
+    )
     
     history = []
-    for row in cursor.fetchall():
+    for row in rows:
         history.append({
             'receipt_id': row['receipt_id'],
             'store_name': row['store_name'],
             'date': row['date'],
             'total_amount': row['total_amount'],
-            'payment_method': row['payment_method']
+            'payment_method': row['payment_method'],
+            'pdf_hash': row['pdf_hash']
         })
     
-    return jsonify(history)
+    return paged_response(history, next_cursor)
 
 
 @app.route('/api/search')
+@cached_response('q')
 def search_items():
     """Artikelsuche"""
     query = request.args.get('q', '')
     if not query:
         return jsonify([])
     
-    db = get_db()
-    cursor = db.cursor()
-    
-    cursor.execute('''
-        SELECT DISTINCT i.name, i.category, 
-               AVG(i.unit_price) as avg_price,
-               COUNT(*) as purchase_count
-        FROM items i
-        WHERE i.name LIKE ? AND i.category != 'System'
-        GROUP BY i.name, i.category
-        ORDER BY purchase_count DESC
-    ''', (f'%{query}%',))
-    
-    results = []
-    for row in cursor.fetchall():
-        results.append({
-            'name': row['name'],
-            'category': row['category'],
-            'avg_price': round(row['avg_price'], 2),
-            'purchase_count': row['purchase_count']
-        })
+    # Volltextindex (Trigramme) statt LIKE-Scan, sortiert nach Kaufanzahl
+    return jsonify(search_item_index(get_db(), query))
+
+
+_name_index = NamePrefixIndex()
+
+
+@app.route('/api/suggest')
+def suggest_items():
+    """
+    Autovervollständigung: die meistgekauften Artikelnamen, bei denen ein
+    Wort mit ?q= beginnt (?limit=, Standard 8). Aus dem Präfixindex im
+    Speicher, der nach jeder Datenänderung nur die neuen Artikel übernimmt.
+    """
+    _name_index.refresh(get_db(), data_generation())
     
-    return jsonify(results)
+    limit = max(1, min(request.args.get('limit', 8, type=int), app.config['SUGGEST_MAX']))
+    return jsonify(_name_index.suggest(request.args.get('q', ''), limit))
 
 
 @app.route('/api/category-details/<category>')
 def get_category_details(category):
-    """Details zu allen Artikeln einer Kategorie"""
+    """Details zu allen Artikeln einer Kategorie – seitenweise (?cursor=…)"""
     db = get_db()
-    cursor = db.cursor()
+    limit = page_size(500)
     
     store = request.args.get('store', '')
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
     
+    # CROSS JOIN: Kassenbons in Datumsreihenfolge (idx_receipts_date), Artikel
+    # je Bon über idx_items_receipt_category – keine Sortierung der ganzen Kategorie
     query = '''
-        SELECT i.name, i.unit_price as price, i.quantity,
-               r.date, r.store_name
-        FROM items i
-        JOIN receipts r ON i.receipt_id = r.receipt_id
+        SELECT i.item_id, i.name, i.unit_price as price, i.quantity,
+               r.receipt_id, r.date, r.store_name
+        FROM receipts r
+        CROSS JOIN items i ON i.receipt_id = r.receipt_id
         WHERE i.category = ?
     '''
     params = [category]
@@ -617,12 +992,14 @@ def get_category_details(category):
         query += ' AND r.date <= ?'
         params.append(date_to + 'T23:59:59')
     
-    query += ' ORDER BY r.date DESC, i.name'
-    
-    cursor.execute(query, params)
+    rows, next_cursor = fetch_page(
+        db, query, params,
+        keys=[('r.date', 'date'), ('r.receipt_id', 'receipt_id'), ('i.item_id', 'item_id')],
+        limit=limit, include_undated=not (date_from or date_to)
+    )
     
     items = []
-    for row in cursor.fetchall():
+    for row in rows:
         items.append({
             'name': row['name'],
             'price': row['price'],
@@ -631,10 +1008,11 @@ def get_category_details(category):
             'store_name': row['store_name']
         })
     
-    return jsonify(items)
+    return paged_response(items, next_cursor)
 
 
 @app.route('/api/stores')
+@cached_response()
 def get_stores():
     """Liste aller Geschäfte"""
     db = get_db()
@@ -646,6 +1024,7 @@ def get_stores():
 
 
 @app.route('/api/date-range')
+@cached_response()
 def get_date_range():
     """Zeitraum der vorhandenen Daten"""
     db = get_db()
@@ -658,65 +1037,49 @@ def get_date_range():
 
 @app.route('/api/export/excel')
 def export_excel():
-    """Exportiere alle Daten als CSV"""
+    """
+    Exportiere alle Daten – gestreamt.
+    ?format=xlsx: echte Excel-Datei, sonst CSV (optional gzip-komprimiert)
+    """
     try:
-        import io, csv
-        from flask import Response
         
-        db = get_db()
-        cursor = db.cursor()
+        export_format = request.args.get('format', 'csv').lower()
+        if export_format not in ('csv', 'xlsx'):
+            raise AppError(f"Unbekanntes Exportformat: {export_format}", code=400)
         
         store = request.args.get('store', '')
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
+        query, params = export_query(store, date_from, date_to)
         
-        query = '''
-            SELECT r.date, r.store_name, r.total_amount, r.payment_method,
-                   i.name, i.category, i.unit_price, i.quantity, i.total_price
-            FROM receipts r
-            JOIN items i ON r.receipt_id = i.receipt_id
-            WHERE i.category != 'System'
-        '''
-        params = []
-        
-        if store:
-            query += ' AND r.store_name LIKE ?'
-            params.append(f'%{store}%')
-        if date_from:
-            query += ' AND r.date >= ?'
-            params.append(date_from)
-        if date_to:
-            query += ' AND r.date <= ?'
-            params.append(date_to + 'T23:59:59')
-        
-        query += ' ORDER BY r.date DESC'
-        cursor.execute(query, params)
-        
-        output = io.StringIO()
-        writer = csv.writer(output, delimiter=';')
-        
-        writer.writerow(['Datum', 'Geschäft', 'Artikel', 'Kategorie', 'Einzelpreis', 
-                        'Menge', 'Gesamtpreis', 'Kassenbon-Summe', 'Zahlungsmethode'])
-        
-        for row in cursor.fetchall():
-            date_str = row['date'][:10] if row['date'] else ''
-            writer.writerow([
-                date_str, row['store_name'], row['name'], row['category'],
-                f"{row['unit_price']:.2f}".replace('.', ','),
-                row['quantity'],
-                f"{row['total_price']:.2f}".replace('.', ','),
-                f"{row['total_amount']:.2f}".replace('.', ','),
-                row['payment_method']
-            ])
-        
-        output.seek(0)
-        filename = f"kassenbons_{datetime.now().strftime('%Y-%m-%d')}.csv"
-        
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={'Content-Disposition': f'attachment; filename={filename}'}
-        )
+        # Eigene Verbindung: der Export läuft noch, wenn der Request-Kontext
+        # (und damit get_db()) schon beendet ist – Rückgabe erst nach dem letzten Byte
+        pool = get_pool()
+        db = pool.acquire()
+        try:
+            cursor = db.execute(query, params)
+        except Exception:
+            pool.release(db)
+            raise
+        
+        filename = f"kassenbons_{datetime.now().strftime('%Y-%m-%d')}.{export_format}"
+        headers = {'Content-Disposition': f'attachment; filename={filename}'}
+        
+        if export_format == 'xlsx':
+            # ZIP ist bereits komprimiert – kein gzip
+            response = Response(iter_xlsx_export(cursor), mimetype=XLSX_MIMETYPE, headers=headers)
+        else:
+            use_gzip = 'gzip' in request.accept_encodings
+            chunks = iter_csv(cursor)
+            body = iter_gzip(chunks) if use_gzip else (chunk.encode('utf-8') for chunk in chunks)
+            response = Response(body, mimetype='text/csv', headers=headers)
+            response.headers['Vary'] = 'Accept-Encoding'
+            if use_gzip:
+                response.headers['Content-Encoding'] = 'gzip'
+        response.call_on_close(lambda: pool.release(db))
+        return response
+    except AppError:
+        raise
     except Exception as e:
         logger.exception("[ERROR] Export fehlgeschlagen")
         return jsonify({'error': str(e)}), 500
@@ -747,37 +1110,30 @@ def get_item_price_history(item_name):
     return jsonify(history)
 
 
+@app.route('/api/item-price-comparison/<item_name>')
+@cached_response()
+def get_item_price_comparison(item_name):
+    """Wo ist ein Artikel gerade am günstigsten? Aktueller Preis je Markt"""
+    stores = price_comparison(get_db(), item_name)
+    if not stores:
+        raise AppError(f"Keine Preise für '{item_name}' gefunden", code=404)
+    return jsonify({'name': item_name, 'cheapest': stores[0], 'stores': stores})
+
+
 @app.route('/api/dashboard')
+@cached_response()
 def get_dashboard_data():
     """Dashboard-Daten"""
     db = get_db()
-    cursor = db.cursor()
-    
-    cursor.execute('''
-        SELECT category, COUNT(*) as count, SUM(total_price) as total_spent, AVG(unit_price) as avg_price
-        FROM items WHERE category != 'System'
-        GROUP BY category ORDER BY total_spent DESC
-    ''')
-    
-    stats = {}
-    for row in cursor.fetchall():
-        stats[row['category']] = {
-            'count': row['count'],
-            'total_spent': round(row['total_spent'], 2),
-            'avg_price': round(row['avg_price'], 2)
-        }
     
+    # Alles aus den Rollups – kein Scan über items/receipts
+    stats = category_statistics(db)
     total_spent = sum(cat['total_spent'] for cat in stats.values())
-    
-    cursor.execute('SELECT COUNT(*) as cnt FROM receipts')
-    total_receipts = cursor.fetchone()['cnt']
-    
-    cursor.execute("SELECT COUNT(*) as cnt FROM items WHERE category != 'System'")
-    total_items = cursor.fetchone()['cnt']
+    total_items = sum(cat['count'] for cat in stats.values())
     
     return jsonify({
         'total_spent': round(total_spent, 2),
-        'total_receipts': total_receipts,
+        'total_receipts': receipt_count(db),
         'total_items': total_items
     })
 
@@ -785,14 +1141,20 @@ def get_dashboard_data():
 @app.route('/api/system/reset', methods=['POST'])
 def system_reset():
     """Kompletter System-Reset"""
+    if _job_runner is not None and _job_runner.active_job is not None:
+        raise AppError("Import läuft – bitte erst abbrechen", code=409)
     try:
         errors = []
         
-        # Datenbank löschen
+        # Datenbank löschen (vorher alle Pool-Verbindungen schließen)
+        get_pool().close_all()
         db_path = Path(app.config['DATABASE'])
         if db_path.exists():
             try:
                 db_path.unlink()
+                # WAL-Dateien gehören zur alten Datenbank
+                for suffix in ('-wal', '-shm'):
+                    Path(str(db_path) + suffix).unlink(missing_ok=True)
                 logger.info("[OK] Datenbank gelöscht")
             except Exception as e:
                 errors.append(f"Datenbank: {e}")
@@ -823,6 +1185,8 @@ def system_reset():
             logger.info("[OK] Neue Datenbank erstellt")
         except Exception as e:
             errors.append(f"DB-Init: {e}")
+        _name_index.invalidate()
+        bump_data_generation()
         
         if errors:
             return jsonify({'success': False, 'error': '; '.join(errors)}), 500
@@ -841,15 +1205,78 @@ def system_reset():
 # ══════════════════════════════════════════════════════
 # PWA SUPPORT
 # ══════════════════════════════════════════════════════
+_app_shell = None
+
+
+def build_app_shell():
+    """
+    Produktionsmodus: rendert die Startseite EINMAL, lagert Styles und
+    Skripte nach static/build/ aus (Inhalts-Hash im Namen) und hält Seite,
+    Assets, Service Worker und Manifest gzip-komprimiert im Speicher.
+    """
+    global _app_shell
+    page, assets = build_shell(app.jinja_env.get_template('index.html').render(),
+                               Path(app.static_folder) / 'build')
+    _app_shell = {
+        'page': page,
+        'assets': assets,
+        'service-worker.js': make_asset((Path(app.root_path) / 'service-worker.js').read_bytes(),
+                                        'application/javascript'),
+        'manifest.json': make_asset((Path(app.root_path) / 'manifest.json').read_bytes(),
+                                    'application/json'),
+    }
+    logger.info(f"[OK] App-Shell gebaut: {len(page.gzip) // 1024} KB Seite + "
+                f"{len(assets)} Assets ({sum(len(a.gzip) for a in assets.values()) // 1024} KB gzip)")
+
+
+def send_asset(asset, immutable=False):
+    """
+    Liefert ein vorab gebautes Asset – gzip, wenn der Client es annimmt.
+    immutable: Name enthält den Inhalts-Hash → unbegrenzt cachen,
+    sonst no-cache + ETag (Revalidierung mit 304).
+    """
+    use_gzip = 'gzip' in request.accept_encodings
+    etag = f"{asset.etag}-gz" if use_gzip else asset.etag  # eigenes ETag je Kodierung
+    
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(asset.gzip if use_gzip else asset.data, mimetype=asset.mimetype)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(etag)
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['STATIC_MAX_AGE']
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+@app.route('/static/build/<path:filename>')
+def static_build(filename):
+    """Ausgelagerte Styles/Skripte der App-Shell (nur im Produktionsmodus)"""
+    asset = _app_shell['assets'].get(filename) if _app_shell is not None else None
+    if asset is None:
+        return jsonify({'error': 'Nicht gefunden'}), 404
+    return send_asset(asset, immutable=True)
+
+
 @app.route('/manifest.json')
 def manifest():
     """PWA Manifest"""
+    if _app_shell is not None:
+        return send_asset(_app_shell['manifest.json'])
     return send_file('manifest.json', mimetype='application/json')
 
 
 @app.route('/service-worker.js')
 def service_worker():
     """Service Worker für Offline-Support"""
+    if _app_shell is not None:
+        return send_asset(_app_shell['service-worker.js'])
     return send_file('service-worker.js', mimetype='application/javascript')
 
 
@@ -896,44 +1323,49 @@ def save_categories():
 
 @app.route('/api/categories/reclassify', methods=['POST'])
 def reclassify_items():
-    """Klassifiziere alle Artikel neu mit aktualisierten Kategorien"""
+    """
+    Klassifiziere alle Artikel neu mit aktualisierten Kategorien
+    
+    Jeder Artikelname wird nur EINMAL klassifiziert. Mit ?dry_run=1 wird
+    nichts geschrieben, sondern nur die Änderungen pro Kategorie gemeldet.
+    """
     try:
         # Lade die AKTUELLEN Kategorien aus der Datei
         with open('categories.json', 'r', encoding='utf-8') as f:
             categories = json.load(f)
         
-        logger.info(f"[INFO] Starte Reklassifizierung mit {len(categories)} Kategorien")
+        body = request.get_json(silent=True) or {}
+        dry_run = (request.args.get('dry_run', '').lower() in ('1', 'true', 'ja')
+                   or bool(body.get('dry_run')))
         
-        # Erstelle neuen Parser (lädt alte Kategorien)
-        parser = ReceiptParser()
+        logger.info(f"[INFO] Starte Reklassifizierung mit {len(categories)} Kategorien"
+                    f"{' (Dry-Run)' if dry_run else ''}")
         
+        parser = ReceiptParser()
         db = get_db()
-        cursor = db.cursor()
         
-        cursor.execute('SELECT item_id, name, category FROM items')
-        items = cursor.fetchall()
-        
-        updated = 0
-        for item in items:
-            old_category = item['category']
-            # WICHTIG: Übergebe die NEUEN Kategorien an classify_item!
-            new_category = parser.classify_item(item['name'], categories)
-            
-            if new_category != old_category:
-                cursor.execute(
-                    'UPDATE items SET category = ? WHERE item_id = ?',
-                    (new_category, item['item_id'])
-                )
-                updated += 1
-                logger.info(f"[RECLASSIFY] '{item['name']}': {old_category} → {new_category}")
+        # WICHTIG: Übergebe die NEUEN Kategorien an classify_item!
+        changes, total_items, distinct_names = plan_reclassification(
+            db, lambda name: parser.classify_item(name, categories)
+        )
         
-        db.commit()
-        logger.info(f"[OK] {updated} von {len(items)} Artikeln neu klassifiziert")
+        if dry_run:
+            updated = sum(count for _, _, _, count in changes)
+        else:
+            for name, old_category, new_category, count in changes:
+                logger.info(f"[RECLASSIFY] '{name}' ({count}x): {old_category} → {new_category}")
+            updated = apply_reclassification(db, changes)
+            _name_index.invalidate()  # Kategorie System kann sich geändert haben
+            bump_data_generation()
+            logger.info(f"[OK] {updated} von {total_items} Artikeln neu klassifiziert")
         
         return jsonify({
             'success': True,
-            'total_items': len(items),
-            'updated': updated
+            'dry_run': dry_run,
+            'total_items': total_items,
+            'distinct_names': distinct_names,
+            'updated': updated,
+            'changes': summarize_changes(changes)
         })
         
     except Exception as e:
@@ -965,6 +1397,10 @@ def internal_error(error):
 # ══════════════════════════════════════════════════════
 # MAIN
 # ══════════════════════════════════════════════════════
+if app.config['PRODUCTION']:
+    build_app_shell()
+
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("KASSENBON-ANALYZER V2 (VERBESSERT)")
@@ -974,9 +1410,12 @@ if __name__ == '__main__':
     print("[OK] Duplikat-Erkennung via Hash")
     print(f"\n[DIR] Working Directory: {os.getcwd()}")
     print(f"[DIR] PDF Storage: {app.config['PDF_STORAGE']}")
+    print(f"[WEB] Modus: {'Produktion (App-Shell vorab gebaut)' if app.config['PRODUCTION'] else 'Entwicklung'}")
     print(f"[LOG] Logfile: kassenbon_analyzer.log")
     print("\n[WEB] Server: http://localhost:5000")
     print("="*60 + "\n")
     
     logger.info("[START] Server gestartet")
+    get_job_runner()
+    get_folder_watcher()
     app.run(debug=False, host='0.0.0.0', port=5000, use_reloader=False)
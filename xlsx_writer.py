@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+xlsx_writer.py
+──────────────
+Minimaler Excel-Writer (.xlsx / SpreadsheetML) nur mit der Standardbibliothek.
+
+    iter_xlsx(header, rows, column_types)  ← liefert die .xlsx-Datei in Stücken (bytes)
+
+Die Tabelle wird zeilenweise als XML direkt in den ZIP-Eintrag geschrieben,
+die fertigen ZIP-Bytes werden sofort weitergereicht. Weder Arbeitsmappe noch
+ZIP liegen je komplett im Speicher – das funktioniert auch, wenn das Ziel
+(z.B. eine HTTP-Antwort) nicht seekbar ist. Texte stehen als Inline-Strings
+in den Zellen, damit keine Shared-Strings-Tabelle aufgebaut werden muss.
+"""
+
+import re
+import zipfile
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+
+# Spaltentypen
+TEXT = 'text'
+NUMBER = 'number'
+MONEY = 'money'   # 1.234,50 € (Anzeige je nach Excel-Gebietsschema)
+DATE = 'date'     # kurzes Datum
+
+# Bytes, die sich im Puffer sammeln dürfen, bevor sie ausgeliefert werden
+FLUSH_BYTES = 64 * 1024
+
+# Zeilen pro Schreibvorgang in den ZIP-Eintrag
+ROWS_PER_WRITE = 500
+
+MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Excel-Tageszählung beginnt (wegen des 1900-Schaltjahr-Fehlers) am 30.12.1899
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+# In XML 1.0 nicht erlaubte Steuerzeichen (kommen in PDF-Texten vor)
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+CONTENT_TYPES_XML = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>'''
+
+ROOT_RELS_XML = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>'''
+
+WORKBOOK_XML = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>'''
+
+WORKBOOK_RELS_XML = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>'''
+
+# Zellformate: 0 = Standard, 1 = Kopfzeile (fett), 2 = Datum, 3 = Euro-Betrag
+STYLES_XML = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<numFmts count="1"><numFmt numFmtId="164" formatCode="#,##0.00\\ &quot;€&quot;"/></numFmts>
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="4">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>
+<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+</cellXfs>
+<cellStyles count="1"><cellStyle name="Standard" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>'''
+
+SHEET_START_XML = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>
+{cols}<sheetData>
+'''
+
+SHEET_END_XML = '</sheetData>\n</worksheet>'
+
+
+class _ChunkSink:
+    """Nicht seekbares Schreibziel für zipfile – sammelt die Bytes bis zum Abholen"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+@lru_cache(maxsize=65536)
+def _inline_string(text: str, style: str) -> str:
+    """XML einer Textzelle – gecacht, Märkte/Kategorien/Artikel wiederholen sich ständig"""
+    text = escape(INVALID_XML_CHARS.sub('', text))
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<c t="inlineStr"{style}><is><t{space}>{text}</t></is></c>'
+
+
+def text_cell(value, style: str = '') -> str:
+    """Inline-String-Zelle (leerer Wert → leere Zelle)"""
+    if value is None or value == '':
+        return '<c/>'
+    return _inline_string(str(value), style)
+
+
+def number_cell(value, style: str = '') -> str:
+    """Zahlenzelle (Text, wenn der Wert keine Zahl ist)"""
+    if type(value) is float or type(value) is int:
+        return f'<c{style}><v>{value!r}</v></c>'
+    if value is None:
+        return '<c/>'
+    return text_cell(value)
+
+
+def money_cell(value) -> str:
+    return number_cell(value, ' s="3"')
+
+
+@lru_cache(maxsize=4096)
+def date_cell(value) -> str:
+    """Datumszelle als Excel-Seriennummer (Text, wenn es kein Datum ist)"""
+    if isinstance(value, datetime):
+        delta = value - EXCEL_EPOCH
+        return f'<c s="2"><v>{delta.days + delta.seconds / 86400!r}</v></c>'
+    if isinstance(value, date):
+        return f'<c s="2"><v>{(value - EXCEL_EPOCH.date()).days}</v></c>'
+    return text_cell(value)
+
+
+CELL_WRITERS = {TEXT: text_cell, NUMBER: number_cell, MONEY: money_cell, DATE: date_cell}
+
+
+def iter_xlsx(header: Sequence[str], rows: Iterable[Sequence], column_types: Sequence[str],
+              sheet_name: str = 'Tabelle1', column_widths: Optional[Sequence[float]] = None,
+              compresslevel: int = 1) -> Iterator[bytes]:
+    """
+    Schreibt eine Arbeitsmappe mit einem Tabellenblatt und liefert sie
+    stückweise als bytes. rows wird genau einmal durchlaufen.
+
+    column_types: je Spalte TEXT, NUMBER, MONEY oder DATE
+    column_widths: optionale Spaltenbreiten (Zeichen)
+    """
+    writers = [CELL_WRITERS[column_type] for column_type in column_types]
+    sink = _ChunkSink()
+
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as archive:
+        archive.writestr('[Content_Types].xml', CONTENT_TYPES_XML)
+        archive.writestr('_rels/.rels', ROOT_RELS_XML)
+        archive.writestr('xl/workbook.xml',
+                         WORKBOOK_XML.format(sheet_name=escape(sheet_name, {'"': '&quot;'})))
+        archive.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS_XML)
+        archive.writestr('xl/styles.xml', STYLES_XML)
+        yield sink.take()
+
+        cols = ''
+        if column_widths:
+            cols = '<cols>' + ''.join(
+                f'<col min="{index}" max="{index}" width="{width}" customWidth="1"/>'
+                for index, width in enumerate(column_widths, start=1)
+            ) + '</cols>\n'
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(SHEET_START_XML.format(cols=cols).encode('utf-8'))
+            header_cells = ''.join(text_cell(title, ' s="1"') for title in header)
+            sheet.write(f'<row r="1">{header_cells}</row>\n'.encode('utf-8'))
+
+            pending: List[str] = []
+            for number, row in enumerate(rows, start=2):
+                cells = ''.join([write(value) for write, value in zip(writers, row)])
+                pending.append(f'<row r="{number}">{cells}</row>\n')
+                if len(pending) >= ROWS_PER_WRITE:
+                    sheet.write(''.join(pending).encode('utf-8'))
+                    pending = []
+                    if sink.size >= FLUSH_BYTES:
+                        yield sink.take()
+
+            pending.append(SHEET_END_XML)
+            sheet.write(''.join(pending).encode('utf-8'))
+
+    yield sink.take()